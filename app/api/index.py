@@ -43,21 +43,10 @@ try:
     # Importar serviços se disponíveis
     sys.path.append(str(current_dir))
     
-    # Teste de importação gradual
-    supabase_available = False
-    multi_ai_available = False
-    
-    try:
-        from app.services.supabase_base_service import SupabaseService
-        supabase_available = True
-    except:
-        pass
-    
-    try:
-        from app.services.multi_ai_service import MultiAIService
-        multi_ai_available = True
-    except:
-        pass
+    # Verificar disponibilidade sem importar os SDKs (import só no primeiro uso)
+    from importlib.util import find_spec
+    supabase_available = find_spec("supabase") is not None
+    multi_ai_available = find_spec("httpx") is not None
     
     print(f"🔧 Supabase: {supabase_available}")
     print(f"🤖 Multi-IA: {multi_ai_available}")
@@ -1,7 +1,8 @@
 """
 Rotas para Área de Membros e Dashboard Administrativo
 """
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
@@ -22,18 +23,27 @@ except ImportError:
     except ImportError:
         jwt = None
 
-from app.services.supabase_auth_service import SupabaseAuthService, UserRole
-from app.services.member_area_service import MemberAreaService, SubscriptionPlan
-from app.services.admin_analytics_service import AdminAnalyticsService
+from app.services.supabase_auth_service import UserRole, get_auth_service
+from app.services.member_area_service import SubscriptionPlan, get_member_area_service
+from app.services.admin_analytics_service import get_admin_analytics_service
+from app.services.analytics_events import track_api_usage, track_user_activity
+from app.services.analytics_rollups import ANALYTICS_DAILY_RETENTION_DAYS
+from app.services.analytics_compaction import get_compaction_job
+from app.services.analytics_export import AnalyticsExport, InvalidExportError
+from app.services.latency_histograms import DIMENSIONS, LATENCY_RETENTION_HOURS, get_latency_store
+from app.services.pagination import InvalidCursorError, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.template_ranking import SORT_POPULAR, SORT_TRENDING
+from app.services.request_timing import span
+from app.services.diagnostics import (
+    MAX_PROFILE_SECONDS, DiagnosticsBusy, collapsed_text, get_memory_profiler, get_sampling_profiler,
+    measure_loop_lag, top_functions
+)
 
 # Configuração JWT
 JWT_SECRET = os.getenv("JWT_SECRET_KEY", "fallback-secret-key")
 JWT_ALGORITHM = "HS256"
 
-# Serviços
-auth_service = SupabaseAuthService()
-member_service = MemberAreaService()
-analytics_service = AdminAnalyticsService()
+# Serviços: criados no primeiro uso (get_*) para não pesar no cold start
 
 # Security
 security = HTTPBearer()
@@ -76,14 +86,14 @@ class RegisterRequest(BaseModel):
 async def login(request: LoginRequest):
     """Login do usuário"""
     try:
-        token = auth_service.authenticate_user(request.email, request.password)
+        token = get_auth_service().authenticate_user(request.email, request.password)
         if not token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Email ou senha inválidos"
             )
         
-        user = auth_service.get_user_by_email(request.email)
+        user = get_auth_service().get_user_by_email(request.email)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -120,7 +130,7 @@ async def register(request: RegisterRequest):
     """Registro de novo usuário"""
     try:
         # Verificar se email já existe
-        existing_user = auth_service.get_user_by_email(request.email)
+        existing_user = get_auth_service().get_user_by_email(request.email)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -128,7 +138,7 @@ async def register(request: RegisterRequest):
             )
         
         # Criar novo usuário
-        user = auth_service.register_user(
+        user = get_auth_service().register_user(
             email=request.email,
             password=request.password,
             role=UserRole.FREE
@@ -141,7 +151,7 @@ async def register(request: RegisterRequest):
             )
         
         # Fazer login automático
-        token = auth_service.authenticate_user(request.email, request.password)
+        token = get_auth_service().authenticate_user(request.email, request.password)
         
         return {
             "access_token": token,
@@ -191,7 +201,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 detail="Token inválido"
             )
         
-        user = auth_service.get_user_by_id(user_id)
+        user = get_auth_service().get_user_by_id(user_id)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -247,7 +257,7 @@ async def debug_token_info(credentials: HTTPAuthorizationCredentials = Depends(s
         
         # Tentar buscar usuário
         try:
-            user = auth_service.get_user_by_id(user_id)
+            user = get_auth_service().get_user_by_id(user_id)
             logger.info(f"🔍 Usuário encontrado: {user.email if user else 'None'}")
         except Exception as user_error:
             logger.error(f"❌ Erro ao buscar usuário: {user_error}")
@@ -292,11 +302,11 @@ async def get_current_user_info(current_user = Depends(get_current_user)):
 @member_router.get("/profile")
 async def get_member_profile(current_user = Depends(get_current_user)):
     """Obter perfil do membro"""
-    profile = member_service.get_member_profile(current_user.id)
+    profile = get_member_area_service().get_member_profile(current_user.id)
     
     if not profile:
         # Criar perfil se não existir
-        profile = member_service.create_member_profile(
+        profile = get_member_area_service().create_member_profile(
             user_id=current_user.id,
             username=current_user.username,
             email=current_user.email,
@@ -305,7 +315,7 @@ async def get_member_profile(current_user = Depends(get_current_user)):
     
     return {
         "profile": profile,
-        "subscription_details": member_service.plan_quotas[profile.subscription_plan]
+        "subscription_details": get_member_area_service().plan_quotas[profile.subscription_plan]
     }
 
 @member_router.put("/profile")
@@ -322,9 +332,9 @@ async def update_member_profile(
     if request.username:
         updates["username"] = request.username
         # Também atualizar no auth service
-        auth_service.update_user(current_user.id, {"username": request.username})
+        get_auth_service().update_user(current_user.id, {"username": request.username})
     
-    success = member_service.update_member_profile(current_user.id, updates)
+    success = get_member_area_service().update_member_profile(current_user.id, updates)
     
     if not success:
         raise HTTPException(
@@ -341,8 +351,7 @@ async def get_member_analytics(current_user = Depends(get_current_user)):
     # Obter métricas reais do sistema de analytics
     try:
         # Buscar dados do usuario nos logs de analytics
-        from app.services.admin_analytics_service import AdminAnalyticsService
-        real_analytics = AdminAnalyticsService()
+        real_analytics = get_admin_analytics_service()
         
         # Buscar logs do usuário específico
         api_logs = real_analytics._load_api_logs()
@@ -365,10 +374,10 @@ async def get_member_analytics(current_user = Depends(get_current_user)):
         saved_prompts_count = 0
         templates_count = 0
         try:
-            saved_prompts = member_service.get_user_saved_prompts(current_user.id)
+            saved_prompts = get_member_area_service().get_user_saved_prompts(current_user.id)
             saved_prompts_count = len(saved_prompts) if saved_prompts else 0
             
-            user_templates = member_service.get_user_templates(current_user.id)
+            user_templates = get_member_area_service().get_user_templates(current_user.id)
             templates_count = len(user_templates) if user_templates else 0
         except:
             pass  # Se não existir ainda, usar 0
@@ -387,7 +396,7 @@ async def get_member_analytics(current_user = Depends(get_current_user)):
     except Exception as e:
         logger.error(f"Erro ao obter analytics reais: {e}")
         # Fallback para o serviço original
-        analytics = member_service.get_member_analytics(current_user.id)
+        analytics = get_member_area_service().get_member_analytics(current_user.id)
         
         if not analytics:
             # Dados padrão estruturados
@@ -407,17 +416,18 @@ async def get_member_analytics(current_user = Depends(get_current_user)):
 @member_router.get("/quota")
 async def check_member_quota(current_user = Depends(get_current_user)):
     """Verificar quota mensal do usuário"""
-    quota_info = member_service.check_monthly_quota(current_user.id)
+    quota_info = get_member_area_service().check_monthly_quota(current_user.id)
     return quota_info
 
 @member_router.get("/saved-prompts")
-async def get_saved_prompts(current_user = Depends(get_current_user)):
-    """Obter prompts salvos do usuário"""
-    saved_prompts = member_service.get_user_saved_prompts(current_user.id)
-    return {
-        "prompts": saved_prompts,
-        "total": len(saved_prompts)
-    }
+async def get_saved_prompts(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user = Depends(get_current_user)
+):
+    """Obter prompts salvos do usuário (paginado por cursor)"""
+    page = _get_page(get_member_area_service().get_user_saved_prompts_page, current_user.id, cursor=cursor, limit=limit)
+    return _page_response("prompts", page)
 
 @member_router.post("/save-prompt")
 async def save_prompt(
@@ -425,7 +435,7 @@ async def save_prompt(
     current_user = Depends(get_current_user)
 ):
     """Salvar um novo prompt"""
-    success = member_service.save_prompt(current_user.id, prompt_data)
+    success = get_member_area_service().save_prompt(current_user.id, prompt_data)
     
     if success:
         return {"message": "Prompt salvo com sucesso", "success": True}
@@ -443,7 +453,8 @@ async def generate_costar_prompt_protected(
     """Gerar prompt COSTAR com verificação de quota"""
     try:
         # 1. Verificar quota antes de gerar
-        quota_check = member_service.check_monthly_quota(current_user.id)
+        with span("quota"):
+            quota_check = get_member_area_service().check_monthly_quota(current_user.id)
         
         if not quota_check["allowed"]:
             raise HTTPException(
@@ -469,33 +480,30 @@ async def generate_costar_prompt_protected(
         
         # 3. Gerar o prompt
         start_time = time.time()
-        prompt_gerado = generate_costar_prompt_basic(prompt_obj)
+        with span("generate"):
+            prompt_gerado = generate_costar_prompt_basic(prompt_obj)
         response_time = time.time() - start_time
         
         # 4. Incrementar uso (quota)
-        member_service.increment_usage(current_user.id, "prompts_generated")
+        with span("quota_write"):
+            get_member_area_service().increment_usage(current_user.id, "prompts_generated")
         
-        # 5. Registrar analytics como o main_demo faz
+        # 5. Registrar analytics como o main_demo faz (enfileirado, gravado em lote)
         try:
-            from app.services.admin_analytics_service import AdminAnalyticsService
-            analytics = AdminAnalyticsService()
-            
-            analytics.log_api_usage(
+            track_api_usage(
                 provider="sistema",
                 user_id=current_user.id,
+                prompt_type="costar",
                 success=True,
                 response_time=response_time,
-                tokens_used=len(prompt_gerado.split()),
-                request_data={
-                    "contexto": prompt_obj.contexto[:100],
-                    "objetivo": prompt_obj.objetivo[:100]
-                }
+                tokens_used=len(prompt_gerado.split())
             )
         except Exception as analytics_error:
             logger.warning(f"Erro ao registrar analytics: {analytics_error}")
         
         # 6. Resposta com quota atualizada
-        quota_after = member_service.check_monthly_quota(current_user.id)
+        with span("quota"):
+            quota_after = get_member_area_service().check_monthly_quota(current_user.id)
         
         return {
             "success": True,
@@ -517,13 +525,14 @@ async def generate_costar_prompt_protected(
         )
 
 @member_router.get("/templates")
-async def get_user_templates(current_user = Depends(get_current_user)):
-    """Obter templates do usuário"""
-    templates = member_service.get_user_templates(current_user.id)
-    return {
-        "templates": templates,
-        "total": len(templates)
-    }
+async def get_user_templates(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user = Depends(get_current_user)
+):
+    """Obter templates do usuário (paginado por cursor)"""
+    page = _get_page(get_member_area_service().get_user_templates_page, current_user.id, cursor=cursor, limit=limit)
+    return _page_response("templates", page)
 
 @member_router.post("/templates")
 async def create_template(
@@ -532,7 +541,7 @@ async def create_template(
 ):
     """Criar template personalizado"""
     try:
-        template = member_service.create_prompt_template(
+        template = get_member_area_service().create_prompt_template(
             user_id=current_user.id,
             name=request.name,
             description=request.description,
@@ -550,20 +559,23 @@ async def create_template(
             detail=str(e)
         )
 
-@member_router.get("/templates")
-async def get_user_templates(current_user = Depends(get_current_user)):
-    """Obter templates do usuário"""
-    templates = member_service.get_user_templates(current_user.id)
-    return {"templates": templates}
-
 @member_router.get("/templates/public")
 async def get_public_templates(
     category: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: str = SORT_POPULAR
 ):
-    """Obter templates públicos - sem autenticação necessária"""
-    templates = member_service.get_public_templates(category, search)
-    return {"templates": templates}
+    """Obter templates públicos - sem autenticação necessária (paginado por cursor)"""
+    if sort not in (SORT_POPULAR, SORT_TRENDING):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ordenação inválida. Use '{SORT_POPULAR}' ou '{SORT_TRENDING}'"
+        )
+    page = _get_page(get_member_area_service().get_public_templates_page, category, search,
+                     cursor=cursor, limit=limit, sort=sort)
+    return _page_response("templates", page)
 
 @member_router.post("/templates/{template_id}/use")
 async def use_template(
@@ -571,7 +583,7 @@ async def use_template(
     current_user = Depends(get_current_user)
 ):
     """Usar um template"""
-    template = member_service.use_template(template_id, current_user.id)
+    template = get_member_area_service().use_template(template_id, current_user.id)
     
     if not template:
         raise HTTPException(
@@ -588,7 +600,7 @@ async def rate_template(
     current_user = Depends(get_current_user)
 ):
     """Avaliar template"""
-    success = member_service.rate_template(template_id, current_user.id, request.rating)
+    success = get_member_area_service().rate_template(template_id, current_user.id, request.rating)
     
     if not success:
         raise HTTPException(
@@ -606,7 +618,7 @@ async def upgrade_subscription(
     """Fazer upgrade da assinatura"""
     try:
         new_plan = SubscriptionPlan(request.new_plan)
-        success = member_service.upgrade_subscription(current_user.id, new_plan)
+        success = get_member_area_service().upgrade_subscription(current_user.id, new_plan)
         
         if not success:
             raise HTTPException(
@@ -645,7 +657,7 @@ async def change_password(
             )
         
         # Verificar senha atual usando o auth service
-        auth_result = auth_service.authenticate_user(current_user.email, current_password)
+        auth_result = get_auth_service().authenticate_user(current_user.email, current_password)
         if not auth_result or not auth_result.get("success"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -653,8 +665,7 @@ async def change_password(
             )
         
         # Atualizar senha no Supabase
-        from app.services.supabase_auth_service import SupabaseAuthService
-        supabase_auth = SupabaseAuthService()
+        supabase_auth = get_auth_service()
         
         success = supabase_auth.update_user_password(current_user.id, new_password)
         if not success:
@@ -701,7 +712,7 @@ async def update_security_settings(
         }
         
         # Atualizar usando o member service
-        success = member_service.update_user_profile(current_user.id, profile_data)
+        success = get_member_area_service().update_user_profile(current_user.id, profile_data)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -794,7 +805,7 @@ async def create_subscription(
         
         # Salvar assinatura (simulado)
         # Aqui você salvaria no banco de dados real
-        success = member_service.create_subscription(current_user.id, subscription_data)
+        success = get_member_area_service().create_subscription(current_user.id, subscription_data)
         
         if not success:
             raise HTTPException(
@@ -842,7 +853,7 @@ async def cancel_subscription(
         feedback = request.get("feedback", "")
         
         # Cancelar assinatura (simulado)
-        success = member_service.cancel_subscription(current_user.id)
+        success = get_member_area_service().cancel_subscription(current_user.id)
         
         if not success:
             raise HTTPException(
@@ -877,7 +888,7 @@ async def cancel_subscription(
 @admin_router.get("/dashboard")
 async def get_admin_dashboard(admin_user = Depends(get_admin_user)):
     """Obter dados do dashboard administrativo"""
-    metrics = analytics_service.get_dashboard_metrics()
+    metrics = get_admin_analytics_service().get_dashboard_metrics()
     return metrics
 
 @admin_router.get("/users")
@@ -885,7 +896,7 @@ async def get_all_users(admin_user = Depends(get_admin_user)):
     """Obter lista de todos os usuários"""
     try:
         print("DEBUG: Buscando todos os usuários...")
-        users = auth_service.get_all_users()
+        users = get_auth_service().get_all_users()
         print(f"DEBUG: Encontrados {len(users)} usuários")
         
         # Enriquecer com dados de perfil de membro
@@ -893,7 +904,7 @@ async def get_all_users(admin_user = Depends(get_admin_user)):
         for user in users:
             try:
                 print(f"DEBUG: Processando usuário {user.get('id', 'N/A')}")
-                profile = member_service.get_member_profile(user['id'])
+                profile = get_member_area_service().get_member_profile(user['id'])
                 enriched_users.append({
                     "id": user['id'],
                     "email": user['email'],
@@ -935,16 +946,16 @@ async def get_user_details(
     admin_user = Depends(get_admin_user)
 ):
     """Obter detalhes de um usuário específico"""
-    user = auth_service.get_user_by_id(user_id)
+    user = get_auth_service().get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Usuário não encontrado"
         )
     
-    profile = member_service.get_member_profile(user_id)
-    analytics = member_service.get_member_analytics(user_id)
-    templates = member_service.get_user_templates(user_id)
+    profile = get_member_area_service().get_member_profile(user_id)
+    analytics = get_member_area_service().get_member_analytics(user_id)
+    templates = get_member_area_service().get_user_templates(user_id)
     
     return {
         "user": user,
@@ -959,7 +970,7 @@ async def suspend_user(
     admin_user = Depends(get_admin_user)
 ):
     """Suspender usuário"""
-    success = auth_service.update_user(user_id, {"is_active": False})
+    success = get_auth_service().update_user(user_id, {"is_active": False})
     
     if not success:
         raise HTTPException(
@@ -975,7 +986,7 @@ async def activate_user(
     admin_user = Depends(get_admin_user)
 ):
     """Ativar usuário"""
-    success = auth_service.update_user(user_id, {"is_active": True})
+    success = get_auth_service().update_user(user_id, {"is_active": True})
     
     if not success:
         raise HTTPException(
@@ -986,47 +997,34 @@ async def activate_user(
     return {"message": "Usuário ativado com sucesso"}
 
 @admin_router.get("/templates")
-async def get_all_templates(admin_user = Depends(get_admin_user)):
-    """Obter todos os templates (público e privados)"""
-    try:
-        # Carregar templates diretamente do arquivo
-        import os
-        import json
-        
-        all_templates = []
-        
-        # Carregar templates públicos do arquivo
-        templates_file = "data/saved_templates.json"
-        if os.path.exists(templates_file):
-            with open(templates_file, 'r', encoding='utf-8') as f:
-                public_templates = json.load(f)
-                
-            for template in public_templates:
-                all_templates.append({
-                    "id": template.get('id'),
-                    "title": template.get('title'),
-                    "description": template.get('description'),
-                    "category": template.get('category'),
-                    "creator_name": template.get('creator_name'),
-                    "is_public": template.get('is_public', True),
-                    "usage_count": template.get('usage_count', 0),
-                    "rating": template.get('rating', 0),
-                    "created_at": template.get('created_at'),
-                    "style": template.get('style'),
-                    "tone": template.get('tone'),
-                    "format": template.get('format'),
-                    "tags": template.get('tags', []),
-                    "type": "public"
-                })
-        
-        print(f"DEBUG: Encontrados {len(all_templates)} templates")
-        return {"templates": all_templates}
-        
-    except Exception as e:
-        print(f"Erro ao buscar templates: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"templates": []}
+async def get_all_templates(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    admin_user = Depends(get_admin_user)
+):
+    """Obter todos os templates (público e privados), paginado por cursor"""
+    page = _get_page(get_member_area_service().get_all_templates_page, cursor=cursor, limit=limit)
+    
+    page["items"] = [
+        {
+            "id": template.get('id'),
+            "title": template.get('title'),
+            "description": template.get('description'),
+            "category": template.get('category'),
+            "creator_name": template.get('creator_name'),
+            "is_public": template.get('is_public', True),
+            "usage_count": template.get('usage_count', 0),
+            "rating": template.get('rating', 0),
+            "created_at": template.get('created_at'),
+            "style": template.get('style'),
+            "tone": template.get('tone'),
+            "format": template.get('format'),
+            "tags": template.get('tags', []),
+            "type": "public"
+        }
+        for template in page["items"]
+    ]
+    return _page_response("templates", page)
 
 @admin_router.delete("/templates/{template_id}")
 async def delete_template(
@@ -1039,19 +1037,118 @@ async def delete_template(
     return {"message": "Template removido com sucesso"}
 
 @admin_router.get("/analytics/export")
-async def export_analytics(admin_user = Depends(get_admin_user)):
-    """Exportar dados de analytics"""
-    metrics = analytics_service.get_dashboard_metrics()
+async def export_analytics(
+    admin_user = Depends(get_admin_user),
+    days: int = Query(90, ge=1, le=ANALYTICS_DAILY_RETENTION_DAYS)
+):
+    """Exportar dados de analytics (inclui a série diária de longo prazo das camadas agregadas)"""
+    service = get_admin_analytics_service()
+    metrics = service.get_dashboard_metrics()
     
     # Adicionar timestamp de exportação
     export_data = {
         "exported_at": datetime.now().isoformat(),
         "exported_by": admin_user.username,
-        "data": metrics
+        "data": metrics,
+        "trends": service.get_usage_trends(days)
     }
     
     return export_data
 
+@admin_router.get("/analytics/export/{dataset}")
+async def stream_analytics_export(
+    dataset: str,
+    admin_user = Depends(get_admin_user),
+    format: str = "jsonl",
+    granularity: str = "raw",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None)
+):
+    """Exportar eventos brutos (ou agregados por hora/dia) em streaming: CSV, JSONL ou Parquet"""
+    filters = {}
+    for item in filter or []:
+        field, separator, value = item.partition(":")
+        if not separator or not field.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Filtro inválido. Use campo:valor (ex.: provider:groq)"
+            )
+        filters[field.strip()] = value.strip()
+    selected_fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    
+    try:
+        export = AnalyticsExport(get_admin_analytics_service(), dataset, format, granularity,
+                                 since, until, selected_fields, filters)
+    except InvalidExportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    logger.info(f"📤 [EXPORT] {admin_user.username}: {dataset} ({granularity}, {format})")
+    return StreamingResponse(
+        export.stream(),
+        media_type=export.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename}"'}
+    )
+
+@admin_router.get("/analytics/trends")
+async def get_usage_trends(
+    admin_user = Depends(get_admin_user),
+    days: int = Query(90, ge=1, le=ANALYTICS_DAILY_RETENTION_DAYS)
+):
+    """Série diária (chamadas, erros, tokens, latência, usuários) juntando bruto e agregados"""
+    return get_admin_analytics_service().get_usage_trends(days)
+
+@admin_router.post("/analytics/compact")
+async def compact_analytics(admin_user = Depends(get_admin_user)):
+    """Rodar a compactação das camadas de retenção agora"""
+    import asyncio
+    job = get_compaction_job()
+    await asyncio.get_running_loop().run_in_executor(None, job.run_once)
+    return job.get_status()
+
+@admin_router.get("/analytics/latency")
+async def get_latency_percentiles(
+    admin_user = Depends(get_admin_user),
+    dimension: str = "provider",
+    key: Optional[str] = None,
+    hours: int = Query(24, ge=1, le=LATENCY_RETENTION_HOURS),
+    percentiles: str = "50,90,95,99",
+    series: bool = False
+):
+    """Percentis de latência (p50/p90/p95/p99/max) por provedor ou rota na janela de `hours` horas"""
+    if dimension not in DIMENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Dimensão inválida. Use {', '.join(DIMENSIONS)}"
+        )
+    try:
+        quantiles = tuple(float(value) for value in percentiles.split(",") if value.strip())
+    except ValueError:
+        quantiles = ()
+    if not quantiles or not all(0 < q <= 100 for q in quantiles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Percentis inválidos. Ex.: 50,90,95,99"
+        )
+    if series and not key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A série por hora exige o parâmetro 'key'"
+        )
+    
+    result = {
+        "dimension": dimension,
+        "hours": hours,
+        "keys": get_admin_analytics_service().get_latency_percentiles(dimension, key, hours, quantiles)
+    }
+    if series:
+        result["hourly"] = get_latency_store().hourly(dimension, key, hours, quantiles)
+    return result
+
 @admin_router.get("/logs")
 async def get_system_logs(
     admin_user = Depends(get_admin_user),
@@ -1115,6 +1212,111 @@ async def get_system_logs(
         "limit": limit
     }
 
+@admin_router.get("/diagnostics/profile")
+async def profile_worker_cpu(
+    admin_user = Depends(get_admin_user),
+    duration: float = Query(5.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    format: str = "collapsed",
+    include_idle: bool = False
+):
+    """Profile de CPU por amostragem do worker atual (stacks colapsadas para flamegraph)"""
+    import asyncio
+    if format not in ("collapsed", "json"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato inválido. Use 'collapsed' ou 'json'"
+        )
+    profiler = get_sampling_profiler()
+    try:
+        # A amostragem roda numa thread; o event loop segue livre para ser amostrado
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, profiler.sample, duration, interval_ms / 1000, include_idle
+        )
+    except DiagnosticsBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    logger.info(f"🔬 Profile de CPU por {admin_user.email}: {result['samples']} amostras em {result['duration']}s")
+    if format == "collapsed":
+        return PlainTextResponse(collapsed_text(result["stacks"]))
+    return {
+        "duration": result["duration"],
+        "interval": result["interval"],
+        "samples": result["samples"],
+        "top_functions": top_functions(result["stacks"]),
+        "stacks": [{"stack": stack, "count": count} for stack, count in result["stacks"].most_common(200)]
+    }
+
+@admin_router.post("/diagnostics/memory/start")
+async def start_memory_tracing(
+    admin_user = Depends(get_admin_user),
+    frames: int = Query(10, ge=1, le=50)
+):
+    """Ativar tracemalloc (tem custo enquanto ativo; desligar com /memory/stop)"""
+    return get_memory_profiler().start(frames)
+
+@admin_router.post("/diagnostics/memory/snapshot")
+async def take_memory_snapshot(
+    admin_user = Depends(get_admin_user),
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = "lineno"
+):
+    """Top alocações e diff em relação ao snapshot anterior"""
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Agrupamento inválido. Use 'lineno', 'filename' ou 'traceback'"
+        )
+    try:
+        return get_memory_profiler().snapshot(limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@admin_router.post("/diagnostics/memory/stop")
+async def stop_memory_tracing(admin_user = Depends(get_admin_user)):
+    """Desativar tracemalloc e descartar o snapshot de referência"""
+    return get_memory_profiler().stop()
+
+@admin_router.get("/diagnostics/loop-lag")
+async def get_event_loop_lag(
+    admin_user = Depends(get_admin_user),
+    duration: float = Query(2.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(50.0, ge=1, le=1000)
+):
+    """Medir o atraso do event loop deste worker durante `duration` segundos"""
+    from app.services.loop_monitor import get_loop_monitor
+    return {
+        "measurement": await measure_loop_lag(duration, interval_ms / 1000),
+        "monitor": get_loop_monitor().get_status()
+    }
+
+def _get_page(page_method, *args, **kwargs) -> Dict[str, Any]:
+    """Executar consulta paginada convertendo cursor inválido em 400"""
+    try:
+        return page_method(*args, **kwargs)
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def _page_response(items_key: str, page: Dict[str, Any]) -> Dict[str, Any]:
+    """Formatar página no formato de resposta das listagens"""
+    return {
+        items_key: page["items"],
+        "total": page["total"],
+        "total_is_estimate": page["total_is_estimate"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+        "limit": page["limit"]
+    }
+
 def parse_log_line(line: str, source_file: str) -> dict:
     """Parse de uma linha de log"""
     # Patterns para diferentes formatos de log
@@ -1169,7 +1371,7 @@ def parse_log_line(line: str, source_file: str) -> dict:
 def log_api_usage(provider: str, user_id: str, prompt_type: str, response_time: float, 
                  success: bool, error_message: Optional[str] = None):
     """Função helper para logar uso da API"""
-    analytics_service.log_api_usage(
+    track_api_usage(
         provider=provider,
         user_id=user_id,
         prompt_type=prompt_type,
@@ -1180,7 +1382,7 @@ def log_api_usage(provider: str, user_id: str, prompt_type: str, response_time:
 
 def log_user_activity(user_id: str, action: str, details: Dict):
     """Função helper para logar atividade do usuário"""
-    analytics_service.log_user_activity(
+    track_user_activity(
         user_id=user_id,
         action=action,
         details=details
@@ -162,23 +162,20 @@ async def test_connection() -> Dict[str, Any]:
     supabase_config = check_configuration()
     results['supabase_config'] = supabase_config
     
-    # Testa IAs (se disponível - importação condicional)
+    # IAs: snapshot das verificações de saúde (sem gerar conteúdo a cada chamada)
     try:
-        from app.services.multi_ai_service import MultiAIService
-        ai_service = MultiAIService()
-        
-        # Teste rápido com prompt simples
-        test_result = await ai_service.generate_text(
-            "Teste de conexão - responda apenas 'OK'",
-            max_tokens=10,
-            temperature=0.1
-        )
+        from app.services.provider_health import get_provider_health_monitor
+        monitor = get_provider_health_monitor()
+        if monitor.last_refresh is None:
+            await monitor.refresh()
+        snapshot = monitor.get_snapshot()
         
         results['ai_service'] = {
-            'available': True,
-            'working': test_result['success'],
-            'provider_used': test_result.get('provider_used', 'unknown'),
-            'response_preview': test_result.get('result', '')[:50] if test_result.get('result') else None
+            'available': bool(snapshot['providers']),
+            'working': bool(snapshot['healthy_providers']),
+            'provider_used': snapshot['healthy_providers'][0] if snapshot['healthy_providers'] else None,
+            'checked_at': snapshot['last_refresh'],
+            'providers': snapshot['providers']
         }
         
     except Exception as e:
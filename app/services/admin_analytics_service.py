@@ -6,9 +6,27 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
+import threading
 import uuid
 from collections import defaultdict, Counter
 
+from app.services.analytics_rollups import (
+    ANALYTICS_DAILY_RETENTION_DAYS,
+    ANALYTICS_HOURLY_RETENTION_DAYS,
+    ANALYTICS_RAW_MAX_ACTIVITIES,
+    ANALYTICS_RAW_MAX_API_LOGS,
+    ANALYTICS_RAW_RETENTION_DAYS,
+    ActivityRollup,
+    ApiUsageRollup,
+    RollupStore,
+    day_key,
+    record_time,
+    split_by_age,
+)
+from app.services.analytics_columns import ApiLogColumns, columnar_enabled, percentile
+from app.services.latency_histograms import DEFAULT_PERCENTILES, DIMENSION_PROVIDER, LatencyHistogram, get_latency_store
+from app.services.metrics import ANALYTICS_WRITE_DURATION, timed
+
 @dataclass
 class APIUsageLog:
     id: str
@@ -50,6 +68,14 @@ class AdminAnalyticsService:
         self.api_logs_file = 'data/api_usage_logs.json'
         self.user_activity_file = 'data/user_activities.json'
         self.metrics_file = 'data/system_metrics.json'
+        self._api_columns = None  # (versão do arquivo, ApiLogColumns)
+        self._latency_bootstrapped = False
+        self._latency_lock = threading.Lock()
+        # Camadas agregadas (por hora e por dia) do que saiu dos logs brutos
+        self.api_rollups = RollupStore('data/api_usage_rollups.json', ApiUsageRollup, 'request_time')
+        self.activity_rollups = RollupStore('data/user_activity_rollups.json', ActivityRollup, 'timestamp')
+        # Serializa escritas dos logs brutos e a compactação (lote do barramento x job)
+        self._write_lock = threading.RLock()
         self._ensure_data_files()
     
     def _ensure_data_files(self):
@@ -61,44 +87,99 @@ class AdminAnalyticsService:
                 with open(file_path, 'w') as f:
                     json.dump([], f)
     
+    @timed(ANALYTICS_WRITE_DURATION.labels("api_usage"), span_name="analytics")
     def log_api_usage(self, provider: str, user_id: Optional[str], prompt_type: str, 
                      response_time: float, success: bool, error_message: Optional[str] = None,
                      tokens_used: int = 0, ip_address: str = "", user_agent: str = ""):
         """Registrar uso da API"""
-        log_entry = APIUsageLog(
+        log_entry = self.build_api_usage_entry(provider, user_id, prompt_type, response_time, success,
+                                               error_message, tokens_used, ip_address, user_agent)
+        
+        with self._write_lock:
+            logs = self._load_api_logs()
+            logs.append(log_entry)
+            self._save_api_logs(logs)
+    
+    @timed(ANALYTICS_WRITE_DURATION.labels("user_activity"), span_name="analytics")
+    def log_user_activity(self, user_id: str, action: str, details: Dict,
+                         ip_address: str = "", user_agent: str = ""):
+        """Registrar atividade do usuário"""
+        activity = self.build_user_activity_entry(user_id, action, details, ip_address, user_agent)
+        
+        with self._write_lock:
+            activities = self._load_user_activities()
+            activities.append(activity)
+            self._save_user_activities(activities)
+    
+    @staticmethod
+    def build_api_usage_entry(provider: str, user_id: Optional[str], prompt_type: str,
+                              response_time: float, success: bool, error_message: Optional[str] = None,
+                              tokens_used: int = 0, ip_address: str = "", user_agent: str = "",
+                              request_time: Optional[datetime] = None) -> Dict:
+        """Montar o registro de uso da API (request_time = momento do evento, não da gravação)"""
+        return asdict(APIUsageLog(
             id=str(uuid.uuid4()),
             provider=provider,
             user_id=user_id,
             prompt_type=prompt_type,
-            request_time=datetime.now(),
+            request_time=request_time or datetime.now(),
             response_time=response_time,
             success=success,
             error_message=error_message,
             tokens_used=tokens_used,
             ip_address=ip_address,
             user_agent=user_agent
-        )
-        
-        logs = self._load_api_logs()
-        logs.append(asdict(log_entry))
-        self._save_api_logs(logs)
+        ))
     
-    def log_user_activity(self, user_id: str, action: str, details: Dict,
-                         ip_address: str = "", user_agent: str = ""):
-        """Registrar atividade do usuário"""
-        activity = UserActivity(
+    @staticmethod
+    def build_user_activity_entry(user_id: str, action: str, details: Dict, ip_address: str = "",
+                                  user_agent: str = "", timestamp: Optional[datetime] = None) -> Dict:
+        """Montar o registro de atividade do usuário"""
+        return asdict(UserActivity(
             id=str(uuid.uuid4()),
             user_id=user_id,
             action=action,
-            timestamp=datetime.now(),
+            timestamp=timestamp or datetime.now(),
             details=details,
             ip_address=ip_address,
             user_agent=user_agent
+        ))
+    
+    @timed(ANALYTICS_WRITE_DURATION.labels("batch"))
+    def log_batch(self, api_usage: List[Dict], user_activities: List[Dict]):
+        """Gravar um lote de registros já montados: uma leitura e uma escrita por arquivo"""
+        with self._write_lock:
+            if api_usage:
+                logs = self._load_api_logs()
+                logs.extend(api_usage)
+                self._save_api_logs(logs)
+            if user_activities:
+                activities = self._load_user_activities()
+                activities.extend(user_activities)
+                self._save_user_activities(activities)
+    
+    def compact_logs(self, now: Optional[datetime] = None) -> Dict:
+        """Compactação: bruto antigo → agregados por hora, horas antigas → dias, dias expirados fora"""
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=ANALYTICS_RAW_RETENTION_DAYS)
+        tiers = (
+            ('api_usage', self.api_rollups, self._load_api_logs, self._save_api_logs,
+             'request_time', ANALYTICS_RAW_MAX_API_LOGS),
+            ('user_activity', self.activity_rollups, self._load_user_activities, self._save_user_activities,
+             'timestamp', ANALYTICS_RAW_MAX_ACTIVITIES)
         )
-        
-        activities = self._load_user_activities()
-        activities.append(asdict(activity))
-        self._save_user_activities(activities)
+        result = {}
+        with self._write_lock:
+            for name, store, load, save, time_field, max_rows in tiers:
+                expired, kept = split_by_age(load(), time_field, cutoff, max_rows)
+                rolled_up = store.absorb(expired)
+                stats = store.compact(now)
+                # Agregados antes do bruto: uma falha no meio duplica contagens, mas não perde histórico
+                store.save()
+                if expired:
+                    save(kept)
+                result[name] = {'raw_kept': len(kept), 'raw_rolled_up': rolled_up, **stats}
+        return result
     
     def get_dashboard_metrics(self) -> Dict:
         """Obter métricas para o dashboard administrativo"""
@@ -108,42 +189,286 @@ class AdminAnalyticsService:
         last_30d = now - timedelta(days=30)
         
         # Carregar dados
-        api_logs = self._load_api_logs()
         user_activities = self._load_user_activities()
         
-        # Filtros por período
-        logs_24h = [log for log in api_logs if datetime.fromisoformat(log['request_time']) >= last_24h]
-        logs_7d = [log for log in api_logs if datetime.fromisoformat(log['request_time']) >= last_7d]
-        
         activities_24h = [act for act in user_activities if datetime.fromisoformat(act['timestamp']) >= last_24h]
         activities_7d = [act for act in user_activities if datetime.fromisoformat(act['timestamp']) >= last_7d]
         
-        # Métricas de API
-        api_metrics = self._calculate_api_metrics(api_logs, logs_24h, logs_7d)
+        # Métricas de API, prompts, performance e gráficos: colunar (NumPy) ou Python puro
+        if columnar_enabled():
+            columns = self._load_api_columns()
+            api_sections = columns.dashboard_sections(now)
+            raw_api_users = {user for user in columns.users if user}
+        else:
+            api_logs = self._load_api_logs()
+            api_sections = self._calculate_api_sections(api_logs, now)
+            raw_api_users = {log['user_id'] for log in api_logs if log['user_id']}
         
         # Métricas de usuários
         user_metrics = self._calculate_user_metrics(user_activities, activities_24h, activities_7d)
         
-        # Métricas de prompts
-        prompt_metrics = self._calculate_prompt_metrics(api_logs, logs_24h, logs_7d)
+        # Somar o que já saiu do bruto para as camadas por hora/dia
+        self._merge_api_rollups(api_sections, now, raw_api_users)
+        self._merge_activity_rollups(user_metrics, now, user_activities, activities_24h, activities_7d)
         
-        # Performance
-        performance_metrics = self._calculate_performance_metrics(logs_24h)
+        # Cauda de latência por provedor (a média sozinha esconde p95/p99)
+        api_sections['performance']['provider_latency_24h'] = self.get_latency_percentiles(DIMENSION_PROVIDER)
         
+        overview = api_sections['overview']
+        return {
+            'overview': {
+                'total_api_calls': overview['total_api_calls'],
+                'api_calls_24h': overview['api_calls_24h'],
+                'total_users': user_metrics['total_unique_users'],
+                'active_users_24h': user_metrics['active_users_24h'],
+                'error_rate_24h': overview['error_rate_24h'],
+                'avg_response_time_24h': overview['avg_response_time_24h']
+            },
+            'api_usage': api_sections['api_usage'],
+            'user_activity': user_metrics,
+            'prompt_generation': api_sections['prompt_generation'],
+            'performance': api_sections['performance'],
+            'charts_data': api_sections['charts_data']
+        }
+    
+    def get_latency_percentiles(self, dimension: str, key: Optional[str] = None, hours: int = 24,
+                                quantiles=DEFAULT_PERCENTILES) -> Dict:
+        """Percentis de latência por chave na janela, combinando os histogramas por hora"""
+        if dimension == DIMENSION_PROVIDER:
+            # Normalmente já feito no startup; aqui cobre processos sem lifespan
+            self.bootstrap_latency()
+        return get_latency_store().summary(dimension, key, hours, quantiles)
+    
+    def bootstrap_latency(self) -> int:
+        """
+        Processo novo: preencher os histogramas de provedor a partir dos logs gravados (uma vez)
+        Só entram logs anteriores à primeira amostra ao vivo do provedor, que já está no histograma
+        """
+        with self._latency_lock:
+            if self._latency_bootstrapped:
+                return 0
+            self._latency_bootstrapped = True
+            store = get_latency_store()
+            loaded = 0
+            for log in self._load_api_logs():
+                try:
+                    timestamp = datetime.fromisoformat(log['request_time']).timestamp()
+                    first_live = store.first_live_sample(DIMENSION_PROVIDER, log['provider'])
+                    if first_live is not None and timestamp >= first_live:
+                        continue
+                    store.record(DIMENSION_PROVIDER, log['provider'], float(log['response_time']), timestamp)
+                    loaded += 1
+                except (KeyError, TypeError, ValueError):
+                    continue
+            return loaded
+    
+    def _merge_api_rollups(self, sections: Dict, now: datetime, raw_users: set):
+        """Somar os agregados por hora/dia às seções calculadas sobre os logs brutos"""
+        rolled = self.api_rollups.window()
+        if not rolled.count:
+            return
+        last_24h = now - timedelta(hours=24)
+        rolled_24h = self.api_rollups.window(last_24h)
+        rolled_7d = self.api_rollups.window(now - timedelta(days=7))
+        overview = sections['overview']
+        usage = sections['api_usage']
+        prompts = sections['prompt_generation']
+        performance = sections['performance']
+        raw_24h = overview['api_calls_24h']
+        
+        # Por provedor: reconstruir somas a partir das taxas e médias do bruto
+        provider_usage = Counter(usage['provider_usage'])
+        provider_usage_24h = Counter(usage['provider_usage_24h'])
+        successes = {provider: usage['provider_success_rates'][provider] * count / 100
+                     for provider, count in provider_usage.items()}
+        response_sums = {provider: usage['provider_response_times'].get(provider, 0) * count
+                         for provider, count in provider_usage_24h.items()}
+        for provider, stats in rolled.providers.items():
+            provider_usage[provider] += stats['count']
+            successes[provider] = successes.get(provider, 0) + stats['success']
+        for provider, stats in rolled_24h.providers.items():
+            provider_usage_24h[provider] += stats['count']
+            response_sums[provider] = response_sums.get(provider, 0) + stats['response_time_sum']
+        usage.update({
+            'provider_usage': dict(provider_usage),
+            'provider_usage_24h': dict(provider_usage_24h),
+            'provider_success_rates': {provider: successes[provider] / count * 100
+                                       for provider, count in provider_usage.items()},
+            'provider_response_times': {provider: response_sums[provider] / provider_usage_24h[provider]
+                                        if provider_usage_24h[provider] else 0 for provider in provider_usage},
+            'most_used_provider': max(provider_usage, key=provider_usage.get),
+            'total_requests_7d': usage['total_requests_7d'] + rolled_7d.count
+        })
+        
+        total_prompts = prompts['total_prompts_generated'] + rolled.count
+        daily_pattern = Counter(prompts['daily_generation_pattern'])
+        for day, bucket in self.api_rollups.daily_buckets(now - timedelta(days=7)).items():
+            daily_pattern[day] += bucket.count
+        prompts.update({
+            'total_prompts_generated': total_prompts,
+            'prompts_generated_24h': prompts['prompts_generated_24h'] + rolled_24h.count,
+            'prompts_generated_7d': prompts['prompts_generated_7d'] + rolled_7d.count,
+            'prompt_type_distribution': dict(Counter(prompts['prompt_type_distribution']) + rolled.prompt_types),
+            'prompt_type_distribution_24h': dict(Counter(prompts['prompt_type_distribution_24h']) + rolled_24h.prompt_types),
+            'total_tokens_used': prompts['total_tokens_used'] + rolled.tokens,
+            'tokens_used_24h': prompts['tokens_used_24h'] + rolled_24h.tokens,
+            'daily_generation_pattern': dict(sorted(daily_pattern.items())),
+            'avg_prompts_per_user': total_prompts / len(raw_users | rolled.users) if raw_users | rolled.users else 0
+        })
+        
+        if rolled_24h.count:
+            # Só quando o limite de linhas empurrou registros recentes para a camada por hora
+            raw_times = [log['response_time'] for log in self._load_api_logs()
+                         if datetime.fromisoformat(log['request_time']) >= last_24h]
+            histogram = LatencyHistogram().merge(rolled_24h.latency)
+            for response_time in raw_times:
+                histogram.record(response_time)
+            calls = raw_24h + rolled_24h.count
+            errors = performance.get('total_errors_24h', 0) + rolled_24h.count - rolled_24h.success
+            performance.update({
+                'avg_response_time': (performance['avg_response_time'] * raw_24h + rolled_24h.response_time_sum) / calls,
+                'min_response_time': min(raw_times + [rolled_24h.response_time_min]),
+                'max_response_time': max(raw_times + [rolled_24h.response_time_max]),
+                'p95_response_time': histogram.percentiles([95])['p95'] / 1000,
+                'uptime_percentage': (calls - errors) / calls * 100,
+                'error_breakdown': dict(Counter(performance['error_breakdown']) + rolled_24h.errors),
+                'total_errors_24h': errors
+            })
+            overview.update({
+                'api_calls_24h': calls,
+                'error_rate_24h': errors / calls * 100,
+                'avg_response_time_24h': performance['avg_response_time']
+            })
+        overview['total_api_calls'] += rolled.count
+        
+        charts = sections['charts_data']
+        timeline = charts['timeline']
+        rolled_days = self.api_rollups.daily_buckets(now - timedelta(days=7))
+        raw_logs = None
+        for i, date in enumerate(timeline['dates']):
+            bucket = rolled_days.get(date)
+            if bucket is None:
+                continue
+            if raw_logs is None:
+                raw_logs = self._load_api_logs()
+            raw_day_users = {log['user_id'] for log in raw_logs
+                             if log['user_id'] and log['request_time'][:10] == date}
+            timeline['api_calls'][i] += bucket.count
+            timeline['active_users'][i] = len(raw_day_users | bucket.users)
+        charts['provider_distribution'] = {
+            'labels': list(provider_usage.keys()),
+            'data': list(provider_usage.values())
+        }
+    
+    def _merge_activity_rollups(self, user_metrics: Dict, now: datetime, all_activities: List,
+                                activities_24h: List, activities_7d: List):
+        """Somar os agregados de atividades às métricas de usuários"""
+        rolled = self.activity_rollups.window()
+        if not rolled.count:
+            return
+        last_24h = now - timedelta(hours=24)
+        rolled_24h = self.activity_rollups.window(last_24h)
+        rolled_7d = self.activity_rollups.window(now - timedelta(days=7))
+        users = {act['user_id'] for act in all_activities if act['user_id']} | rolled.users
+        users_24h = {act['user_id'] for act in activities_24h if act['user_id']} | rolled_24h.users
+        users_7d = {act['user_id'] for act in activities_7d if act['user_id']} | rolled_7d.users
+        
+        hourly_activity = Counter(user_metrics['hourly_activity_pattern'])
+        for start, bucket in self.activity_rollups.hourly_buckets(last_24h):
+            hourly_activity[start.hour] += bucket.count
+        
+        user_metrics.update({
+            'total_unique_users': len(users),
+            'active_users_24h': len(users_24h),
+            'active_users_7d': len(users_7d),
+            'action_distribution': dict(Counter(user_metrics['action_distribution']) + rolled.actions),
+            'action_distribution_24h': dict(Counter(user_metrics['action_distribution_24h']) + rolled_24h.actions),
+            'hourly_activity_pattern': dict(hourly_activity),
+            'user_retention_7d': len(users_7d) / len(users) * 100 if users else 0
+        })
+    
+    def get_usage_trends(self, days: int = 90, now: Optional[datetime] = None) -> Dict:
+        """Série diária de longo prazo juntando bruto, agregados por hora e por dia"""
+        now = now or datetime.now()
+        since = (now - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        api_days = self.api_rollups.daily_buckets(since)
+        for log in self._load_api_logs():
+            try:
+                moment = record_time(log['request_time'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if moment >= since:
+                api_days.setdefault(day_key(moment), ApiUsageRollup()).add(log)
+        
+        activity_days = self.activity_rollups.daily_buckets(since)
+        for activity in self._load_user_activities():
+            try:
+                moment = record_time(activity['timestamp'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if moment >= since:
+                activity_days.setdefault(day_key(moment), ActivityRollup()).add(activity)
+        
+        series = []
+        for day in sorted(set(api_days) | set(activity_days)):
+            api = api_days.get(day, ApiUsageRollup())
+            activity = activity_days.get(day, ActivityRollup())
+            series.append({
+                'date': day,
+                'api_calls': api.count,
+                'success_rate': api.success / api.count * 100 if api.count else 100,
+                'tokens_used': api.tokens,
+                'avg_response_time': api.response_time_sum / api.count if api.count else 0,
+                'p95_response_time': api.latency.percentiles([95])['p95'] / 1000,
+                'unique_users': len(api.users),
+                'active_users': len(activity.users),
+                'user_actions': activity.count
+            })
+        
+        return {
+            'days': days,
+            'since': since.date().isoformat(),
+            'series': series,
+            'retention': {
+                'raw_days': ANALYTICS_RAW_RETENTION_DAYS,
+                'hourly_days': ANALYTICS_HOURLY_RETENTION_DAYS,
+                'daily_days': ANALYTICS_DAILY_RETENTION_DAYS,
+                'api_usage': self.api_rollups.get_status(),
+                'user_activity': self.activity_rollups.get_status()
+            }
+        }
+    
+    def _load_api_columns(self) -> ApiLogColumns:
+        """Colunas dos logs de API, reconstruídas só quando o arquivo muda"""
+        try:
+            stat = os.stat(self.api_logs_file)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            version = None
+        if self._api_columns is None or self._api_columns[0] != version:
+            self._api_columns = (version, ApiLogColumns(self._load_api_logs()))
+        return self._api_columns[1]
+    
+    def _calculate_api_sections(self, api_logs: List, now: datetime) -> Dict:
+        """Caminho em Python puro (sem NumPy) com o mesmo formato de ApiLogColumns.dashboard_sections"""
+        last_24h = now - timedelta(hours=24)
+        last_7d = now - timedelta(days=7)
+        logs_24h = [log for log in api_logs if datetime.fromisoformat(log['request_time']) >= last_24h]
+        logs_7d = [log for log in api_logs if datetime.fromisoformat(log['request_time']) >= last_7d]
+        
+        performance = self._calculate_performance_metrics(logs_24h)
         return {
             'overview': {
                 'total_api_calls': len(api_logs),
                 'api_calls_24h': len(logs_24h),
-                'total_users': len(set(act['user_id'] for act in user_activities if act['user_id'])),
-                'active_users_24h': len(set(act['user_id'] for act in activities_24h if act['user_id'])),
                 'error_rate_24h': (len([log for log in logs_24h if not log['success']]) / len(logs_24h) * 100) if logs_24h else 0,
-                'avg_response_time_24h': sum(log['response_time'] for log in logs_24h) / len(logs_24h) if logs_24h else 0
+                'avg_response_time_24h': performance['avg_response_time']
             },
-            'api_usage': api_metrics,
-            'user_activity': user_metrics,
-            'prompt_generation': prompt_metrics,
-            'performance': performance_metrics,
-            'charts_data': self._generate_charts_data(api_logs, user_activities)
+            'api_usage': self._calculate_api_metrics(api_logs, logs_24h, logs_7d),
+            'prompt_generation': self._calculate_prompt_metrics(api_logs, logs_24h, logs_7d),
+            'performance': performance,
+            'charts_data': self._generate_charts_data(api_logs, [])
         }
     
     def _calculate_api_metrics(self, all_logs: List, logs_24h: List, logs_7d: List) -> Dict:
@@ -152,19 +477,21 @@ class AdminAnalyticsService:
         provider_usage = Counter(log['provider'] for log in all_logs)
         provider_usage_24h = Counter(log['provider'] for log in logs_24h)
         
-        # Taxa de sucesso por provedor
-        provider_success = {}
-        for provider in provider_usage.keys():
-            provider_logs = [log for log in all_logs if log['provider'] == provider]
-            success_count = sum(1 for log in provider_logs if log['success'])
-            provider_success[provider] = (success_count / len(provider_logs) * 100) if provider_logs else 0
+        # Taxa de sucesso por provedor (uma passada sobre os logs)
+        success_counts = Counter(log['provider'] for log in all_logs if log['success'])
+        provider_success = {
+            provider: success_counts[provider] / count * 100
+            for provider, count in provider_usage.items()
+        }
         
         # Tempo de resposta por provedor
-        provider_response_times = {}
-        for provider in provider_usage.keys():
-            provider_logs = [log for log in logs_24h if log['provider'] == provider]
-            avg_time = sum(log['response_time'] for log in provider_logs) / len(provider_logs) if provider_logs else 0
-            provider_response_times[provider] = avg_time
+        response_sums = defaultdict(float)
+        for log in logs_24h:
+            response_sums[log['provider']] += log['response_time']
+        provider_response_times = {
+            provider: response_sums[provider] / provider_usage_24h[provider] if provider_usage_24h[provider] else 0
+            for provider in provider_usage
+        }
         
         return {
             'provider_usage': dict(provider_usage),
@@ -245,9 +572,8 @@ class AdminAnalyticsService:
         response_times = [log['response_time'] for log in logs_24h]
         response_times.sort()
         
-        # Percentil 95
-        p95_index = int(len(response_times) * 0.95)
-        p95_time = response_times[p95_index] if p95_index < len(response_times) else response_times[-1]
+        # Percentil 95 (interpolação linear, igual ao caminho NumPy)
+        p95_time = percentile(response_times, 95)
         
         # Breakdown de erros
         error_logs = [log for log in logs_24h if not log['success']]
@@ -326,12 +652,15 @@ class AdminAnalyticsService:
     
     def _save_api_logs(self, logs: List):
         """Salvar logs de API"""
-        # Manter apenas os últimos 10000 logs para performance
-        if len(logs) > 10000:
-            logs = logs[-10000:]
-        
-        with open(self.api_logs_file, 'w') as f:
-            json.dump(logs, f, indent=2, default=str)
+        # Manter só as últimas N linhas no bruto; o excedente é resumido por hora, não descartado
+        if ANALYTICS_RAW_MAX_API_LOGS and len(logs) > ANALYTICS_RAW_MAX_API_LOGS:
+            # Cortar até 90% do limite para não regravar os agregados a cada lote
+            keep = ANALYTICS_RAW_MAX_API_LOGS * 9 // 10
+            self.api_rollups.absorb(logs[:-keep])
+            self.api_rollups.save()
+            logs = logs[-keep:]
+        
+        self._write_json_atomic(self.api_logs_file, logs)
     
     def _load_user_activities(self) -> List:
         """Carregar atividades de usuários"""
@@ -343,9 +672,28 @@ class AdminAnalyticsService:
     
     def _save_user_activities(self, activities: List):
         """Salvar atividades de usuários"""
-        # Manter apenas os últimos 5000 registros
-        if len(activities) > 5000:
-            activities = activities[-5000:]
-        
-        with open(self.user_activity_file, 'w') as f:
-            json.dump(activities, f, indent=2, default=str)
\ No newline at end of file
+        # Mesmo esquema dos logs de API
+        if ANALYTICS_RAW_MAX_ACTIVITIES and len(activities) > ANALYTICS_RAW_MAX_ACTIVITIES:
+            keep = ANALYTICS_RAW_MAX_ACTIVITIES * 9 // 10
+            self.activity_rollups.absorb(activities[:-keep])
+            self.activity_rollups.save()
+            activities = activities[-keep:]
+        
+        self._write_json_atomic(self.user_activity_file, activities)
+
+    def _write_json_atomic(self, path: str, data: List):
+        """Gravar em arquivo temporário e renomear: leitores (ex.: exportação em streaming) nunca veem arquivo pela metade"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(temp_path, path)
+
+# Instância global (lazy loading)
+_admin_analytics_service: Optional[AdminAnalyticsService] = None
+
+def get_admin_analytics_service() -> AdminAnalyticsService:
+    """Obter instância do serviço de analytics com lazy loading"""
+    global _admin_analytics_service
+    if _admin_analytics_service is None:
+        _admin_analytics_service = AdminAnalyticsService()
+    return _admin_analytics_service
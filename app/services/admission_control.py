@@ -0,0 +1,237 @@
+"""
+Controle de admissão para geração com IA
+Fila por prioridade de plano (ENTERPRISE > PREMIUM > FREE > anônimo), com
+fatia de concorrência e profundidade máxima de fila por plano. Sob saturação,
+trabalho de baixa prioridade é descartado na hora (load shedding) para o
+gerador básico, em vez de esperar.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS = "anonymous"
+
+# Menor número = maior prioridade
+PLAN_PRIORITY = {
+    "enterprise": 0,
+    "premium": 1,
+    "free": 2,
+    ANONYMOUS: 3,
+}
+
+# Papéis emitidos no JWT -> plano usado na admissão
+ROLE_TO_PLAN = {
+    "admin": "enterprise",
+    "enterprise": "enterprise",
+    "pro": "premium",
+    "premium": "premium",
+    "free": "free",
+}
+
+DEFAULT_SHARES = {"enterprise": 1.0, "premium": 0.75, "free": 0.5, ANONYMOUS: 0.25}
+DEFAULT_QUEUE_LIMITS = {"enterprise": 32, "premium": 16, "free": 8, ANONYMOUS: 4}
+DEFAULT_MAX_QUEUE_WAIT = {"enterprise": 10.0, "premium": 6.0, "free": 2.0, ANONYMOUS: 1.0}
+
+class AdmissionRejected(Exception):
+    """Requisição descartada pelo controle de admissão"""
+
+    def __init__(self, plan: str, reason: str):
+        self.plan = plan
+        self.reason = reason
+        super().__init__(f"Admissão recusada para plano {plan}: {reason}")
+
+def normalize_plan(plan: Any) -> str:
+    """Aceitar SubscriptionPlan, papel do JWT ou string; desconhecido vira anônimo"""
+    if plan is None:
+        return ANONYMOUS
+    value = str(getattr(plan, "value", plan)).lower()
+    if value in PLAN_PRIORITY:
+        return value
+    return ROLE_TO_PLAN.get(value, ANONYMOUS)
+
+def resolve_plan_from_token(token: Optional[str], secret: str, algorithm: str = "HS256") -> str:
+    """Plano a partir do papel no JWT, sem consultar o banco; token inválido = anônimo"""
+    if not token:
+        return ANONYMOUS
+    try:
+        import jwt
+        payload = jwt.decode(token, secret, algorithms=[algorithm])
+    except Exception:
+        return ANONYMOUS
+    return normalize_plan(payload.get("plan") or payload.get("role") or "free")
+
+class AdmissionController:
+    """Semáforo com fila por prioridade de plano e descarte sob saturação"""
+
+    def __init__(self, max_concurrency: int = 8, shares: Optional[Dict[str, float]] = None,
+                 queue_limits: Optional[Dict[str, int]] = None,
+                 max_queue_wait: Optional[Dict[str, float]] = None,
+                 saturation_depth: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.shares = {**DEFAULT_SHARES, **(shares or {})}
+        self.queue_limits = {**DEFAULT_QUEUE_LIMITS, **(queue_limits or {})}
+        self.max_queue_wait = {**DEFAULT_MAX_QUEUE_WAIT, **(max_queue_wait or {})}
+        # Com a fila total nesse tamanho, FREE e anônimos não entram mais na fila
+        self.saturation_depth = saturation_depth if saturation_depth is not None else max_concurrency
+
+        self._running = 0
+        self._running_by_plan: Dict[str, int] = {plan: 0 for plan in PLAN_PRIORITY}
+        self._queues: Dict[str, Deque[asyncio.Future]] = {plan: deque() for plan in PLAN_PRIORITY}
+        self._stats: Dict[str, Dict[str, int]] = {
+            plan: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0} for plan in PLAN_PRIORITY
+        }
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Configuração via ADMISSION_MAX_CONCURRENCY e ADMISSION_SATURATION_DEPTH"""
+        max_concurrency = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+        saturation = os.getenv("ADMISSION_SATURATION_DEPTH")
+        return cls(max_concurrency=max_concurrency,
+                   saturation_depth=int(saturation) if saturation else None)
+
+    def plan_limit(self, plan: str) -> int:
+        """Máximo de execuções simultâneas permitidas a um plano"""
+        return max(1, int(self.max_concurrency * self.shares.get(plan, 0.25)))
+
+    def _can_run(self, plan: str) -> bool:
+        return self._running < self.max_concurrency and self._running_by_plan[plan] < self.plan_limit(plan)
+
+    def _waiting_at_or_above(self, plan: str) -> bool:
+        """Há alguém com prioridade igual ou maior esperando? (não furar a fila)"""
+        priority = PLAN_PRIORITY[plan]
+        return any(self._queues[other] for other, value in PLAN_PRIORITY.items() if value <= priority)
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _start(self, plan: str):
+        self._running += 1
+        self._running_by_plan[plan] += 1
+        self._stats[plan]["admitted"] += 1
+
+    def _release(self, plan: str):
+        self._running -= 1
+        self._running_by_plan[plan] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Entregar vagas livres aos primeiros da fila, por ordem de prioridade"""
+        for plan in sorted(PLAN_PRIORITY, key=PLAN_PRIORITY.get):
+            queue = self._queues[plan]
+            while queue and self._can_run(plan):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._start(plan)
+                waiter.set_result(True)
+            if self._running >= self.max_concurrency:
+                return
+
+    def _shed(self, plan: str, reason: str) -> AdmissionRejected:
+        self._stats[plan]["shed"] += 1
+        return AdmissionRejected(plan, reason)
+
+    def _evict_lowest_waiter(self, incoming_plan: str) -> bool:
+        """Descartar o último da fila de menor prioridade para abrir espaço"""
+        incoming = PLAN_PRIORITY[incoming_plan]
+        for plan in sorted(PLAN_PRIORITY, key=PLAN_PRIORITY.get, reverse=True):
+            if PLAN_PRIORITY[plan] <= incoming:
+                return False
+            queue = self._queues[plan]
+            while queue:
+                waiter = queue.pop()
+                if not waiter.done():
+                    waiter.set_exception(self._shed(plan, "substituído por requisição de maior prioridade"))
+                    return True
+        return False
+
+    def _abandon(self, plan: str, waiter: asyncio.Future):
+        """Tirar da fila quem desistiu, para não contar na profundidade nem nos limites"""
+        waiter.cancel()
+        try:
+            self._queues[plan].remove(waiter)
+        except ValueError:
+            pass
+
+    async def _acquire(self, plan: str, timeout: Optional[float]):
+        if self._can_run(plan) and not self._waiting_at_or_above(plan):
+            self._start(plan)
+            return
+
+        if self.queue_depth() >= self.saturation_depth:
+            if PLAN_PRIORITY[plan] >= PLAN_PRIORITY["free"]:
+                raise self._shed(plan, "sistema saturado")
+            # Planos pagos tomam o lugar do trabalho de menor prioridade que está esperando
+            self._evict_lowest_waiter(plan)
+        if len(self._queues[plan]) >= self.queue_limits[plan]:
+            raise self._shed(plan, "fila do plano cheia")
+
+        wait = self.max_queue_wait[plan]
+        if timeout is not None:
+            wait = min(wait, timeout)
+        if wait <= 0:
+            raise self._shed(plan, "sem tempo para aguardar na fila")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[plan].append(waiter)
+        self._stats[plan]["queued"] += 1
+        try:
+            await asyncio.wait([waiter], timeout=wait)
+        except asyncio.CancelledError:
+            # Cliente desistiu: devolver a vaga se ela já tinha sido concedida
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self._release(plan)
+            else:
+                self._abandon(plan, waiter)
+            raise
+
+        # Conferir o próprio future: a vaga pode ter sido concedida logo após o timeout
+        if not waiter.done():
+            self._abandon(plan, waiter)
+            self._stats[plan]["timed_out"] += 1
+            raise AdmissionRejected(plan, f"tempo de espera na fila esgotado ({wait:.1f}s)")
+        # Propaga AdmissionRejected se o item foi descartado enquanto esperava
+        waiter.result()
+
+    @asynccontextmanager
+    async def admit(self, plan: Any = None, timeout: Optional[float] = None):
+        """Ocupar uma vaga de geração; levanta AdmissionRejected quando descartado"""
+        plan = normalize_plan(plan)
+        await self._acquire(plan, timeout)
+        try:
+            yield plan
+        finally:
+            self._release(plan)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado atual (para endpoints de status)"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queue_depth": self.queue_depth(),
+            "saturation_depth": self.saturation_depth,
+            "plans": {
+                plan: {
+                    "running": self._running_by_plan[plan],
+                    "limit": self.plan_limit(plan),
+                    "queued": len(self._queues[plan]),
+                    **self._stats[plan],
+                }
+                for plan in PLAN_PRIORITY
+            }
+        }
+
+_admission_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    """Obter instância do controlador de admissão com lazy loading"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController.from_env()
+        logger.info(f"🚦 Controle de admissão ativo: {_admission_controller.max_concurrency} vagas")
+    return _admission_controller
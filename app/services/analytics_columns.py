@@ -0,0 +1,190 @@
+"""
+Motor colunar das métricas do dashboard administrativo
+Os logs de uso da API viram colunas tipadas (timestamp int64, provedor/usuário/
+tipo/erro como códigos categóricos, tempo de resposta float32, sucesso bool) e
+as métricas saem de máscaras e group-bys vetorizados (bincount) com NumPy.
+Sem NumPy, AdminAnalyticsService usa o caminho em Python puro.
+
+Timestamps são "segundos de relógio local": os registros são gravados com
+datetime.now() sem fuso, então dia e hora saem direto de divisões inteiras.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# auto (NumPy se instalado) | python
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "auto").lower()
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+
+def columnar_enabled() -> bool:
+    return NUMPY_AVAILABLE and ANALYTICS_ENGINE != "python"
+
+def wall_seconds(value) -> int:
+    """Segundos desde 1970 no relógio local (datetime ou string ISO sem fuso)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+
+def day_iso(day_index: int) -> str:
+    return (EPOCH + timedelta(days=int(day_index))).date().isoformat()
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Percentil com interpolação linear (mesmo método padrão de numpy.percentile)"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def _factorize(values: List[Any]) -> Tuple["np.ndarray", List[Any]]:
+    """Códigos int32 + categorias na ordem da primeira ocorrência"""
+    mapping: Dict[Any, int] = {}
+    codes = np.fromiter((mapping.setdefault(value, len(mapping)) for value in values),
+                        dtype=np.int32, count=len(values))
+    return codes, list(mapping)
+
+def _timestamp_column(values: List[str]) -> "np.ndarray":
+    try:
+        # Parser ISO vetorizado do NumPy (aceita 'T' ou espaço e frações de segundo)
+        return np.array(values, dtype="datetime64[us]").astype(np.int64) // 1_000_000
+    except (ValueError, TypeError):
+        return np.fromiter((wall_seconds(value) for value in values), dtype=np.int64, count=len(values))
+
+class ApiLogColumns:
+    """Logs de uso da API em colunas tipadas"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        count = len(records)
+        self.count = count
+        self.ts = _timestamp_column([str(record['request_time']) for record in records])
+        self.response_time = np.fromiter((record['response_time'] for record in records),
+                                         dtype=np.float32, count=count)
+        self.success = np.fromiter((bool(record['success']) for record in records), dtype=bool, count=count)
+        self.tokens = np.fromiter((record.get('tokens_used', 0) or 0 for record in records),
+                                  dtype=np.int64, count=count)
+        self.provider, self.providers = _factorize([record['provider'] for record in records])
+        self.prompt_type, self.prompt_types = _factorize([record['prompt_type'] for record in records])
+        self.user, self.users = _factorize([record['user_id'] for record in records])
+        self.error, self.errors = _factorize([record.get('error_message', 'Unknown') for record in records])
+        # Usuário "vazio" (None/"") não conta como usuário
+        valid_users = np.array([bool(user) for user in self.users], dtype=bool)
+        self.user_valid = valid_users[self.user] if count else np.zeros(0, dtype=bool)
+        self.unique_users = int(valid_users.sum())
+
+    @staticmethod
+    def _counts(codes: "np.ndarray", categories: List[Any], nonzero_only: bool = True) -> Dict[Any, int]:
+        counts = np.bincount(codes, minlength=len(categories))
+        return {category: int(counts[i]) for i, category in enumerate(categories)
+                if counts[i] or not nonzero_only}
+
+    def dashboard_sections(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Seções do dashboard derivadas dos logs de API (mesmo formato do caminho em Python)"""
+        now = now or datetime.now()
+        now_s = wall_seconds(now)
+        m24 = self.ts >= now_s - DAY
+        m7 = self.ts >= now_s - 7 * DAY
+        n24 = int(m24.sum())
+        n7 = int(m7.sum())
+        k = len(self.providers)
+
+        # Group-by por provedor: uma passada de bincount por agregado
+        usage = np.bincount(self.provider, minlength=k)
+        usage_24h = np.bincount(self.provider[m24], minlength=k)
+        success_by_provider = np.bincount(self.provider, weights=self.success, minlength=k)
+        response_sum_24h = np.bincount(self.provider[m24], weights=self.response_time[m24], minlength=k)
+
+        api_usage = {
+            'provider_usage': {p: int(usage[i]) for i, p in enumerate(self.providers)},
+            'provider_usage_24h': {p: int(usage_24h[i]) for i, p in enumerate(self.providers) if usage_24h[i]},
+            'provider_success_rates': {p: float(success_by_provider[i] / usage[i] * 100)
+                                       for i, p in enumerate(self.providers)},
+            'provider_response_times': {p: float(response_sum_24h[i] / usage_24h[i]) if usage_24h[i] else 0
+                                        for i, p in enumerate(self.providers)},
+            'most_used_provider': self.providers[int(np.argmax(usage))] if k else 'none',
+            'total_requests_7d': n7
+        }
+
+        days_7d, day_counts = np.unique(self.ts[m7] // DAY, return_counts=True)
+        prompt_generation = {
+            'total_prompts_generated': self.count,
+            'prompts_generated_24h': n24,
+            'prompts_generated_7d': n7,
+            'prompt_type_distribution': self._counts(self.prompt_type, self.prompt_types),
+            'prompt_type_distribution_24h': self._counts(self.prompt_type[m24], self.prompt_types),
+            'total_tokens_used': int(self.tokens.sum()),
+            'tokens_used_24h': int(self.tokens[m24].sum()),
+            'daily_generation_pattern': {day_iso(day): int(c) for day, c in zip(days_7d, day_counts)},
+            'avg_prompts_per_user': self.count / self.unique_users if self.unique_users else 0
+        }
+
+        failed_24h = m24 & ~self.success
+        errors_24h = int(failed_24h.sum())
+        if n24:
+            response_24h = self.response_time[m24].astype(np.float64)
+            performance = {
+                'avg_response_time': float(response_24h.mean()),
+                'min_response_time': float(response_24h.min()),
+                'max_response_time': float(response_24h.max()),
+                'p95_response_time': float(np.percentile(response_24h, 95)),
+                'uptime_percentage': (n24 - errors_24h) / n24 * 100,
+                'error_breakdown': self._counts(self.error[failed_24h], self.errors),
+                'total_errors_24h': errors_24h
+            }
+        else:
+            performance = {
+                'avg_response_time': 0,
+                'min_response_time': 0,
+                'max_response_time': 0,
+                'p95_response_time': 0,
+                'uptime_percentage': 100,
+                'error_breakdown': {}
+            }
+
+        return {
+            'overview': {
+                'total_api_calls': self.count,
+                'api_calls_24h': n24,
+                'error_rate_24h': errors_24h / n24 * 100 if n24 else 0,
+                'avg_response_time_24h': performance['avg_response_time']
+            },
+            'api_usage': api_usage,
+            'prompt_generation': prompt_generation,
+            'performance': performance,
+            'charts_data': self._charts_data(now_s, m7, usage)
+        }
+
+    def _charts_data(self, now_s: int, m7: "np.ndarray", usage: "np.ndarray") -> Dict[str, Any]:
+        """Chamadas e usuários únicos por dia nos últimos 7 dias + distribuição de provedores"""
+        first_day = now_s // DAY - 6
+        offset = self.ts // DAY - first_day
+        in_chart = m7 & (offset >= 0) & (offset < 7)
+        api_calls = np.bincount(offset[in_chart], minlength=7)
+
+        with_user = in_chart & self.user_valid
+        users_per_day = np.zeros(7, dtype=np.int64)
+        if with_user.any():
+            # Pares (dia, usuário) distintos contados por dia
+            pairs = np.unique(offset[with_user] * len(self.users) + self.user[with_user])
+            users_per_day = np.bincount(pairs // len(self.users), minlength=7)
+
+        return {
+            'timeline': {
+                'dates': [day_iso(first_day + i) for i in range(7)],
+                'api_calls': [int(c) for c in api_calls[:7]],
+                'active_users': [int(c) for c in users_per_day[:7]]
+            },
+            'provider_distribution': {
+                'labels': list(self.providers),
+                'data': [int(c) for c in usage]
+            }
+        }
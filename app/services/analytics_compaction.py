@@ -0,0 +1,93 @@
+"""
+Job de compactação dos logs de analytics
+Roda no startup e depois a cada ANALYTICS_COMPACTION_INTERVAL segundos:
+move o bruto antigo para os agregados por hora, as horas antigas para os
+agregados por dia e descarta os dias além da retenção (ver analytics_rollups).
+O trabalho de arquivo roda no executor, fora do event loop.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.services.admin_analytics_service import get_admin_analytics_service
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_COMPACTION_ENABLED = os.getenv("ANALYTICS_COMPACTION_ENABLED", "true").lower() == "true"
+ANALYTICS_COMPACTION_INTERVAL = float(os.getenv("ANALYTICS_COMPACTION_INTERVAL", "3600"))
+
+class AnalyticsCompactionJob:
+    """Compactação periódica em segundo plano + execução sob demanda"""
+
+    def __init__(self, interval: float = ANALYTICS_COMPACTION_INTERVAL):
+        self.interval = interval
+        self.last_run: Optional[str] = None
+        self.last_result: Dict[str, Any] = {}
+        self.last_duration_ms = 0.0
+        self.runs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def run_once(self) -> Dict[str, Any]:
+        """Compactar agora (síncrono; usar no executor ou em scripts)"""
+        started = time.perf_counter()
+        result = get_admin_analytics_service().compact_logs()
+        self.last_duration_ms = (time.perf_counter() - started) * 1000
+        self.last_run = datetime.now().isoformat()
+        self.last_result = result
+        self.runs += 1
+        rolled_up = sum(tier["raw_rolled_up"] for tier in result.values())
+        if rolled_up:
+            logger.info(f"🗜️ [ANALYTICS] {rolled_up} registros brutos resumidos em "
+                        f"{self.last_duration_ms:.0f}ms")
+        return result
+
+    def start(self):
+        """Iniciar o loop de compactação (chamar de dentro do event loop)"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._compaction_loop())
+        logger.info(f"🗜️ Compactação de analytics a cada {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _compaction_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.run_once)
+            except Exception as e:
+                logger.error(f"❌ [ANALYTICS] Erro na compactação: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_duration_ms": round(self.last_duration_ms, 1),
+            "last_result": self.last_result
+        }
+
+_compaction_job: Optional[AnalyticsCompactionJob] = None
+
+def get_compaction_job() -> AnalyticsCompactionJob:
+    """Obter instância do job de compactação com lazy loading"""
+    global _compaction_job
+    if _compaction_job is None:
+        _compaction_job = AnalyticsCompactionJob()
+    return _compaction_job
@@ -0,0 +1,182 @@
+"""
+Barramento de eventos de analytics
+Os handlers só enfileiram o evento (put_nowait numa asyncio.Queue limitada);
+uma única tarefa de fundo agrupa os eventos e grava em lote a cada N ms ou
+N eventos, com o I/O de arquivo fora do event loop. Fila cheia descarta o
+evento e incrementa um contador, sem bloquear a requisição.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.admin_analytics_service import AdminAnalyticsService, get_admin_analytics_service
+from app.services.latency_histograms import DIMENSION_PROVIDER, get_latency_store
+from app.services.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_ASYNC_ENABLED = os.getenv("ANALYTICS_ASYNC_ENABLED", "true").lower() == "true"
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "200"))
+ANALYTICS_FLUSH_INTERVAL_MS = float(os.getenv("ANALYTICS_FLUSH_INTERVAL_MS", "500"))
+
+EVENT_API_USAGE = "api_usage"
+EVENT_USER_ACTIVITY = "user_activity"
+
+_registry = get_metrics_registry()
+ANALYTICS_EVENTS = _registry.counter(
+    "costar_analytics_events", "Eventos de analytics por destino", ["kind", "outcome"])
+ANALYTICS_QUEUE_DEPTH = _registry.gauge(
+    "costar_analytics_queue_depth", "Eventos aguardando gravação")
+ANALYTICS_BATCH_SIZE_HIST = _registry.histogram(
+    "costar_analytics_batch_size", "Eventos por lote gravado",
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000))
+
+Event = Tuple[str, Dict[str, Any]]
+
+class AnalyticsEventBus:
+    """Fila limitada + tarefa escritora que grava em lote"""
+
+    def __init__(self, max_queue: int = ANALYTICS_QUEUE_SIZE, batch_size: int = ANALYTICS_BATCH_SIZE,
+                 flush_interval: float = ANALYTICS_FLUSH_INTERVAL_MS / 1000):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"queued": 0, "dropped": 0, "written": 0, "failed": 0, "batches": 0, "sync_writes": 0}
+        self.last_flush: Optional[str] = None
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Iniciar a tarefa escritora no event loop atual (ex.: no lifespan)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = self._loop.create_task(self._writer())
+        logger.info(f"📨 Analytics assíncrono ativo (lote {self.batch_size}, "
+                    f"{self.flush_interval * 1000:.0f}ms, fila {self.max_queue})")
+
+    async def stop(self):
+        """Parar a escritora depois de gravar o que ainda estiver na fila"""
+        if self._task is None:
+            return
+        # Sentinela no fim da fila: a escritora grava tudo antes dele e encerra
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def publish(self, kind: str, entry: Dict[str, Any]):
+        """Enfileirar um registro; sem escritora ativa (scripts, serverless sem lifespan) grava direto"""
+        if not self.running:
+            self.stats["sync_writes"] += 1
+            self._write_sync([(kind, entry)])
+            return
+        if threading.get_ident() == self._loop_thread_id:
+            self._put((kind, entry))
+        else:
+            # Handlers síncronos rodam no threadpool: a fila só é tocada na thread do loop
+            self._loop.call_soon_threadsafe(self._put, (kind, entry))
+
+    def _put(self, event: Event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            ANALYTICS_EVENTS.labels(event[0], "dropped").inc()
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"⚠️ [ANALYTICS] Fila cheia ({self.max_queue}); {self.stats['dropped']} eventos descartados")
+            return
+        self.stats["queued"] += 1
+        ANALYTICS_EVENTS.labels(event[0], "queued").inc()
+        ANALYTICS_QUEUE_DEPTH.set(self._queue.qsize())
+
+    async def _writer(self):
+        stopping = False
+        while not stopping:
+            event = await self._queue.get()
+            if event is None:
+                break
+            batch = [event]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+            ANALYTICS_QUEUE_DEPTH.set(self._queue.qsize())
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Event]):
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sync, batch)
+
+    def _write_sync(self, batch: List[Event]):
+        api_usage = [entry for kind, entry in batch if kind == EVENT_API_USAGE]
+        activities = [entry for kind, entry in batch if kind == EVENT_USER_ACTIVITY]
+        try:
+            get_admin_analytics_service().log_batch(api_usage, activities)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            ANALYTICS_EVENTS.labels(EVENT_API_USAGE, "failed").inc(len(api_usage))
+            ANALYTICS_EVENTS.labels(EVENT_USER_ACTIVITY, "failed").inc(len(activities))
+            logger.error(f"❌ [ANALYTICS] Falha ao gravar lote de {len(batch)} eventos: {e}")
+            return
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        self.last_flush = datetime.now().isoformat()
+        ANALYTICS_EVENTS.labels(EVENT_API_USAGE, "written").inc(len(api_usage))
+        ANALYTICS_EVENTS.labels(EVENT_USER_ACTIVITY, "written").inc(len(activities))
+        ANALYTICS_BATCH_SIZE_HIST.labels().observe(len(batch))
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "last_flush": self.last_flush,
+            **self.stats
+        }
+
+_analytics_event_bus: Optional[AnalyticsEventBus] = None
+
+def get_analytics_event_bus() -> AnalyticsEventBus:
+    """Obter instância do barramento de analytics com lazy loading"""
+    global _analytics_event_bus
+    if _analytics_event_bus is None:
+        _analytics_event_bus = AnalyticsEventBus()
+    return _analytics_event_bus
+
+def track_api_usage(provider: str, user_id: Optional[str], prompt_type: str, response_time: float,
+                    success: bool, error_message: Optional[str] = None, tokens_used: int = 0,
+                    ip_address: str = "", user_agent: str = ""):
+    """Registrar uso da API sem gravar na requisição"""
+    entry = AdminAnalyticsService.build_api_usage_entry(provider, user_id, prompt_type, response_time, success,
+                                                        error_message, tokens_used, ip_address, user_agent)
+    get_latency_store().record(DIMENSION_PROVIDER, provider, response_time)
+    get_analytics_event_bus().publish(EVENT_API_USAGE, entry)
+
+def track_user_activity(user_id: str, action: str, details: Dict, ip_address: str = "", user_agent: str = ""):
+    """Registrar atividade do usuário sem gravar na requisição"""
+    entry = AdminAnalyticsService.build_user_activity_entry(user_id, action, details, ip_address, user_agent)
+    get_analytics_event_bus().publish(EVENT_USER_ACTIVITY, entry)
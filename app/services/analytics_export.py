@@ -0,0 +1,361 @@
+"""
+Exportação em streaming dos eventos de analytics (CSV, JSON Lines, Parquet)
+Os arquivos brutos são lidos com um parser incremental do array JSON (sem
+json.load do arquivo inteiro) e a saída é gerada em blocos de N linhas, então
+a memória fica constante mesmo para exportações grandes. As camadas por hora
+e por dia (analytics_rollups) saem como uma linha por período. Parquet só
+fica disponível com pyarrow instalado.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from app.services.analytics_rollups import ActivityRollup, ApiUsageRollup, day_key, hour_key, record_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = pq = None
+    PARQUET_AVAILABLE = False
+
+ANALYTICS_EXPORT_CHUNK_ROWS = int(os.getenv("ANALYTICS_EXPORT_CHUNK_ROWS", "1000"))
+READ_CHUNK_BYTES = 64 * 1024
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_JSONL, FORMAT_PARQUET)
+MEDIA_TYPES = {
+    FORMAT_CSV: "text/csv; charset=utf-8",
+    FORMAT_JSONL: "application/x-ndjson",
+    FORMAT_PARQUET: "application/vnd.apache.parquet"
+}
+
+DATASET_API_USAGE = "api_usage"
+DATASET_USER_ACTIVITY = "user_activity"
+EXPORT_DATASETS = (DATASET_API_USAGE, DATASET_USER_ACTIVITY)
+EXPORT_GRANULARITIES = ("raw", "hour", "day")
+
+# Campos por dataset e tipo (o tipo define a coluna do Parquet e a serialização no CSV)
+RAW_FIELDS = {
+    DATASET_API_USAGE: {
+        "id": "string", "provider": "string", "user_id": "string", "prompt_type": "string",
+        "request_time": "timestamp", "response_time": "float", "success": "bool",
+        "error_message": "string", "tokens_used": "int", "ip_address": "string", "user_agent": "string"
+    },
+    DATASET_USER_ACTIVITY: {
+        "id": "string", "user_id": "string", "action": "string", "timestamp": "timestamp",
+        "details": "json", "ip_address": "string", "user_agent": "string"
+    }
+}
+ROLLUP_FIELDS = {
+    DATASET_API_USAGE: {
+        "period_start": "timestamp", "period": "string", "count": "int", "success": "int", "errors": "int",
+        "tokens_used": "int", "avg_response_time": "float", "min_response_time": "float",
+        "max_response_time": "float", "p50_response_time": "float", "p95_response_time": "float",
+        "p99_response_time": "float", "unique_users": "int", "providers": "json",
+        "prompt_types": "json", "error_breakdown": "json"
+    },
+    DATASET_USER_ACTIVITY: {
+        "period_start": "timestamp", "period": "string", "count": "int", "unique_users": "int", "actions": "json"
+    }
+}
+TIME_FIELDS = {DATASET_API_USAGE: "request_time", DATASET_USER_ACTIVITY: "timestamp"}
+
+class InvalidExportError(ValueError):
+    """Parâmetros de exportação inválidos"""
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[Any]:
+    """Elementos de um array JSON em arquivo, lidos em blocos (espera objetos/arrays como elementos)"""
+    decoder = json.JSONDecoder()
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        buffer = ""
+        position = 0
+        eof = False
+        started = False
+        while True:
+            # Pular espaços e as vírgulas entre elementos
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != "[":
+                    raise ValueError(f"{path} não contém um array JSON")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            if position < len(buffer):
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield value
+                    position = end
+                    continue
+            elif eof:
+                return
+            # Elemento incompleto no fim do buffer: descartar o já consumido e ler mais
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+class _ChunkSink:
+    """Destino write-only do ParquetWriter: guarda os bytes até o próximo yield"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class AnalyticsExport:
+    """Uma exportação: dataset, granularidade, janela, projeção de campos e filtros de igualdade"""
+
+    def __init__(self, service, dataset: str, format: str = FORMAT_JSONL, granularity: str = "raw",
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 fields: Optional[List[str]] = None, filters: Optional[Dict[str, str]] = None,
+                 chunk_rows: int = ANALYTICS_EXPORT_CHUNK_ROWS):
+        if dataset not in EXPORT_DATASETS:
+            raise InvalidExportError(f"Dataset inválido. Use {', '.join(EXPORT_DATASETS)}")
+        if format not in EXPORT_FORMATS:
+            raise InvalidExportError(f"Formato inválido. Use {', '.join(EXPORT_FORMATS)}")
+        if format == FORMAT_PARQUET and not PARQUET_AVAILABLE:
+            raise InvalidExportError("Parquet indisponível: instale pyarrow")
+        if granularity not in EXPORT_GRANULARITIES:
+            raise InvalidExportError(f"Granularidade inválida. Use {', '.join(EXPORT_GRANULARITIES)}")
+        if since and until and since >= until:
+            raise InvalidExportError("'since' deve ser anterior a 'until'")
+        schema = RAW_FIELDS[dataset] if granularity == "raw" else ROLLUP_FIELDS[dataset]
+        unknown = [field for field in (fields or []) + list(filters or {}) if field not in schema]
+        if unknown:
+            raise InvalidExportError(f"Campos desconhecidos: {', '.join(unknown)}")
+        if filters and granularity != "raw":
+            raise InvalidExportError("Filtros por campo só se aplicam à granularidade 'raw'")
+
+        self.service = service
+        self.dataset = dataset
+        self.format = format
+        self.granularity = granularity
+        # Timestamps dos logs são locais e sem fuso
+        self.since = since.replace(tzinfo=None) if since else None
+        self.until = until.replace(tzinfo=None) if until else None
+        self.fields = fields or list(schema)
+        self.types = {field: schema[field] for field in self.fields}
+        self.filters = {field: str(value).lower() for field, value in (filters or {}).items()}
+        self.chunk_rows = max(chunk_rows, 1)
+        self.rows_exported = 0
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.format]
+
+    @property
+    def filename(self) -> str:
+        suffix = {"raw": "", "hour": "_hourly", "day": "_daily"}[self.granularity]
+        return f"{self.dataset}{suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{self.format}"
+
+    def _in_range(self, moment: datetime) -> bool:
+        return (self.since is None or moment >= self.since) and (self.until is None or moment < self.until)
+
+    def _raw_path(self) -> str:
+        if self.dataset == DATASET_API_USAGE:
+            return self.service.api_logs_file
+        return self.service.user_activity_file
+
+    def _iter_raw(self) -> Iterator[Dict[str, Any]]:
+        time_field = TIME_FIELDS[self.dataset]
+        for record in iter_json_array(self._raw_path()):
+            try:
+                if not self._in_range(record_time(record[time_field])):
+                    continue
+            except (KeyError, TypeError, ValueError):
+                continue
+            if any(_filter_value(record.get(field)) != value for field, value in self.filters.items()):
+                continue
+            yield record
+
+    def _iter_periods(self) -> Iterator[Dict[str, Any]]:
+        """Uma linha por hora/dia: camadas agregadas + bruto da janela agregado na hora"""
+        if self.dataset == DATASET_API_USAGE:
+            store, rollup_cls, to_row = self.service.api_rollups, ApiUsageRollup, _api_rollup_row
+        else:
+            store, rollup_cls, to_row = self.service.activity_rollups, ActivityRollup, _activity_rollup_row
+        key_of = hour_key if self.granularity == "hour" else day_key
+
+        # Bruto agregado por período: memória limitada pelo número de períodos, não de eventos
+        periods: Dict[tuple, Any] = {}
+        for record in self._iter_raw():
+            key = (key_of(record_time(record[TIME_FIELDS[self.dataset]])), self.granularity)
+            periods.setdefault(key, rollup_cls()).add(record)
+
+        if self.granularity == "hour":
+            rolled = [(hour_key(start), "hour", bucket) for start, bucket in store.hourly_buckets(self.since)]
+            # Dias antigos só existem na camada por dia: saem como linhas de período "day"
+            rolled += [(day, "day", bucket) for day, bucket in store.daily_tier_buckets(self.since)]
+        else:
+            rolled = [(day, "day", bucket) for day, bucket in store.daily_buckets(self.since).items()]
+        for key, period, bucket in rolled:
+            if self.until is None or record_time(key) < self.until:
+                periods.setdefault((key, period), rollup_cls()).merge(bucket)
+
+        for (key, period), bucket in sorted(periods.items()):
+            yield to_row(key, period, bucket)
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Linhas já projetadas nos campos pedidos"""
+        rows = self._iter_raw() if self.granularity == "raw" else self._iter_periods()
+        for row in rows:
+            self.rows_exported += 1
+            yield {field: row.get(field) for field in self.fields}
+
+    def _iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for row in self.iter_rows():
+            batch.append(row)
+            if len(batch) >= self.chunk_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Bytes do arquivo exportado, um bloco por lote de linhas"""
+        if self.format == FORMAT_CSV:
+            yield from self._csv_chunks()
+        elif self.format == FORMAT_JSONL:
+            for batch in self._iter_batches():
+                yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in batch).encode("utf-8")
+        else:
+            yield from self._parquet_chunks()
+
+    def _csv_chunks(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.fields)
+        for batch in self._iter_batches():
+            for row in batch:
+                writer.writerow([_csv_value(row[field], self.types[field]) for field in self.fields])
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _parquet_chunks(self) -> Iterator[bytes]:
+        arrow_types = {"string": pa.string(), "json": pa.string(), "int": pa.int64(),
+                       "float": pa.float64(), "bool": pa.bool_(), "timestamp": pa.timestamp("us")}
+        schema = pa.schema([(field, arrow_types[self.types[field]]) for field in self.fields])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        try:
+            # Um row group por lote: cada write_table já emite os bytes do grupo
+            for batch in self._iter_batches():
+                columns = {field: [_parquet_value(row[field], self.types[field]) for row in batch]
+                           for field in self.fields}
+                writer.write_table(pa.table(columns, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """Iterador assíncrono: cada bloco é lido e serializado no executor, fora do event loop"""
+        loop = asyncio.get_running_loop()
+        chunks = self.iter_chunks()
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                return
+            if chunk:
+                yield chunk
+
+def _filter_value(value: Any) -> str:
+    if value is None:
+        return "null"
+    return str(value).lower()
+
+def _csv_value(value: Any, field_type: str) -> Any:
+    if value is None:
+        return ""
+    if field_type == "json":
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if field_type == "bool":
+        return "true" if value else "false"
+    return value
+
+def _parquet_value(value: Any, field_type: str) -> Any:
+    if value is None:
+        return None
+    if field_type == "json":
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if field_type == "timestamp":
+        return record_time(value)
+    if field_type == "string":
+        return str(value)
+    return value
+
+def _api_rollup_row(key: str, period: str, bucket: ApiUsageRollup) -> Dict[str, Any]:
+    percentiles = bucket.latency.percentiles((50, 95, 99))
+    return {
+        "period_start": key,
+        "period": period,
+        "count": bucket.count,
+        "success": bucket.success,
+        "errors": bucket.count - bucket.success,
+        "tokens_used": bucket.tokens,
+        "avg_response_time": bucket.response_time_sum / bucket.count if bucket.count else 0.0,
+        "min_response_time": bucket.response_time_min,
+        "max_response_time": bucket.response_time_max,
+        "p50_response_time": percentiles["p50"] / 1000,
+        "p95_response_time": percentiles["p95"] / 1000,
+        "p99_response_time": percentiles["p99"] / 1000,
+        "unique_users": len(bucket.users),
+        "providers": {name: stats["count"] for name, stats in bucket.providers.items()},
+        "prompt_types": dict(bucket.prompt_types),
+        "error_breakdown": dict(bucket.errors)
+    }
+
+def _activity_rollup_row(key: str, period: str, bucket: ActivityRollup) -> Dict[str, Any]:
+    return {
+        "period_start": key,
+        "period": period,
+        "count": bucket.count,
+        "unique_users": len(bucket.users),
+        "actions": dict(bucket.actions)
+    }
@@ -0,0 +1,284 @@
+"""
+Camadas de retenção dos logs de analytics: bruto → por hora → por dia
+Registros brutos ficam ANALYTICS_RAW_RETENTION_DAYS dias (e no máximo
+ANALYTICS_RAW_MAX_* linhas); o que sai do bruto é resumido em agregados por
+hora, que depois de ANALYTICS_HOURLY_RETENTION_DAYS viram agregados por dia.
+Cada agregado é somável (contagens, somas, mín/máx, usuários distintos e
+histograma de latência), então qualquer janela é a soma dos baldes dela.
+"""
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.latency_histograms import LatencyHistogram
+
+ANALYTICS_RAW_RETENTION_DAYS = int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "14"))
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90"))
+ANALYTICS_DAILY_RETENTION_DAYS = int(os.getenv("ANALYTICS_DAILY_RETENTION_DAYS", "730"))
+ANALYTICS_RAW_MAX_API_LOGS = int(os.getenv("ANALYTICS_RAW_MAX_API_LOGS", "10000"))
+ANALYTICS_RAW_MAX_ACTIVITIES = int(os.getenv("ANALYTICS_RAW_MAX_ACTIVITIES", "5000"))
+
+HOUR_FORMAT = "%Y-%m-%dT%H:00:00"
+DAY_FORMAT = "%Y-%m-%d"
+
+def hour_key(moment: datetime) -> str:
+    return moment.strftime(HOUR_FORMAT)
+
+def day_key(moment: datetime) -> str:
+    return moment.strftime(DAY_FORMAT)
+
+def record_time(value) -> datetime:
+    """Timestamps dos logs são gravados como ISO local sem fuso"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+class ApiUsageRollup:
+    """Agregado somável de logs de uso da API"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.count = data.get("count", 0)
+        self.success = data.get("success", 0)
+        self.tokens = data.get("tokens", 0)
+        self.response_time_sum = data.get("response_time_sum", 0.0)
+        self.response_time_min: Optional[float] = data.get("response_time_min")
+        self.response_time_max: Optional[float] = data.get("response_time_max")
+        # provedor -> {count, success, response_time_sum}
+        self.providers: Dict[str, Dict[str, float]] = {
+            name: dict(stats) for name, stats in data.get("providers", {}).items()}
+        self.prompt_types = Counter(data.get("prompt_types", {}))
+        self.errors = Counter(data.get("errors", {}))
+        self.users = set(data.get("users", []))
+        self.latency = LatencyHistogram.from_dict(data.get("latency"))
+
+    def add(self, log: Dict[str, Any]):
+        response_time = float(log.get("response_time") or 0)
+        success = bool(log.get("success"))
+        self.count += 1
+        self.success += success
+        self.tokens += log.get("tokens_used", 0) or 0
+        self.response_time_sum += response_time
+        self.response_time_min = response_time if self.response_time_min is None else min(self.response_time_min, response_time)
+        self.response_time_max = response_time if self.response_time_max is None else max(self.response_time_max, response_time)
+        stats = self.providers.setdefault(log["provider"], {"count": 0, "success": 0, "response_time_sum": 0.0})
+        stats["count"] += 1
+        stats["success"] += success
+        stats["response_time_sum"] += response_time
+        self.prompt_types[log["prompt_type"]] += 1
+        if not success:
+            self.errors[log.get("error_message", "Unknown")] += 1
+        if log.get("user_id"):
+            self.users.add(log["user_id"])
+        self.latency.record(response_time)
+
+    def merge(self, other: "ApiUsageRollup") -> "ApiUsageRollup":
+        self.count += other.count
+        self.success += other.success
+        self.tokens += other.tokens
+        self.response_time_sum += other.response_time_sum
+        if other.response_time_min is not None:
+            self.response_time_min = other.response_time_min if self.response_time_min is None else min(self.response_time_min, other.response_time_min)
+            self.response_time_max = other.response_time_max if self.response_time_max is None else max(self.response_time_max, other.response_time_max)
+        for name, other_stats in other.providers.items():
+            stats = self.providers.setdefault(name, {"count": 0, "success": 0, "response_time_sum": 0.0})
+            for field, value in other_stats.items():
+                stats[field] += value
+        self.prompt_types.update(other.prompt_types)
+        self.errors.update(other.errors)
+        self.users |= other.users
+        self.latency.merge(other.latency)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "success": self.success,
+            "tokens": self.tokens,
+            "response_time_sum": self.response_time_sum,
+            "response_time_min": self.response_time_min,
+            "response_time_max": self.response_time_max,
+            "providers": self.providers,
+            "prompt_types": dict(self.prompt_types),
+            "errors": dict(self.errors),
+            "users": sorted(self.users),
+            "latency": self.latency.to_dict()
+        }
+
+class ActivityRollup:
+    """Agregado somável de atividades de usuários"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.count = data.get("count", 0)
+        self.actions = Counter(data.get("actions", {}))
+        self.users = set(data.get("users", []))
+
+    def add(self, activity: Dict[str, Any]):
+        self.count += 1
+        self.actions[activity["action"]] += 1
+        if activity.get("user_id"):
+            self.users.add(activity["user_id"])
+
+    def merge(self, other: "ActivityRollup") -> "ActivityRollup":
+        self.count += other.count
+        self.actions.update(other.actions)
+        self.users |= other.users
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "actions": dict(self.actions), "users": sorted(self.users)}
+
+class RollupStore:
+    """Agregados por hora e por dia de um tipo de registro, persistidos em um arquivo JSON"""
+
+    def __init__(self, path: str, rollup_cls, time_field: str):
+        self.path = path
+        self.rollup_cls = rollup_cls
+        self.time_field = time_field
+        self.hourly: Dict[str, Any] = {}
+        self.daily: Dict[str, Any] = {}
+        self._version = None
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        """Recarregar só se o arquivo mudou (outro worker pode ter compactado)"""
+        try:
+            stat = os.stat(self.path)
+            version = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            version = None
+        if version == self._version:
+            return
+        data = {}
+        if version is not None:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                data = {}
+        self.hourly = {key: self.rollup_cls(value) for key, value in data.get("hourly", {}).items()}
+        self.daily = {key: self.rollup_cls(value) for key, value in data.get("daily", {}).items()}
+        self._version = version
+
+    def save(self):
+        with self._lock:
+            data = {
+                "hourly": {key: rollup.to_dict() for key, rollup in sorted(self.hourly.items())},
+                "daily": {key: rollup.to_dict() for key, rollup in sorted(self.daily.items())}
+            }
+            # Escrita atômica: um agregado corrompido seria histórico perdido
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f, default=str)
+            os.replace(temp_path, self.path)
+            stat = os.stat(self.path)
+            self._version = (stat.st_mtime_ns, stat.st_size)
+
+    def absorb(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Resumir registros brutos nos agregados por hora (sem salvar)"""
+        absorbed = 0
+        with self._lock:
+            self._refresh()
+            for record in records:
+                try:
+                    key = hour_key(record_time(record[self.time_field]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                bucket = self.hourly.get(key)
+                if bucket is None:
+                    bucket = self.hourly[key] = self.rollup_cls()
+                bucket.add(record)
+                absorbed += 1
+        return absorbed
+
+    def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Horas antigas viram dias; dias além da retenção são descartados (sem salvar)"""
+        now = now or datetime.now()
+        hourly_cutoff = hour_key(now - timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS))
+        daily_cutoff = day_key(now - timedelta(days=ANALYTICS_DAILY_RETENTION_DAYS))
+        with self._lock:
+            self._refresh()
+            old_hours = [key for key in self.hourly if key < hourly_cutoff]
+            for key in old_hours:
+                day = key[:10]
+                bucket = self.daily.get(day)
+                if bucket is None:
+                    bucket = self.daily[day] = self.rollup_cls()
+                bucket.merge(self.hourly.pop(key))
+            expired_days = [key for key in self.daily if key < daily_cutoff]
+            for key in expired_days:
+                del self.daily[key]
+        return {"hours_rolled_up": len(old_hours), "days_expired": len(expired_days)}
+
+    def window(self, since: Optional[datetime] = None):
+        """Soma dos baldes que se sobrepõem à janela [since, agora] (tudo se since=None)"""
+        total = self.rollup_cls()
+        hour_from = hour_key(since) if since else ""
+        day_from = day_key(since) if since else ""
+        with self._lock:
+            self._refresh()
+            for key, bucket in self.hourly.items():
+                if key >= hour_from:
+                    total.merge(bucket)
+            for key, bucket in self.daily.items():
+                if key >= day_from:
+                    total.merge(bucket)
+        return total
+
+    def hourly_buckets(self, since: Optional[datetime] = None) -> List[Tuple[datetime, Any]]:
+        hour_from = hour_key(since) if since else ""
+        with self._lock:
+            self._refresh()
+            return [(datetime.strptime(key, HOUR_FORMAT), bucket)
+                    for key, bucket in sorted(self.hourly.items()) if key >= hour_from]
+
+    def daily_tier_buckets(self, since: Optional[datetime] = None) -> List[Tuple[str, Any]]:
+        """Só a camada por dia (dias cujas horas já foram compactadas)"""
+        day_from = day_key(since) if since else ""
+        with self._lock:
+            self._refresh()
+            return [(key, bucket) for key, bucket in sorted(self.daily.items()) if key >= day_from]
+
+    def daily_buckets(self, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Um agregado por dia ISO, juntando a camada por hora e a por dia"""
+        hour_from = hour_key(since) if since else ""
+        day_from = day_key(since) if since else ""
+        days: Dict[str, Any] = {}
+        with self._lock:
+            self._refresh()
+            for key, bucket in self.hourly.items():
+                if key >= hour_from:
+                    days.setdefault(key[:10], self.rollup_cls()).merge(bucket)
+            for key, bucket in self.daily.items():
+                if key >= day_from:
+                    days.setdefault(key, self.rollup_cls()).merge(bucket)
+        return dict(sorted(days.items()))
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {
+                "hourly_buckets": len(self.hourly),
+                "daily_buckets": len(self.daily),
+                "oldest_hour": min(self.hourly) if self.hourly else None,
+                "oldest_day": min(self.daily) if self.daily else None,
+                "rolled_up_records": sum(bucket.count for bucket in self.hourly.values())
+                                     + sum(bucket.count for bucket in self.daily.values())
+            }
+
+def split_by_age(records: List[Dict[str, Any]], time_field: str, cutoff: datetime,
+                 max_rows: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(expirados, mantidos): mais antigos que cutoff ou além das últimas max_rows linhas"""
+    expired, kept = [], []
+    for record in records:
+        try:
+            is_old = record_time(record[time_field]) < cutoff
+        except (KeyError, TypeError, ValueError):
+            is_old = False
+        (expired if is_old else kept).append(record)
+    if max_rows and len(kept) > max_rows:
+        expired.extend(kept[:-max_rows])
+        kept = kept[-max_rows:]
+    return expired, kept
@@ -1,29 +1,108 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
 import asyncio
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 import json
+import os
+import time
+
+# Capacidade do buffer em memória (eventos mais antigos são descartados)
+ANALYTICS_EVENTS_CAPACITY = int(os.getenv("ANALYTICS_EVENTS_CAPACITY", "100000"))
+
+class EventRingBuffer:
+    """
+    Buffer circular de eventos com índices por usuário e por nome
+    Cada evento guarda o timestamp em segundos (epoch). Os índices são filas na
+    mesma ordem de inserção do buffer, então o evento descartado pelo buffer é
+    sempre o primeiro do seu índice: inserção e descarte são O(1).
+    """
+
+    def __init__(self, capacity: int = ANALYTICS_EVENTS_CAPACITY):
+        self.capacity = capacity
+        self._events: deque = deque()
+        self._by_user: Dict[str, deque] = {}
+        self._by_name: Dict[str, deque] = {}
+        self._user_counts: Dict[str, Counter] = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._events)
+
+    def append(self, event: Dict[str, Any]):
+        if len(self._events) >= self.capacity:
+            self._evict()
+        self._events.append(event)
+        user_id = event["user_id"]
+        self._by_name.setdefault(event["name"], deque()).append(event)
+        if user_id:
+            self._by_user.setdefault(user_id, deque()).append(event)
+            self._user_counts.setdefault(user_id, Counter())[event["name"]] += 1
+
+    def _evict(self):
+        oldest = self._events.popleft()
+        self._popleft_index(self._by_name, oldest["name"])
+        user_id = oldest["user_id"]
+        if user_id:
+            self._popleft_index(self._by_user, user_id)
+            counts = self._user_counts[user_id]
+            counts[oldest["name"]] -= 1
+            if user_id not in self._by_user:
+                del self._user_counts[user_id]
+            elif not counts[oldest["name"]]:
+                del counts[oldest["name"]]
+
+    @staticmethod
+    def _popleft_index(index: Dict[str, deque], key: str):
+        events = index[key]
+        events.popleft()
+        if not events:
+            del index[key]
+
+    def user_events(self, user_id: str) -> deque:
+        """Eventos do usuário em ordem cronológica"""
+        return self._by_user.get(user_id, deque())
+
+    def user_counts(self, user_id: str) -> Counter:
+        """Contagem por nome de evento do usuário"""
+        return self._user_counts.get(user_id, Counter())
+
+    def user_events_since(self, user_id: str, since_ts: float) -> List[Dict[str, Any]]:
+        """Eventos do usuário desde `since_ts`, lendo o índice a partir do mais recente"""
+        recent = []
+        for event in reversed(self.user_events(user_id)):
+            if event["ts"] < since_ts:
+                break
+            recent.append(event)
+        recent.reverse()
+        return recent
+
+    def name_counts(self) -> Dict[str, int]:
+        return {name: len(events) for name, events in self._by_name.items()}
+
+    def user_count(self) -> int:
+        return len(self._by_user)
 
 class AnalyticsService:
-    def __init__(self):
-        self.events_cache = []  # Em uma aplicação real, usar banco de dados
+    def __init__(self, capacity: int = ANALYTICS_EVENTS_CAPACITY):
+        self.events_cache = EventRingBuffer(capacity)  # Em uma aplicação real, usar banco de dados
     
     async def track_event(self, event_name: str, properties: Optional[Dict[str, Any]] = None):
         """Registrar evento de analytics"""
         try:
+            user_id = properties.get("user_id") if properties else None
             event = {
                 "name": event_name,
                 "properties": properties or {},
-                "timestamp": datetime.now().isoformat(),
-                "session_id": properties.get("user_id") if properties else None
+                "ts": time.time(),
+                "user_id": user_id,
+                "session_id": user_id
             }
             
+            # Buffer circular: acima da capacidade o evento mais antigo sai
             self.events_cache.append(event)
             
-            # Manter apenas últimos 1000 eventos na memória
-            if len(self.events_cache) > 1000:
-                self.events_cache = self.events_cache[-1000:]
-            
             print(f"Analytics: {event_name} - {properties}")
         except Exception as e:
             print(f"Erro ao registrar evento: {e}")
@@ -31,41 +110,24 @@ class AnalyticsService:
     async def get_user_dashboard(self, user_id: str) -> Dict[str, Any]:
         """Buscar estatísticas do dashboard do usuário"""
         try:
-            # Filtrar eventos do usuário
-            user_events = [
-                e for e in self.events_cache 
-                if e.get("properties", {}).get("user_id") == user_id
-            ]
-            
-            # Calcular estatísticas básicas
-            total_prompts = len([
-                e for e in user_events 
-                if e["name"] == "prompt_created"
-            ])
+            # Índice por usuário: custo proporcional aos eventos do usuário
+            user_events = self.events_cache.user_events(user_id)
+            counts = self.events_cache.user_counts(user_id)
             
-            total_gemini_uses = len([
-                e for e in user_events 
-                if e["name"] == "gemini_used"
-            ])
-            
-            templates_created = len([
-                e for e in user_events 
-                if e["name"] == "template_created"
-            ])
+            total_prompts = counts["prompt_created"]
+            total_gemini_uses = counts["gemini_used"]
+            templates_created = counts["template_created"]
             
             # Atividade dos últimos 30 dias
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            recent_events = [
-                e for e in user_events
-                if datetime.fromisoformat(e["timestamp"]) >= thirty_days_ago
-            ]
+            thirty_days_ago = time.time() - 30 * 86400
+            recent_events = self.events_cache.user_events_since(user_id, thirty_days_ago)
             
             return {
                 "total_prompts": total_prompts,
                 "total_gemini_uses": total_gemini_uses,
                 "templates_created": templates_created,
                 "activity_last_30_days": len(recent_events),
-                "last_activity": user_events[-1]["timestamp"] if user_events else None
+                "last_activity": datetime.fromtimestamp(user_events[-1]["ts"]).isoformat() if user_events else None
             }
         except Exception as e:
             print(f"Erro ao buscar dashboard: {e}")
@@ -90,12 +152,8 @@ class AnalyticsService:
             else:
                 cutoff_date = datetime.now() - timedelta(days=30)
             
-            # Filtrar eventos do período
-            user_events = [
-                e for e in self.events_cache
-                if (e.get("properties", {}).get("user_id") == user_id and
-                    datetime.fromisoformat(e["timestamp"]) >= cutoff_date)
-            ]
+            # Eventos do período a partir do índice do usuário
+            user_events = self.events_cache.user_events_since(user_id, cutoff_date.timestamp())
             
             # Agrupar por tipo de evento
             event_counts = defaultdict(int)
@@ -103,7 +161,7 @@ class AnalyticsService:
             
             for event in user_events:
                 event_counts[event["name"]] += 1
-                day = datetime.fromisoformat(event["timestamp"]).strftime("%Y-%m-%d")
+                day = time.strftime("%Y-%m-%d", time.localtime(event["ts"]))
                 daily_activity[day] += 1
             
             # Categorias mais usadas
@@ -135,23 +193,16 @@ class AnalyticsService:
         try:
             total_events = len(self.events_cache)
             
-            # Usuários únicos
-            unique_users = set()
-            for event in self.events_cache:
-                user_id = event.get("properties", {}).get("user_id")
-                if user_id:
-                    unique_users.add(user_id)
-            
-            # Eventos por tipo
-            event_types = defaultdict(int)
-            for event in self.events_cache:
-                event_types[event["name"]] += 1
+            # Usuários únicos e eventos por tipo saem direto dos índices
+            unique_users = self.events_cache.user_count()
+            event_types = self.events_cache.name_counts()
             
             return {
                 "total_events": total_events,
-                "unique_users": len(unique_users),
-                "event_types": dict(event_types),
-                "cache_size": len(self.events_cache)
+                "unique_users": unique_users,
+                "event_types": event_types,
+                "cache_size": len(self.events_cache),
+                "capacity": self.events_cache.capacity
             }
         except Exception as e:
             print(f"Erro ao buscar métricas do sistema: {e}")
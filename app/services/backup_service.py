@@ -1,114 +1,207 @@
 import os
+import io
 import json
+import hashlib
 import zipfile
 from datetime import datetime
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Tuple
+
+# Formato 2.0: ZIP com prompts.jsonl (um prompt por linha) + manifest.json com checksums.
+# O 1.0 (um JSON único com todos os prompts) continua aceito na restauração.
+BACKUP_FORMAT = "costar-backup"
+BACKUP_VERSION = "2.0"
+MANIFEST_NAME = "manifest.json"
+PROMPTS_ENTRY = "prompts.jsonl"
+BACKUP_PAGE_SIZE = int(os.getenv("BACKUP_PAGE_SIZE", "500"))
+# deflate | zstd (zstd só com zipfile.ZIP_ZSTANDARD, Python 3.14+; senão cai para deflate)
+BACKUP_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "deflate").lower()
+
+def backup_compression() -> Tuple[int, str]:
+    """Método de compressão do ZIP e o nome registrado no manifest"""
+    if BACKUP_COMPRESSION == "zstd":
+        zstd = getattr(zipfile, "ZIP_ZSTANDARD", None)
+        if zstd is not None:
+            return zstd, "zstd"
+    return zipfile.ZIP_DEFLATED, "deflate"
 
 class BackupService:
     def __init__(self, supabase_service):
         self.supabase_service = supabase_service
         self.backup_dir = os.getenv("BACKUP_DIR", "./backups")
         os.makedirs(self.backup_dir, exist_ok=True)
-    
+
     async def create_user_backup(self, user_id: str) -> str:
-        """Criar backup completo dos dados do usuário"""
+        """
+        Criar backup completo dos dados do usuário
+        Os prompts são paginados e gravados direto na entrada comprimida do ZIP,
+        então só uma página fica em memória por vez
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        zip_filepath = os.path.join(self.backup_dir, f"backup_{user_id}_{timestamp}.zip")
+        # Arquivo parcial com outro nome: um backup interrompido nunca parece completo
+        partial_filepath = f"{zip_filepath}.partial"
+        compression, compression_name = backup_compression()
+        loop = asyncio.get_running_loop()
+
         try:
-            # Buscar todos os dados do usuário
-            prompts = await self.supabase_service.get_all_user_prompts(user_id)
-            
-            # Criar estrutura de backup
-            backup_data = {
-                "user_id": user_id,
-                "created_at": datetime.now().isoformat(),
-                "version": "1.0",
-                "data": {
-                    "prompts": prompts,
+            checksum = hashlib.sha256()
+            total_prompts = 0
+            total_bytes = 0
+            categories = set()
+
+            with zipfile.ZipFile(partial_filepath, 'w', compression) as zipf:
+                with zipf.open(PROMPTS_ENTRY, 'w', force_zip64=True) as entry:
+                    async for page in self.supabase_service.iter_user_prompts(user_id, BACKUP_PAGE_SIZE):
+                        chunk = "".join(
+                            json.dumps(prompt, ensure_ascii=False, default=str) + "\n" for prompt in page
+                        ).encode("utf-8")
+                        checksum.update(chunk)
+                        # Compressão e escrita fora do event loop
+                        await loop.run_in_executor(None, entry.write, chunk)
+                        total_prompts += len(page)
+                        total_bytes += len(chunk)
+                        categories.update(p.get("categoria", "geral") for p in page)
+
+                manifest = {
+                    "format": BACKUP_FORMAT,
+                    "version": BACKUP_VERSION,
+                    "user_id": user_id,
+                    "created_at": datetime.now().isoformat(),
+                    "compression": compression_name,
+                    "entries": {
+                        PROMPTS_ENTRY: {
+                            "records": total_prompts,
+                            "bytes": total_bytes,
+                            "sha256": checksum.hexdigest()
+                        }
+                    },
                     "metadata": {
-                        "total_prompts": len(prompts),
-                        "categories": list(set(p.get("categoria", "geral") for p in prompts))
+                        "total_prompts": total_prompts,
+                        "categories": sorted(categories)
                     }
                 }
-            }
-            
-            # Criar arquivo de backup
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"backup_{user_id}_{timestamp}.json"
-            filepath = os.path.join(self.backup_dir, filename)
-            
-            # Salvar dados em arquivo JSON
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=2, default=str)
-            
-            # Criar arquivo ZIP
-            zip_filename = f"backup_{user_id}_{timestamp}.zip"
-            zip_filepath = os.path.join(self.backup_dir, zip_filename)
-            
-            with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(filepath, filename)
-            
-            # Remover arquivo JSON temporário
-            os.remove(filepath)
-            
+                zipf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+            os.replace(partial_filepath, zip_filepath)
             return zip_filepath
-            
+
         except Exception as e:
+            if os.path.exists(partial_filepath):
+                os.remove(partial_filepath)
             raise Exception(f"Erro ao criar backup: {str(e)}")
-    
+
     async def restore_user_backup(self, user_id: str, backup_file: str):
-        """Restaurar backup do usuário"""
+        """Restaurar backup do usuário (formato 2.0 em streaming ou 1.0 legado)"""
         try:
-            # Extrair e ler arquivo de backup
             with zipfile.ZipFile(backup_file, 'r') as zipf:
-                # Assumir que há apenas um arquivo JSON no ZIP
-                json_filename = zipf.namelist()[0]
-                with zipf.open(json_filename) as f:
-                    backup_data = json.load(f)
-            
-            # Validar dados do backup
-            if backup_data.get("user_id") != user_id:
-                raise Exception("Backup não pertence ao usuário atual")
-            
-            # Restaurar prompts
-            prompts = backup_data.get("data", {}).get("prompts", [])
-            restored_count = 0
-            
-            for prompt_data in prompts:
-                try:
-                    # Remover campos que serão recriados
-                    prompt_data.pop("id", None)
-                    prompt_data.pop("criado_em", None)
-                    prompt_data.pop("atualizado_em", None)
-                    
-                    # Criar prompt
-                    await self.supabase_service.create_prompt(
-                        user_id=user_id,
-                        titulo=prompt_data.get("titulo", "Prompt Restaurado"),
-                        prompt_data={
-                            "contexto": prompt_data.get("contexto", ""),
-                            "objetivo": prompt_data.get("objetivo", ""),
-                            "estilo": prompt_data.get("estilo", ""),
-                            "tom": prompt_data.get("tom", ""),
-                            "audiencia": prompt_data.get("audiencia", ""),
-                            "resposta": prompt_data.get("resposta", "")
-                        },
-                        prompt_completo=prompt_data.get("prompt_completo", ""),
-                        categoria=prompt_data.get("categoria", "geral"),
-                        tags=prompt_data.get("tags", []),
-                        favorito=prompt_data.get("favorito", False),
-                        compartilhado=prompt_data.get("compartilhado", False)
-                    )
-                    restored_count += 1
-                    
-                except Exception as e:
-                    print(f"Erro ao restaurar prompt: {e}")
-                    continue
-            
+                if MANIFEST_NAME not in zipf.namelist():
+                    return await self._restore_legacy_backup(user_id, zipf)
+
+                manifest = json.loads(zipf.read(MANIFEST_NAME))
+                if manifest.get("user_id") != user_id:
+                    raise Exception("Backup não pertence ao usuário atual")
+
+                # Conferir checksum antes de gravar qualquer prompt
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._verify_entry, zipf, manifest, PROMPTS_ENTRY)
+
+                restored_count = 0
+                total_prompts = 0
+                lines = self._iter_jsonl(zipf, PROMPTS_ENTRY)
+                while True:
+                    # Leitura/descompressão no executor, uma linha por vez
+                    prompt_data = await loop.run_in_executor(None, next, lines, None)
+                    if prompt_data is None:
+                        break
+                    total_prompts += 1
+                    if await self._restore_prompt(user_id, prompt_data):
+                        restored_count += 1
+
             return {
                 "message": "Backup restaurado com sucesso",
                 "prompts_restored": restored_count,
-                "total_prompts": len(prompts)
+                "total_prompts": total_prompts
             }
-            
+
+        except Exception as e:
+            raise Exception(f"Erro ao restaurar backup: {str(e)}")
+
+    async def _restore_legacy_backup(self, user_id: str, zipf: zipfile.ZipFile) -> Dict[str, Any]:
+        """Formato 1.0: um único JSON com todos os prompts"""
+        # Assumir que há apenas um arquivo JSON no ZIP
+        json_filename = zipf.namelist()[0]
+        with zipf.open(json_filename) as f:
+            backup_data = json.load(f)
+
+        # Validar dados do backup
+        if backup_data.get("user_id") != user_id:
+            raise Exception("Backup não pertence ao usuário atual")
+
+        # Restaurar prompts
+        prompts = backup_data.get("data", {}).get("prompts", [])
+        restored_count = 0
+
+        for prompt_data in prompts:
+            if await self._restore_prompt(user_id, prompt_data):
+                restored_count += 1
+
+        return {
+            "message": "Backup restaurado com sucesso",
+            "prompts_restored": restored_count,
+            "total_prompts": len(prompts)
+        }
+
+    @staticmethod
+    def _verify_entry(zipf: zipfile.ZipFile, manifest: Dict[str, Any], name: str):
+        """Comparar sha256 e número de registros da entrada com o manifest (leitura em blocos)"""
+        expected = manifest.get("entries", {}).get(name)
+        if not expected:
+            raise Exception(f"Manifest sem a entrada {name}")
+        checksum = hashlib.sha256()
+        records = 0
+        with zipf.open(name) as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                checksum.update(block)
+                records += block.count(b"\n")
+        if checksum.hexdigest() != expected.get("sha256") or records != expected.get("records"):
+            raise Exception(f"Checksum inválido em {name}: backup corrompido ou alterado")
+
+    @staticmethod
+    def _iter_jsonl(zipf: zipfile.ZipFile, name: str) -> Iterator[Dict[str, Any]]:
+        with zipf.open(name) as raw:
+            for line in io.TextIOWrapper(raw, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+
+    async def _restore_prompt(self, user_id: str, prompt_data: Dict[str, Any]) -> bool:
+        """Recriar um prompt do backup; retorna False se falhar"""
+        try:
+            # Remover campos que serão recriados
+            prompt_data.pop("id", None)
+            prompt_data.pop("criado_em", None)
+            prompt_data.pop("atualizado_em", None)
+
+            # Criar prompt
+            await self.supabase_service.create_prompt(
+                user_id=user_id,
+                titulo=prompt_data.get("titulo", "Prompt Restaurado"),
+                prompt_data={
+                    "contexto": prompt_data.get("contexto", ""),
+                    "objetivo": prompt_data.get("objetivo", ""),
+                    "estilo": prompt_data.get("estilo", ""),
+                    "tom": prompt_data.get("tom", ""),
+                    "audiencia": prompt_data.get("audiencia", ""),
+                    "resposta": prompt_data.get("resposta", "")
+                },
+                prompt_completo=prompt_data.get("prompt_completo", ""),
+                categoria=prompt_data.get("categoria", "geral"),
+                tags=prompt_data.get("tags", []),
+                favorito=prompt_data.get("favorito", False),
+                compartilhado=prompt_data.get("compartilhado", False)
+            )
+            return True
+
         except Exception as e:
-            raise Exception(f"Erro ao restaurar backup: {str(e)}")
\ No newline at end of file
+            print(f"Erro ao restaurar prompt: {e}")
+            return False
@@ -4,6 +4,11 @@ import os
 from typing import Any, Optional, List
 import asyncio
 
+from app.services.metrics import CACHE_REQUESTS
+
+_CACHE_HITS = CACHE_REQUESTS.labels("cache_service", "hit")
+_CACHE_MISSES = CACHE_REQUESTS.labels("cache_service", "miss")
+
 class CacheService:
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
@@ -23,16 +28,19 @@ class CacheService:
             if self.redis_client:
                 value = self.redis_client.get(key)
                 if value:
+                    _CACHE_HITS.inc()
                     return json.loads(value)
             else:
                 # Cache em memória
                 cache_entry = self.memory_cache.get(key)
                 if cache_entry and cache_entry["expires"] > asyncio.get_event_loop().time():
+                    _CACHE_HITS.inc()
                     return cache_entry["value"]
                 elif cache_entry:
                     # Remover entrada expirada
                     del self.memory_cache[key]
             
+            _CACHE_MISSES.inc()
             return None
         except Exception as e:
             print(f"Erro ao buscar cache: {e}")
@@ -0,0 +1,85 @@
+"""
+Orçamento de tempo (deadline) por requisição
+Criado na entrada da requisição e repassado às chamadas de provedores, que
+derivam dele o timeout de cada tentativa. Uma reserva final fica sempre
+disponível para o gerador básico de fallback.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Optional
+
+# Orçamento padrão quando o chamador não cria um deadline próprio
+DEFAULT_BUDGET_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+DEFAULT_FALLBACK_RESERVE_SECONDS = float(os.getenv("FALLBACK_RESERVE_SECONDS", "1.5"))
+# Tentativas com menos tempo que isso não são iniciadas
+MIN_ATTEMPT_SECONDS = float(os.getenv("MIN_ATTEMPT_SECONDS", "2"))
+
+class DeadlineExceeded(Exception):
+    """Não há tempo suficiente no orçamento para a tentativa"""
+
+class Deadline:
+    """Orçamento de tempo com reserva para o fallback"""
+
+    def __init__(self, budget: float = DEFAULT_BUDGET_SECONDS,
+                 fallback_reserve: float = DEFAULT_FALLBACK_RESERVE_SECONDS):
+        self.budget = budget
+        self.fallback_reserve = min(fallback_reserve, budget)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    @classmethod
+    def ensure(cls, deadline: Optional["Deadline"]) -> "Deadline":
+        """Usar o deadline recebido ou criar um com o orçamento padrão"""
+        return deadline if deadline is not None else cls()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        """Tempo total restante, incluindo a reserva do fallback"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def available(self) -> float:
+        """Tempo restante utilizável por provedores (sem a reserva)"""
+        return max(0.0, self.remaining() - self.fallback_reserve)
+
+    @property
+    def expired(self) -> bool:
+        return self.available() <= 0
+
+    def can_attempt(self, min_seconds: float = MIN_ATTEMPT_SECONDS) -> bool:
+        """Há tempo para iniciar mais uma tentativa?"""
+        return self.available() >= min_seconds
+
+    def timeout_for(self, cap: Optional[float] = None, attempts_after: int = 0,
+                    min_seconds: float = MIN_ATTEMPT_SECONDS) -> float:
+        """
+        Timeout para a próxima tentativa
+
+        `cap` limita o tempo de uma única tentativa; `attempts_after` guarda
+        `min_seconds` para cada tentativa seguinte, para que um provedor lento
+        não consuma o orçamento inteiro.
+        """
+        timeout = self.available() - attempts_after * min_seconds
+        if cap is not None:
+            timeout = min(timeout, cap)
+        # Sem espaço para as seguintes, a atual ainda pode usar o que resta
+        timeout = max(timeout, min(self.available(), min_seconds))
+        if timeout < min_seconds:
+            raise DeadlineExceeded(f"Orçamento esgotado ({self.available():.1f}s restantes)")
+        return timeout
+
+    async def run(self, awaitable: Awaitable[Any], cap: Optional[float] = None,
+                  attempts_after: int = 0) -> Any:
+        """Aguardar com timeout derivado do orçamento"""
+        try:
+            timeout = self.timeout_for(cap, attempts_after)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+
+    def __repr__(self) -> str:
+        return f"Deadline(budget={self.budget:.1f}s, remaining={self.remaining():.1f}s)"
@@ -0,0 +1,214 @@
+"""
+Diagnóstico sob demanda do worker em produção
+Profiler de CPU por amostragem (stacks colapsadas, formato de flamegraph),
+snapshots de memória com tracemalloc e medição de atraso do event loop.
+Nada roda enquanto não for pedido: sem thread, sem hooks, sem tracemalloc.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+MAX_PROFILE_SECONDS = float(os.getenv("DIAGNOSTICS_MAX_PROFILE_SECONDS", "30"))
+MIN_SAMPLE_INTERVAL = 0.001
+# Folhas de stack de threads ociosas (esperando I/O ou lock), ignoradas no profile de CPU
+_IDLE_FUNCTIONS = {"select", "poll", "wait", "accept", "_wait_for_tstate_lock"}
+
+class DiagnosticsBusy(Exception):
+    """Já existe um profile em andamento neste worker"""
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_name in _IDLE_FUNCTIONS
+
+def _collapse(frame, max_depth: int) -> str:
+    """Stack da raiz para a folha, separada por ';' (formato do flamegraph.pl/speedscope)"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+class SamplingProfiler:
+    """Amostrador de stacks de todas as threads via sys._current_frames()"""
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, duration: float, interval: float = 0.005,
+               include_idle: bool = False) -> Dict[str, Any]:
+        """Amostrar por `duration` segundos (bloqueia a thread chamadora)"""
+        if not self._lock.acquire(blocking=False):
+            raise DiagnosticsBusy("Profile já em andamento")
+        try:
+            duration = min(max(duration, 0.1), MAX_PROFILE_SECONDS)
+            interval = max(interval, MIN_SAMPLE_INTERVAL)
+            own_id = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = _collapse(frame, self.max_depth)
+                    # Threads paradas em select/wait não interessam para CPU
+                    if not include_idle and _is_idle(frame):
+                        continue
+                    stacks[f"{names.get(thread_id, thread_id)};{stack}"] += 1
+                samples += 1
+                time.sleep(interval)
+            return {
+                "duration": round(time.perf_counter() - started, 3),
+                "interval": interval,
+                "samples": samples,
+                "stacks": stacks
+            }
+        finally:
+            self._lock.release()
+
+def collapsed_text(stacks: Counter) -> str:
+    """Uma linha 'stack contagem' por stack (entrada do flamegraph.pl)"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+def top_functions(stacks: Counter, limit: int = 25) -> List[Dict[str, Any]]:
+    """Funções com mais amostras próprias (folha) e inclusivas (em qualquer nível)"""
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    total = sum(stacks.values()) or 1
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]  # primeiro item é o nome da thread
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for label in set(frames):
+            inclusive[label] += count
+    return [
+        {
+            "function": label,
+            "self_samples": own[label],
+            "self_pct": round(own[label] * 100 / total, 1),
+            "inclusive_samples": inclusive[label],
+            "inclusive_pct": round(inclusive[label] * 100 / total, 1)
+        }
+        for label, _ in own.most_common(limit)
+    ]
+
+class MemoryProfiler:
+    """Snapshots de tracemalloc com diff em relação ao snapshot anterior"""
+
+    def __init__(self):
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 10) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._started_here = True
+        self._previous = None
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        status = self.status()
+        if tracemalloc.is_tracing() and self._started_here:
+            tracemalloc.stop()
+        self._started_here = False
+        self._previous = None
+        return status
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_current_kb": round(current / 1024, 1),
+            "traced_peak_kb": round(peak / 1024, 1),
+            "has_baseline": self._previous is not None
+        }
+
+    def snapshot(self, limit: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+        """Top alocações atuais e diferença desde o snapshot anterior"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc não está ativo; chame start primeiro")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        result = {
+            **self.status(),
+            "top": [_stat_to_dict(stat) for stat in snapshot.statistics(group_by)[:limit]],
+            "diff": None
+        }
+        if self._previous is not None:
+            result["diff"] = [_stat_to_dict(stat) for stat in snapshot.compare_to(self._previous, group_by)[:limit]]
+        self._previous = snapshot
+        result["has_baseline"] = True
+        return result
+
+def _stat_to_dict(stat) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    data = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count
+    }
+    if hasattr(stat, "size_diff"):
+        data["size_diff_kb"] = round(stat.size_diff / 1024, 1)
+        data["count_diff"] = stat.count_diff
+    return data
+
+async def measure_loop_lag(duration: float = 2.0, interval: float = 0.05) -> Dict[str, Any]:
+    """Atraso do event loop: quanto cada sleep(interval) passou do previsto"""
+    loop = asyncio.get_running_loop()
+    lags: List[float] = []
+    deadline = loop.time() + min(duration, MAX_PROFILE_SECONDS)
+    while loop.time() < deadline:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+    lags.sort()
+    if not lags:
+        return {"samples": 0}
+    return {
+        "samples": len(lags),
+        "interval_ms": interval * 1000,
+        "avg_ms": round(sum(lags) / len(lags) * 1000, 2),
+        "p95_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))] * 1000, 2),
+        "max_ms": round(lags[-1] * 1000, 2)
+    }
+
+_sampling_profiler: Optional[SamplingProfiler] = None
+_memory_profiler: Optional[MemoryProfiler] = None
+
+def get_sampling_profiler() -> SamplingProfiler:
+    """Obter instância do profiler de CPU com lazy loading"""
+    global _sampling_profiler
+    if _sampling_profiler is None:
+        _sampling_profiler = SamplingProfiler()
+    return _sampling_profiler
+
+def get_memory_profiler() -> MemoryProfiler:
+    """Obter instância do profiler de memória com lazy loading"""
+    global _memory_profiler
+    if _memory_profiler is None:
+        _memory_profiler = MemoryProfiler()
+    return _memory_profiler
@@ -0,0 +1,86 @@
+"""
+Executor "primeira resposta válida vence"
+Dispara tentativas em paralelo com limite de concorrência e prazo total,
+cancelando as demais assim que uma delas retorna um resultado aceito
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+C = TypeVar("C")
+R = TypeVar("R")
+
+class FirstSuccessResult(Generic[C, R]):
+    """Resultado da execução: candidato vencedor, valor e falhas observadas"""
+
+    def __init__(self, candidate: Optional[C] = None, value: Optional[R] = None,
+                 errors: Optional[List[Tuple[C, BaseException]]] = None,
+                 attempts: int = 0, timed_out: bool = False, elapsed: float = 0.0):
+        self.candidate = candidate
+        self.value = value
+        self.errors = errors or []
+        self.attempts = attempts
+        self.timed_out = timed_out
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self) -> bool:
+        return self.candidate is not None
+
+async def run_first_success(candidates: List[C], attempt: Callable[[C], Awaitable[R]],
+                            max_concurrency: int = 3, overall_timeout: float = 20.0,
+                            accept: Callable[[Any], bool] = bool) -> FirstSuccessResult:
+    """
+    Executar `attempt` sobre os candidatos, na ordem, com até `max_concurrency`
+    tentativas simultâneas. Retorna no primeiro resultado aceito ou quando o
+    prazo total acaba; tentativas ainda em andamento são canceladas.
+    """
+    started = time.monotonic()
+    deadline = started + overall_timeout
+    queue = list(candidates)
+    running = {}
+    errors: List[Tuple[C, BaseException]] = []
+    attempts = 0
+
+    def launch():
+        nonlocal attempts
+        while queue and len(running) < max_concurrency:
+            candidate = queue.pop(0)
+            running[asyncio.ensure_future(attempt(candidate))] = candidate
+            attempts += 1
+
+    try:
+        launch()
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return FirstSuccessResult(errors=errors, attempts=attempts, timed_out=True,
+                                          elapsed=time.monotonic() - started)
+
+            done, _ = await asyncio.wait(list(running), timeout=remaining,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                candidate = running.pop(task)
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if error is not None:
+                    errors.append((candidate, error))
+                    continue
+                value = task.result()
+                if accept(value):
+                    return FirstSuccessResult(candidate, value, errors, attempts,
+                                              elapsed=time.monotonic() - started)
+            launch()
+
+        return FirstSuccessResult(errors=errors, attempts=attempts,
+                                  elapsed=time.monotonic() - started)
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            # Aguardar o cancelamento para não deixar tarefas órfãs no loop
+            await asyncio.gather(*running, return_exceptions=True)
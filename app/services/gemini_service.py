@@ -5,6 +5,8 @@ import asyncio
 import json
 from dotenv import load_dotenv
 
+from app.services.deadline import Deadline
+
 class GeminiService:
     def __init__(self):
         # Carregar variáveis de ambiente
@@ -21,10 +23,14 @@ class GeminiService:
         prompt: str,
         temperatura: float = 0.7,
         max_tokens: int = 2048,
+        deadline: Optional[Deadline] = None,
         **kwargs
     ) -> str:
         """Gerar conteúdo usando Gemini via API REST"""
         try:
+            # Timeout derivado do orçamento da requisição (30s no máximo)
+            timeout = Deadline.ensure(deadline).timeout_for(cap=30.0)
+            
             url = f"{self.base_url}/models/{self.model}:generateContent"
             
             headers = {
@@ -47,7 +53,7 @@ class GeminiService:
             
             params = {"key": self.api_key}
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0))) as client:
                 response = await client.post(url, json=data, headers=headers, params=params)
                 
                 if response.status_code != 200:
@@ -8,6 +8,10 @@ from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 from pydantic import BaseModel
 
+from app.services.pagination import (
+    paginate, build_page, clamp_page_size, decode_cursor, keyset_filter, InvalidCursorError
+)
+
 # Importações condicionais do Supabase
 try:
     from app.services.supabase_base_service import SupabaseService
@@ -98,6 +102,14 @@ class DataService:
         else:
             return self._get_user_prompts_demo(user_id, limit, offset)
     
+    def get_user_prompts_page(self, user_id: str, cursor: Optional[str] = None,
+                              limit: Optional[int] = None) -> Dict[str, Any]:
+        """Busca uma página de prompts do usuário (paginação por cursor)"""
+        if self.mode == "supabase":
+            return self._get_user_prompts_page_supabase(user_id, cursor, limit)
+        else:
+            return self._get_user_prompts_page_demo(user_id, cursor, limit)
+    
     def delete_prompt(self, user_id: str, prompt_id: str) -> bool:
         """Deleta um prompt"""
         if self.mode == "supabase":
@@ -196,6 +208,38 @@ class DataService:
             print(f"Exceção ao buscar prompts: {e}")
             return []
     
+    def _get_user_prompts_page_supabase(self, user_id: str, cursor: Optional[str],
+                                        limit: Optional[int]) -> Dict[str, Any]:
+        """Busca página de prompts no Supabase por keyset (created_at, id)"""
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor)
+        try:
+            client = self.supabase_service.get_client()
+            query = client.table('prompts').select('*', count='estimated').eq('user_id', user_id)
+            
+            if after is not None:
+                query = query.or_(keyset_filter('created_at', after))
+            
+            # Uma linha extra indica se existe próxima página
+            response = (query.order('created_at', desc=True)
+                             .order('id', desc=True)
+                             .limit(limit + 1)
+                             .execute())
+            rows = response.data or []
+            
+            next_key = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_key = (rows[-1].get('created_at', ''), rows[-1].get('id', ''))
+            
+            return build_page(rows, next_key, limit, response.count, total_is_estimate=True)
+            
+        except InvalidCursorError:
+            raise
+        except Exception as e:
+            print(f"Exceção ao buscar página de prompts: {e}")
+            return build_page([], None, limit, 0)
+    
     def _delete_prompt_supabase(self, user_id: str, prompt_id: str) -> bool:
         """Deleta prompt no Supabase"""
         try:
@@ -367,6 +411,17 @@ class DataService:
         user_prompts.sort(key=lambda x: x['created_at'], reverse=True)
         return user_prompts[offset:offset + limit]
     
+    def _get_user_prompts_page_demo(self, user_id: str, cursor: Optional[str],
+                                    limit: Optional[int]) -> Dict[str, Any]:
+        """Busca página de prompts do usuário no modo demo"""
+        user_prompts = (p for p in self.demo_data['prompts'] if p['user_id'] == user_id)
+        return paginate(
+            user_prompts,
+            lambda p: (str(p.get('created_at', '')), str(p.get('id', ''))),
+            cursor=cursor,
+            limit=limit
+        )
+    
     def _delete_prompt_demo(self, user_id: str, prompt_id: str) -> bool:
         """Deleta prompt no modo demo"""
         for i, prompt in enumerate(self.demo_data['prompts']):
@@ -467,10 +522,14 @@ class DataService:
             'total_cost': 0.07
         }
 
-# Instância global do serviço
-data_service = DataService()
+# Instância global do serviço (lazy loading): o teste de conexão com o Supabase
+# acontece no primeiro uso, não no import do módulo
+_data_service: Optional[DataService] = None
 
 # Função para obter a instância
 def get_data_service() -> DataService:
     """Retorna instância global do serviço de dados"""
-    return data_service
\ No newline at end of file
+    global _data_service
+    if _data_service is None:
+        _data_service = DataService()
+    return _data_service
@@ -0,0 +1,211 @@
+"""
+Histogramas de latência log-lineares (estilo HDR) por provedor, rota e hora
+Cada oitava [2^k, 2^(k+1)) de microssegundos é dividida em 2^b sub-buckets
+lineares, então o erro relativo de qualquer percentil fica abaixo de 1/2^b
+(≈3% com b=5) com memória fixa. Histogramas da mesma dimensão se combinam
+somando contagens, o que permite p50/p90/p95/p99 em qualquer janela de horas.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_LATENCY_US = 600 * 1_000_000  # valores acima de 10 min caem no último bucket
+
+LATENCY_RETENTION_HOURS = int(os.getenv("LATENCY_RETENTION_HOURS", "168"))
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+DIMENSION_PROVIDER = "provider"
+DIMENSION_ROUTE = "route"
+DIMENSIONS = (DIMENSION_PROVIDER, DIMENSION_ROUTE)
+
+def bucket_index(value_us: int) -> int:
+    """Índice do bucket: exato abaixo de 2*SUB_BUCKETS, depois SUB_BUCKETS por oitava"""
+    if value_us < 2 * SUB_BUCKETS:
+        return max(value_us, 0)
+    shift = value_us.bit_length() - (SUB_BUCKET_BITS + 1)
+    return shift * SUB_BUCKETS + (value_us >> shift)
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """Limites [inferior, superior) do bucket em microssegundos"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    top = index - shift * SUB_BUCKETS
+    return top << shift, (top + 1) << shift
+
+class LatencyHistogram:
+    """Contagens esparsas por bucket + contagem, soma, mínimo e máximo exatos"""
+
+    __slots__ = ("counts", "count", "total_us", "min_us", "max_us")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us: Optional[int] = None
+
+    def record(self, seconds: float):
+        value_us = min(max(int(seconds * 1_000_000), 0), MAX_LATENCY_US)
+        index = bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value_us
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = value_us if self.max_us is None else max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+        return self
+
+    def percentiles(self, quantiles: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        """Percentis em ms (ponto médio do bucket, limitado ao mínimo/máximo observados)"""
+        quantiles = sorted(quantiles)
+        result: Dict[str, float] = {}
+        if not self.count:
+            return {f"p{q:g}": 0.0 for q in quantiles}
+        targets = [(q, max(1, -(-self.count * q // 100))) for q in quantiles]  # rank mais próximo
+        cumulative = 0
+        pending = iter(targets)
+        quantile, rank = next(pending)
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            while cumulative >= rank:
+                lower, upper = bucket_bounds(index)
+                value = min(max((lower + upper - 1) / 2, self.min_us), self.max_us)
+                result[f"p{quantile:g}"] = round(value / 1000, 3)
+                try:
+                    quantile, rank = next(pending)
+                except StopIteration:
+                    return result
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma serializável em JSON (chaves dos buckets como string)"""
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total_us": self.total_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "LatencyHistogram":
+        histogram = cls()
+        if data:
+            histogram.counts = {int(index): count for index, count in data.get("counts", {}).items()}
+            histogram.count = data.get("count", 0)
+            histogram.total_us = data.get("total_us", 0)
+            histogram.min_us = data.get("min_us")
+            histogram.max_us = data.get("max_us")
+        return histogram
+
+    def summary(self, quantiles: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0.0,
+            "min_ms": round((self.min_us or 0) / 1000, 3),
+            "max_ms": round((self.max_us or 0) / 1000, 3),
+            **self.percentiles(quantiles)
+        }
+
+class LatencyHistogramStore:
+    """Histogramas por (dimensão, chave, hora), com retenção em horas"""
+
+    def __init__(self, retention_hours: int = LATENCY_RETENTION_HOURS):
+        self.retention_hours = retention_hours
+        self._histograms: Dict[Tuple[str, str, int], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._oldest_hour = 0
+        # Momento da primeira amostra ao vivo por (dimensão, chave): o que é anterior vem do histórico
+        self._first_live: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def hour_of(timestamp: Optional[float] = None) -> int:
+        return int((time.time() if timestamp is None else timestamp) // 3600)
+
+    def record(self, dimension: str, key: str, seconds: float, timestamp: Optional[float] = None):
+        """Amostra ao vivo (timestamp=None) ou do histórico gravado (timestamp em epoch)"""
+        live = timestamp is None
+        if live:
+            timestamp = time.time()
+        hour = self.hour_of(timestamp)
+        if hour <= self.hour_of() - self.retention_hours:
+            return
+        with self._lock:
+            if live:
+                self._first_live.setdefault((dimension, key), timestamp)
+            histogram = self._histograms.get((dimension, key, hour))
+            if histogram is None:
+                histogram = self._histograms[(dimension, key, hour)] = LatencyHistogram()
+                self._expire(hour)
+            histogram.record(seconds)
+
+    def _expire(self, current_hour: int):
+        """Descartar horas fora da retenção (só quando uma hora nova aparece)"""
+        cutoff = current_hour - self.retention_hours
+        if cutoff <= self._oldest_hour:
+            return
+        for slot in [slot for slot in self._histograms if slot[2] <= cutoff]:
+            del self._histograms[slot]
+        self._oldest_hour = cutoff
+
+    def first_live_sample(self, dimension: str, key: str) -> Optional[float]:
+        with self._lock:
+            return self._first_live.get((dimension, key))
+
+    def is_empty(self) -> bool:
+        return not self._histograms
+
+    def keys(self, dimension: str) -> List[str]:
+        with self._lock:
+            return sorted({key for dim, key, _ in self._histograms if dim == dimension})
+
+    def merged(self, dimension: str, key: Optional[str] = None, hours: int = 24,
+               end_hour: Optional[int] = None) -> Dict[str, LatencyHistogram]:
+        """Um histograma por chave, somando as horas da janela [end_hour - hours + 1, end_hour]"""
+        end_hour = self.hour_of() if end_hour is None else end_hour
+        start_hour = end_hour - hours + 1
+        merged: Dict[str, LatencyHistogram] = {}
+        with self._lock:
+            for (dim, slot_key, hour), histogram in self._histograms.items():
+                if dim != dimension or not start_hour <= hour <= end_hour or (key and slot_key != key):
+                    continue
+                merged.setdefault(slot_key, LatencyHistogram()).merge(histogram)
+        return merged
+
+    def summary(self, dimension: str, key: Optional[str] = None, hours: int = 24,
+                quantiles: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, Dict[str, Any]]:
+        quantiles = tuple(quantiles)
+        return {slot_key: histogram.summary(quantiles)
+                for slot_key, histogram in sorted(self.merged(dimension, key, hours).items())}
+
+    def hourly(self, dimension: str, key: str, hours: int = 24,
+               quantiles: Iterable[float] = DEFAULT_PERCENTILES) -> List[Dict[str, Any]]:
+        """Série por hora de uma chave (horas sem amostras ficam de fora)"""
+        end_hour = self.hour_of()
+        with self._lock:
+            slots = sorted((hour, histogram) for (dim, slot_key, hour), histogram in self._histograms.items()
+                           if dim == dimension and slot_key == key and hour > end_hour - hours)
+        return [{"hour": datetime.fromtimestamp(hour * 3600).isoformat(), **histogram.summary(quantiles)}
+                for hour, histogram in slots]
+
+_latency_store: Optional[LatencyHistogramStore] = None
+
+def get_latency_store() -> LatencyHistogramStore:
+    """Obter instância dos histogramas de latência com lazy loading"""
+    global _latency_store
+    if _latency_store is None:
+        _latency_store = LatencyHistogramStore()
+    return _latency_store
@@ -0,0 +1,146 @@
+"""
+Monitor contínuo do event loop
+Uma tarefa de heartbeat mede o atraso do loop o tempo todo e publica em
+/metrics. Em modo debug, uma thread watchdog captura a stack da thread do
+loop quando ele fica bloqueado além do limite, para apontar a chamada
+síncrona responsável.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+
+from app.services.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.25"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", os.getenv("DEBUG", "false")).lower() == "true"
+
+_registry = get_metrics_registry()
+LOOP_LAG = _registry.histogram(
+    "costar_event_loop_lag_seconds", "Atraso do event loop medido pelo heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_LAST = _registry.gauge(
+    "costar_event_loop_lag_last_seconds", "Último atraso medido do event loop")
+LOOP_BLOCKS = _registry.counter(
+    "costar_event_loop_blocks", "Bloqueios do event loop acima do limite (modo debug)")
+
+class LoopMonitor:
+    """Heartbeat de atraso do loop + watchdog de chamadas bloqueantes"""
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL,
+                 block_threshold: float = LOOP_BLOCK_THRESHOLD_MS / 1000,
+                 debug: bool = LOOP_MONITOR_DEBUG, max_reports: int = 20):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self.reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.beats = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._last_beat = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Iniciar no event loop atual (chamar de dentro do loop, ex.: no lifespan)"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        if self.debug:
+            # Modo debug do asyncio também registra no log os callbacks lentos
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.block_threshold
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(f"🫀 Monitor do event loop ativo (intervalo {self.interval * 1000:.0f}ms, "
+                    f"limite {self.block_threshold * 1000:.0f}ms, debug={self.debug})")
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        lag_series = LOOP_LAG.labels()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+            self.beats += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            lag_series.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    def _watch(self):
+        """Thread watchdog: se o heartbeat atrasou além do limite, capturar a stack do loop"""
+        reported_beat = -1
+        poll = max(self.block_threshold / 2, 0.01)
+        while not self._stopping.wait(poll):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.block_threshold or reported_beat == self.beats:
+                continue
+            reported_beat = self.beats  # um relatório por bloqueio
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            LOOP_BLOCKS.inc()
+            self.reports.append({
+                "detected_at": datetime.now().isoformat(),
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "stack": stack
+            })
+            logger.warning(f"🧱 [LOOP] Event loop bloqueado há {blocked_for * 1000:.0f}ms. Stack:\n{stack}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Resumo para endpoints administrativos"""
+        return {
+            "running": self.running,
+            "debug": self.debug,
+            "interval_ms": self.interval * 1000,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "beats": self.beats,
+            "blocking_reports": list(self.reports)
+        }
+
+_loop_monitor: Optional[LoopMonitor] = None
+
+def get_loop_monitor() -> LoopMonitor:
+    """Obter instância do monitor do event loop com lazy loading"""
+    global _loop_monitor
+    if _loop_monitor is None:
+        _loop_monitor = LoopMonitor()
+    return _loop_monitor
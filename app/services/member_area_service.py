@@ -3,12 +3,18 @@ Sistema de Área de Membros - Interface para usuários premium
 """
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 import uuid
 from enum import Enum
 
+from app.services.template_search_index import TemplateSearchIndex
+from app.services.template_ranking import TemplateRanking, SORT_POPULAR, cursor_values, key_from_cursor
+from app.services.template_counter_buffer import TemplateCounterBuffer, apply_deltas
+from app.services.pagination import paginate, build_page, clamp_page_size, decode_cursor
+
 class SubscriptionPlan(Enum):
     FREE = "free"
     PREMIUM = "premium"
@@ -64,6 +70,22 @@ class MemberAreaService:
         self.analytics_file = 'data/member_analytics.json'
         self._ensure_member_data_files()
         
+        # Índice de busca e ranking dos templates (construídos sob demanda)
+        self._search_index: Optional[TemplateSearchIndex] = None
+        self._ranking: Optional[TemplateRanking] = None
+        self._templates_mtime: Optional[float] = None
+        
+        # Usos e avaliações são acumulados em memória e gravados em lote
+        self._templates_lock = threading.RLock()
+        self._counter_buffer = TemplateCounterBuffer(
+            self._flush_template_counters,
+            flush_interval=float(os.getenv('TEMPLATE_COUNTER_FLUSH_INTERVAL', '5')),
+            max_pending_events=int(os.getenv('TEMPLATE_COUNTER_FLUSH_SIZE', '200')),
+            # Troca do lote e gravação sob a trava dos templates: leituras e reconstruções
+            # de índice/ranking nunca veem o lote fora do buffer e ainda fora do arquivo
+            flush_lock=self._templates_lock
+        )
+        
         # Configurações de quota por plano
         self.plan_quotas = {
             SubscriptionPlan.FREE: {
@@ -204,9 +226,16 @@ class MemberAreaService:
                     raise Exception(f"Quota de templates excedida. Plano {profile.subscription_plan.value} permite apenas {quota} templates.")
         
         # Salvar template
-        templates = self._load_templates()
-        templates.append(asdict(template))
-        self._save_templates(templates)
+        template_record = asdict(template)
+        template_record['created_at'] = template.created_at.isoformat()
+        template_record['updated_at'] = template.updated_at.isoformat()
+        
+        with self._templates_lock:
+            templates = self._load_templates()
+            templates.append(template_record)
+            self._save_templates(templates)
+        self._index_template(template_record)
+        self._rank_template(template_record)
         
         # Atualizar estatísticas do usuário
         self.update_member_usage_stats(user_id, 'templates_created', 1)
@@ -215,7 +244,7 @@ class MemberAreaService:
     
     def get_user_templates(self, user_id: str) -> List[SavedPromptTemplate]:
         """Obter templates do usuário"""
-        templates = self._load_templates()
+        templates = self._load_templates_with_pending()
         user_templates = []
         
         for template_data in templates:
@@ -223,149 +252,101 @@ class MemberAreaService:
             if (template_data.get('user_id') == user_id or 
                 template_data.get('creator_id') == user_id):
                 
-                # Mapear campos corretamente
-                mapped_data = {
-                    'id': template_data['id'],
-                    'user_id': template_data.get('creator_id', template_data.get('user_id', '')),
-                    'name': template_data.get('title', template_data.get('name', '')),
-                    'description': template_data['description'],
-                    'category': template_data['category'],
-                    'template_content': {
-                        'context': template_data.get('context_template', ''),
-                        'task': '',
-                        'style': template_data.get('style', ''),
-                        'tone': template_data.get('tone', ''),
-                        'audience': '',
-                        'response': template_data.get('format', '')
-                    },
-                    'is_public': template_data.get('is_public', False),
-                    'created_at': datetime.fromisoformat(template_data['created_at']),
-                    'updated_at': datetime.fromisoformat(template_data['updated_at']),
-                    'usage_count': template_data.get('usage_count', 0),
-                    'tags': template_data.get('tags', []),
-                    'rating': template_data.get('rating', 0.0),
-                    'votes': template_data.get('votes', 0)
-                }
-                
-                user_templates.append(SavedPromptTemplate(**mapped_data))
+                user_templates.append(self._to_saved_template(template_data))
         
         return user_templates
     
     def get_public_templates(self, category: Optional[str] = None, 
                            search: Optional[str] = None) -> List[SavedPromptTemplate]:
         """Obter templates públicos"""
-        templates = self._load_templates()
-        public_templates = []
+        if search and search.strip():
+            # Busca full-text pelo índice invertido (já ordenada por relevância)
+            results = self._get_search_index().search(search, category=category)
+            return [self._to_saved_template(template_data) for template_data in results]
         
-        for template_data in templates:
-            if template_data['is_public']:
-                # Filtrar por categoria se especificada
-                if category and template_data['category'] != category:
-                    continue
-                
-                # Filtrar por termo de busca se especificado
-                if search:
-                    search_lower = search.lower()
-                    if (search_lower not in template_data.get('title', template_data.get('name', '')).lower() and
-                        search_lower not in template_data['description'].lower() and
-                        not any(search_lower in tag.lower() for tag in template_data['tags'])):
-                        continue
-                
-                # Mapear campos corretamente para a estrutura esperada
-                mapped_data = {
-                    'id': template_data['id'],
-                    'user_id': template_data.get('creator_id', ''),
-                    'name': template_data.get('title', template_data.get('name', '')),  # Mapear title -> name
-                    'description': template_data['description'],
-                    'category': template_data['category'],
-                    'template_content': {
-                        'context': template_data.get('context_template', ''),
-                        'task': '',
-                        'style': template_data.get('style', ''),
-                        'tone': template_data.get('tone', ''),
-                        'audience': '',
-                        'response': template_data.get('format', '')
-                    },
-                    'is_public': template_data['is_public'],
-                    'created_at': datetime.fromisoformat(template_data['created_at']),
-                    'updated_at': datetime.fromisoformat(template_data['updated_at']),
-                    'usage_count': template_data.get('usage_count', 0),
-                    'tags': template_data.get('tags', []),
-                    'rating': template_data.get('rating', 0.0),
-                    'votes': template_data.get('votes', 0)
-                }
-                
-                public_templates.append(SavedPromptTemplate(**mapped_data))
+        # Ranking mantido incrementalmente: já ordenado por rating e número de usos
+        ranking = self._get_ranking()
+        ranked = ranking.top(category, limit=ranking.count(category))
+        return [self._to_saved_template(template_data) for _, template_data in ranked]
+
+    def get_public_templates_page(self, category: Optional[str] = None, search: Optional[str] = None,
+                                  cursor: Optional[str] = None, limit: Optional[int] = None,
+                                  sort: str = SORT_POPULAR) -> Dict[str, Any]:
+        """Obter uma página de templates públicos (paginação por cursor)"""
+        if search and search.strip():
+            # Chave (relevância, id); o score é arredondado para o cursor sobreviver ao JSON
+            scored = self._get_search_index().search(search, category=category, with_scores=True)
+            page = paginate(scored, lambda item: (round(item[0], 6), item[1]['id']),
+                            cursor=cursor, limit=limit)
+            page['items'] = [self._to_saved_template(template_data) for _, template_data in page['items']]
+            return page
+
+        # Galeria padrão: leitura O(K) direto do ranking, o cursor é a chave do último item
+        limit = clamp_page_size(limit)
+        # O cursor carrega o modo de ordenação: um cursor de outro modo vira 400, não TypeError
+        after = key_from_cursor(sort, decode_cursor(cursor))
+        ranking = self._get_ranking()
+        ranked = ranking.top(category, limit=limit + 1, sort=sort, before=after)
         
-        # Ordenar por rating e número de usos
-        public_templates.sort(key=lambda t: (t.rating, t.usage_count), reverse=True)
-        return public_templates
-    
+        next_key = cursor_values(sort, ranked[limit - 1][0]) if len(ranked) > limit else None
+        # Dataclasses montadas apenas para os itens da página
+        items = [self._to_saved_template(template_data) for _, template_data in ranked[:limit]]
+        return build_page(items, next_key, limit, ranking.count(category))
+
+    def get_user_templates_page(self, user_id: str, cursor: Optional[str] = None,
+                                limit: Optional[int] = None) -> Dict[str, Any]:
+        """Obter uma página dos templates do usuário, mais recentes primeiro"""
+        user_records = (
+            template_data for template_data in self._load_templates_with_pending()
+            if template_data.get('user_id') == user_id or template_data.get('creator_id') == user_id
+        )
+        return paginate(user_records, self._recency_sort_key, cursor=cursor, limit=limit)
+
+    def get_all_templates_page(self, cursor: Optional[str] = None,
+                               limit: Optional[int] = None) -> Dict[str, Any]:
+        """Obter uma página de todos os templates (moderação)"""
+        return paginate(self._load_templates_with_pending(), self._recency_sort_key, cursor=cursor, limit=limit)
+
+    @staticmethod
+    def _recency_sort_key(record: Dict[str, Any]) -> tuple:
+        """Chave de ordenação por data de criação, desempatada pelo id"""
+        return (str(record.get('created_at') or ''), str(record.get('id', '')))
+
     def use_template(self, template_id: str, user_id: str) -> Optional[SavedPromptTemplate]:
         """Usar um template (incrementa contador de uso)"""
-        templates = self._load_templates()
+        template_data = self._get_search_index().get_template(template_id)
+        if template_data is None:
+            return None
         
-        for i, template_data in enumerate(templates):
-            if template_data['id'] == template_id:
-                template_data['usage_count'] += 1
-                templates[i] = template_data
-                self._save_templates(templates)
-                
-                # Atualizar estatísticas do usuário
-                self.update_member_usage_stats(user_id, 'total_prompts', 1)
-                
-                # Mapear campos corretamente antes de retornar
-                mapped_data = {
-                    'id': template_data['id'],
-                    'user_id': template_data.get('creator_id', template_data.get('user_id', '')),
-                    'name': template_data.get('title', template_data.get('name', '')),
-                    'description': template_data['description'],
-                    'category': template_data['category'],
-                    'template_content': {
-                        'context': template_data.get('context_template', ''),
-                        'task': '',
-                        'style': template_data.get('style', ''),
-                        'tone': template_data.get('tone', ''),
-                        'audience': '',
-                        'response': template_data.get('format', '')
-                    },
-                    'is_public': template_data.get('is_public', False),
-                    'created_at': datetime.fromisoformat(template_data['created_at']),
-                    'updated_at': datetime.fromisoformat(template_data['updated_at']),
-                    'usage_count': template_data.get('usage_count', 0),
-                    'tags': template_data.get('tags', []),
-                    'rating': template_data.get('rating', 0.0),
-                    'votes': template_data.get('votes', 0)
-                }
-                
-                return SavedPromptTemplate(**mapped_data)
+        # O incremento vai para o buffer; índice e ranking refletem o valor na hora
+        self._counter_buffer.add_usage(template_id)
+        usage_count = (template_data.get('usage_count', 0) or 0) + 1
+        self._update_indexed_stats(template_id, usage_count=usage_count)
+        if self._ranking is not None:
+            self._ranking.record_use(template_id, usage_count=usage_count)
         
-        return None
+        # Atualizar estatísticas do usuário
+        self.update_member_usage_stats(user_id, 'total_prompts', 1)
+        
+        return self._to_saved_template(template_data)
     
     def rate_template(self, template_id: str, user_id: str, rating: float) -> bool:
         """Avaliar template (rating de 1 a 5)"""
         if not 1 <= rating <= 5:
             return False
         
-        templates = self._load_templates()
-        
-        for i, template_data in enumerate(templates):
-            if template_data['id'] == template_id:
-                # Calcular nova média de rating
-                current_rating = template_data['rating']
-                current_votes = template_data['votes']
-                
-                new_votes = current_votes + 1
-                new_rating = ((current_rating * current_votes) + rating) / new_votes
-                
-                template_data['rating'] = round(new_rating, 2)
-                template_data['votes'] = new_votes
-                
-                templates[i] = template_data
-                self._save_templates(templates)
-                return True
+        template_data = self._get_search_index().get_template(template_id)
+        if template_data is None:
+            return False
         
-        return False
+        # Nova média calculada sobre a visão em memória; a gravação fica para o flush
+        self._counter_buffer.add_rating(template_id, rating)
+        updated = apply_deltas(dict(template_data), 0, rating, 1)
+        self._update_indexed_stats(template_id, rating=updated['rating'], votes=updated['votes'])
+        if self._ranking is not None:
+            self._ranking.record_rating(template_id, updated['rating'], votes=updated['votes'],
+                                        given_rating=rating)
+        return True
     
     def get_member_analytics(self, user_id: str) -> Optional[MemberAnalytics]:
         """Obter analytics do membro"""
@@ -512,10 +493,116 @@ class MemberAreaService:
         except (FileNotFoundError, json.JSONDecodeError):
             return []
     
+    def _load_templates_with_pending(self) -> List:
+        """Carregar templates com os contadores ainda não gravados aplicados"""
+        with self._templates_lock:
+            templates = self._load_templates()
+            pending = self._counter_buffer.snapshot()
+        if pending:
+            for template_data in templates:
+                deltas = pending.get(template_data.get('id'))
+                if deltas:
+                    apply_deltas(template_data, *deltas)
+        return templates
+    
+    def _flush_template_counters(self, batch: Dict[str, List[float]]):
+        """Gravar um lote de deltas de uso/avaliação com uma única leitura e escrita"""
+        with self._templates_lock:
+            templates = self._load_templates()
+            for template_data in templates:
+                deltas = batch.get(template_data.get('id'))
+                if deltas:
+                    apply_deltas(template_data, *deltas)
+            self._save_templates(templates)
+    
+    def flush_template_counters(self) -> int:
+        """Forçar gravação imediata dos contadores pendentes"""
+        return self._counter_buffer.flush()
+    
     def _save_templates(self, templates: List):
         """Salvar templates"""
+        # Se o arquivo mudou por fora desde a última leitura, índice e ranking estão desatualizados
+        self._check_templates_changed()
+        
         with open(self.templates_file, 'w') as f:
             json.dump(templates, f, indent=2, default=str)
+        
+        self._templates_mtime = self._get_templates_mtime()
+    
+    def _get_templates_mtime(self) -> Optional[float]:
+        """Data de modificação do arquivo de templates"""
+        try:
+            return os.path.getmtime(self.templates_file)
+        except OSError:
+            return None
+    
+    def _check_templates_changed(self):
+        """Descartar índice e ranking se o arquivo foi alterado externamente"""
+        current_mtime = self._get_templates_mtime()
+        if current_mtime != self._templates_mtime:
+            self._search_index = None
+            self._ranking = None
+            self._templates_mtime = current_mtime
+    
+    def _get_search_index(self) -> TemplateSearchIndex:
+        """Obter índice de busca, reconstruindo se o arquivo foi alterado externamente"""
+        with self._templates_lock:
+            self._check_templates_changed()
+            if self._search_index is None:
+                index = TemplateSearchIndex()
+                index.build(self._load_templates_with_pending())
+                self._search_index = index
+            return self._search_index
+    
+    def _get_ranking(self) -> TemplateRanking:
+        """Obter ranking dos templates públicos, reconstruindo se necessário"""
+        with self._templates_lock:
+            self._check_templates_changed()
+            if self._ranking is None:
+                ranking = TemplateRanking()
+                ranking.build(self._load_templates_with_pending())
+                self._ranking = ranking
+            return self._ranking
+    
+    def _index_template(self, template_data: Dict[str, Any]):
+        """Adicionar template ao índice de busca se ele já estiver carregado"""
+        if self._search_index is not None:
+            self._search_index.add_template(template_data)
+    
+    def _rank_template(self, template_data: Dict[str, Any]):
+        """Adicionar template ao ranking se ele já estiver carregado"""
+        if self._ranking is not None:
+            self._ranking.add_template(template_data)
+    
+    def _update_indexed_stats(self, template_id: str, **stats):
+        """Refletir avaliação/uso no índice de busca se ele já estiver carregado"""
+        if self._search_index is not None:
+            self._search_index.update_stats(template_id, **stats)
+    
+    def _to_saved_template(self, template_data: Dict[str, Any]) -> SavedPromptTemplate:
+        """Mapear registro bruto do arquivo para SavedPromptTemplate"""
+        return SavedPromptTemplate(
+            id=template_data['id'],
+            user_id=template_data.get('creator_id', template_data.get('user_id', '')),
+            name=template_data.get('title', template_data.get('name', '')),
+            description=template_data['description'],
+            category=template_data['category'],
+            template_content={
+                'context': template_data.get('context_template', ''),
+                'task': '',
+                'style': template_data.get('style', ''),
+                'tone': template_data.get('tone', ''),
+                'audience': '',
+                'response': template_data.get('format', '')
+            },
+            is_public=template_data.get('is_public', False),
+            created_at=datetime.fromisoformat(template_data['created_at']),
+            updated_at=datetime.fromisoformat(template_data['updated_at']),
+            usage_count=template_data.get('usage_count', 0),
+            tags=template_data.get('tags', []),
+            rating=template_data.get('rating', 0.0),
+            votes=template_data.get('votes', 0)
+        )
     
     def create_subscription(self, user_id: str, subscription_data: Dict[str, Any]) -> bool:
         """Criar nova assinatura"""
@@ -685,11 +772,17 @@ class MemberAreaService:
         except (FileNotFoundError, json.JSONDecodeError) as e:
             print(f"Erro ao carregar prompts salvos: {e}")
             return []
-    
+
+    def get_user_saved_prompts_page(self, user_id: str, cursor: Optional[str] = None,
+                                    limit: Optional[int] = None) -> Dict[str, Any]:
+        """Obter uma página dos prompts salvos do usuário, mais recentes primeiro"""
+        return paginate(self.get_user_saved_prompts(user_id), self._recency_sort_key,
+                        cursor=cursor, limit=limit)
+
     def get_user_templates(self, user_id: str) -> List[Dict]:
         """Obter templates do usuário"""
         try:
-            templates = self._load_templates()
+            templates = self._load_templates_with_pending()
             # Filtrar templates do usuário
             user_templates = [template for template in templates if template.get('user_id') == user_id]
             return user_templates
@@ -833,24 +926,35 @@ class MemberAreaService:
     def save_public_template(self, user_id: str, template_data: dict) -> bool:
         """Salvar template público"""
         try:
-            # Carregar templates existentes
-            templates_file = self.templates_file
-            
-            if os.path.exists(templates_file):
-                with open(templates_file, 'r', encoding='utf-8') as f:
-                    templates = json.load(f)
-            else:
-                templates = []
-            
-            # Adicionar novo template
-            templates.append(template_data)
-            
-            # Salvar
-            with open(templates_file, 'w', encoding='utf-8') as f:
-                json.dump(templates, f, indent=2, ensure_ascii=False)
-            
+            with self._templates_lock:
+                # Carregar templates existentes
+                templates_file = self.templates_file
+                
+                if os.path.exists(templates_file):
+                    with open(templates_file, 'r', encoding='utf-8') as f:
+                        templates = json.load(f)
+                else:
+                    templates = []
+                
+                # Adicionar novo template
+                templates.append(template_data)
+                
+                # Salvar
+                self._save_templates(templates)
+            self._index_template(template_data)
+            self._rank_template(template_data)
             return True
             
         except Exception as e:
             print(f"Erro ao salvar template público: {e}")
-            return False
\ No newline at end of file
+            return False
+
+# Instância global (lazy loading)
+_member_area_service: Optional[MemberAreaService] = None
+
+def get_member_area_service() -> MemberAreaService:
+    """Obter instância do serviço da área de membros com lazy loading"""
+    global _member_area_service
+    if _member_area_service is None:
+        _member_area_service = MemberAreaService()
+    return _member_area_service
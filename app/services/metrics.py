@@ -0,0 +1,327 @@
+"""
+Métricas no formato de texto do Prometheus (endpoint /metrics)
+Counter, Gauge e Histogram com labels. No caminho quente (inc/observe) só há
+aritmética sobre valores pré-alocados, sob um lock curto por série; séries
+com labels fixos podem ser resolvidas uma vez e reutilizadas.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.request_timing import record_span
+
+# Buckets de latência em segundos (de cache/arquivo local até chamadas lentas de IA)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Um contador por bucket + o bucket +Inf; acumulados só na renderização
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+class _Metric:
+    """Família de séries de uma métrica, indexadas pelos valores dos labels"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labelvalues):
+        """Série para os valores de labels informados (criada no primeiro uso)"""
+        if labelvalues:
+            values = tuple(str(labelvalues[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: esperados labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        return self.labels()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}_total{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in list(self._children.items())]
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabelled().dec(amount)
+
+    def set(self, value: float):
+        self._unlabelled().set(value)
+
+    def track_inprogress(self):
+        return self._unlabelled().track_inprogress()
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+                for values, child in list(self._children.items())]
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Conjunto de métricas expostas em /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+_registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Registro global de métricas"""
+    return _registry
+
+def timed(histogram_child: _HistogramChild, span_name: Optional[str] = None):
+    """
+    Decorator para medir a duração de uma função síncrona numa série de histograma;
+    com `span_name`, a duração também entra no Server-Timing da requisição atual
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                histogram_child.observe(elapsed)
+                if span_name:
+                    record_span(span_name, elapsed)
+        return wrapper
+    return decorator
+
+# Métricas da aplicação
+HTTP_REQUESTS_IN_FLIGHT = _registry.gauge(
+    "costar_http_requests_in_flight", "Requisições HTTP em andamento")
+HTTP_REQUEST_DURATION = _registry.histogram(
+    "costar_http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ("method", "route", "status"))
+PROVIDER_REQUESTS_IN_FLIGHT = _registry.gauge(
+    "costar_provider_requests_in_flight", "Chamadas a provedores de IA em andamento",
+    ("service", "provider"))
+PROVIDER_REQUEST_DURATION = _registry.histogram(
+    "costar_provider_request_duration_seconds", "Latência das chamadas a provedores de IA",
+    ("service", "provider", "outcome"))
+PROVIDER_TIMEOUTS = _registry.counter(
+    "costar_provider_timeouts", "Chamadas a provedores encerradas por timeout",
+    ("service", "provider"))
+PROVIDER_RATE_LIMITED = _registry.counter(
+    "costar_provider_rate_limited", "Recusas por limite (429 do provedor ou limitador local)",
+    ("service", "provider", "source"))
+AI_FALLBACKS = _registry.counter(
+    "costar_ai_fallbacks", "Respostas servidas pelo gerador de fallback",
+    ("service", "reason"))
+QUOTA_CHECK_DURATION = _registry.histogram(
+    "costar_quota_duration_seconds", "Latência das operações de quota anônima",
+    ("operation",))
+ANALYTICS_WRITE_DURATION = _registry.histogram(
+    "costar_analytics_write_duration_seconds", "Latência das gravações de analytics",
+    ("kind",))
+CACHE_REQUESTS = _registry.counter(
+    "costar_cache_requests", "Consultas a caches por resultado (hit/miss)",
+    ("cache", "result"))
+
+def provider_outcome(error: Optional[BaseException]) -> str:
+    """Classificar o resultado de uma chamada a provedor para o label `outcome`"""
+    if error is None:
+        return "success"
+    name = type(error).__name__
+    if name == "CancelledError":
+        return "cancelled"
+    if isinstance(error, TimeoutError) or "Timeout" in name:
+        return "timeout"
+    if name == "ProviderRateLimited":
+        return "rate_limited"
+    return "error"
+
+@contextmanager
+def track_provider_call(service: str, provider: str):
+    """Medir uma chamada a provedor: em andamento, latência por resultado, timeouts e 429"""
+    in_flight = PROVIDER_REQUESTS_IN_FLIGHT.labels(service, provider)
+    in_flight.inc()
+    started = time.perf_counter()
+    error: Optional[BaseException] = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        in_flight.dec()
+        elapsed = time.perf_counter() - started
+        outcome = provider_outcome(error)
+        PROVIDER_REQUEST_DURATION.labels(service, provider, outcome).observe(elapsed)
+        record_span(f"ai_{provider}", elapsed)
+        if outcome == "timeout":
+            PROVIDER_TIMEOUTS.labels(service, provider).inc()
+        elif outcome == "rate_limited":
+            PROVIDER_RATE_LIMITED.labels(service, provider, "local" if getattr(error, "local", False) else "remote").inc()
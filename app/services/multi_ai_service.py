@@ -12,6 +12,13 @@ from dataclasses import dataclass
 import logging
 from dotenv import load_dotenv
 
+from app.services.first_success import run_first_success
+from app.services.deadline import Deadline, DeadlineExceeded, MIN_ATTEMPT_SECONDS
+from app.services.provider_limits import (
+    ProviderLimiter, ProviderRateLimited, estimate_tokens, parse_retry_after, rate_limit_from_exception
+)
+from app.services.metrics import AI_FALLBACKS, PROVIDER_RATE_LIMITED, track_provider_call
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -34,12 +41,29 @@ class AIProvider:
     avg_response_time: float = 0.0
     success_count: int = 0
     error_count: int = 0
+    rpm: int = 0  # Limites do lado do cliente (0 = sem limite)
+    tpm: int = 0
+    max_concurrency: int = 0
 
 class MultiAIService:
     def __init__(self):
         self.providers: List[AIProvider] = []
         self.setup_providers()
         self.usage_stats = self.load_usage_stats()
+        self.limiters: Dict[str, ProviderLimiter] = {
+            provider.name: ProviderLimiter.from_config(provider.name, {
+                "rpm": provider.rpm,
+                "tpm": provider.tpm,
+                "max_concurrency": provider.max_concurrency
+            })
+            for provider in self.providers
+        }
+        
+        # Sondagem paralela do HuggingFace: último (estratégia, modelo) que respondeu vai primeiro
+        self.hf_preferred_candidate: Optional[tuple] = None
+        self.hf_max_concurrency = int(os.getenv("HF_PROBE_CONCURRENCY", "3"))
+        self.hf_overall_timeout = float(os.getenv("HF_PROBE_TIMEOUT", "25"))
+        self.hf_attempt_timeout = float(os.getenv("HF_ATTEMPT_TIMEOUT", "20"))
     
     async def initialize(self):
         """Inicializar o serviço Multi-IA"""
@@ -77,7 +101,10 @@ class MultiAIService:
                 api_key=gemini_key,
                 model="gemini-1.5-flash-latest",
                 daily_limit=50,  # Free tier
-                priority=2
+                priority=2,
+                rpm=15,
+                tpm=1000000,
+                max_concurrency=4
             ))
         
         # 2. Groq (Muito rápido)
@@ -89,7 +116,10 @@ class MultiAIService:
                 api_key=groq_key,
                 model="llama-3.1-8b-instant",  # Modelo ativo
                 daily_limit=6000,  # Por minuto na verdade
-                priority=1  # Mais alta prioridade
+                priority=1,  # Mais alta prioridade
+                rpm=30,
+                tpm=6000,
+                max_concurrency=4
             ))
         
         # 3. HuggingFace
@@ -101,7 +131,8 @@ class MultiAIService:
                 api_key=hf_key,
                 model="microsoft/DialoGPT-medium",
                 daily_limit=1000,
-                priority=3
+                priority=3,
+                max_concurrency=2  # Cada chamada já sonda vários modelos em paralelo
             ))
         
         # 4. Cohere
@@ -113,7 +144,9 @@ class MultiAIService:
                 api_key=cohere_key,
                 model="command-r-plus-08-2024",
                 daily_limit=1000,
-                priority=4
+                priority=4,
+                rpm=20,
+                max_concurrency=4
             ))
         
         # 5. Together AI
@@ -125,7 +158,9 @@ class MultiAIService:
                 api_key=together_key,
                 model="meta-llama/Llama-3.2-3B-Instruct-Turbo",  # Modelo serverless
                 daily_limit=500,
-                priority=5
+                priority=5,
+                rpm=60,
+                max_concurrency=4
             ))
         
         # Ordenar por prioridade
@@ -166,22 +201,47 @@ class MultiAIService:
         """Retorna lista com nomes dos provedores"""
         return [provider.name for provider in self.providers]
     
-    async def generate_content(self, prompt: str, temperatura: float = 0.7, max_tokens: int = 2048) -> str:
-        """Gerar conteúdo usando o melhor provedor disponível"""
-        
+    async def generate_content(self, prompt: str, temperatura: float = 0.7, max_tokens: int = 2048,
+                               deadline: Optional[Deadline] = None) -> str:
+        """Gerar conteúdo usando o melhor provedor disponível dentro do orçamento de tempo"""
+        deadline = Deadline.ensure(deadline)
         available_providers = self.get_available_providers()
         
         if not available_providers:
             logger.warning("Nenhum provedor disponível, usando fallback")
+            AI_FALLBACKS.labels("multi_ai", "no_providers").inc()
             return self.generate_fallback_content(prompt)
         
         last_error = None
+        fallback_reason = "all_failed"
         
-        for provider in available_providers:
+        for position, provider in enumerate(available_providers):
+            if not deadline.can_attempt():
+                logger.warning(f"Orçamento de tempo esgotado ({deadline}), pulando {provider.name} e seguintes")
+                fallback_reason = "deadline"
+                break
             try:
                 logger.info(f"Tentando gerar conteúdo com {provider.name}")
                 
-                result = await self._call_provider(provider, prompt, temperatura, max_tokens)
+                attempts_after = len(available_providers) - position - 1
+                limiter = self.limiters[provider.name]
+                max_wait = max(deadline.available() - MIN_ATTEMPT_SECONDS * (attempts_after + 1), 0.0)
+                blocked_for = limiter.blocked_for()
+                if blocked_for > 0 and blocked_for > max_wait:
+                    logger.info(f"{provider.name} bloqueado por Retry-After ({blocked_for:.1f}s), pulando")
+                    PROVIDER_RATE_LIMITED.labels("multi_ai", provider.name, "local").inc()
+                    continue
+                
+                estimated = estimate_tokens(prompt, max_tokens)
+                async with limiter.acquire(estimated, max_wait=max_wait):
+                    timeout = deadline.timeout_for(attempts_after=attempts_after)
+                    with track_provider_call("multi_ai", provider.name):
+                        result = await asyncio.wait_for(
+                            self._call_provider(provider, prompt, temperatura, max_tokens, timeout=timeout),
+                            timeout=timeout
+                        )
+                    # Sem contagem real de tokens aqui: devolver ao TPM a parte da saída não gerada
+                    limiter.record_usage(estimated, estimate_tokens(prompt) + len(result or "") // 4)
                 
                 if result:
                     provider.requests_made += 1
@@ -190,38 +250,63 @@ class MultiAIService:
                     logger.info(f"Conteúdo gerado com sucesso usando {provider.name}")
                     return result
                 
+            except DeadlineExceeded as e:
+                logger.warning(f"{provider.name} não iniciado: {e}")
+                fallback_reason = "deadline"
+                break
+            except ProviderRateLimited as e:
+                if e.local:
+                    PROVIDER_RATE_LIMITED.labels("multi_ai", provider.name, "local").inc()
+                else:
+                    # Bloqueio temporário pelo Retry-After em vez de desativar o provedor
+                    self.limiters[provider.name].note_retry_after(e.retry_after)
+                logger.warning(f"{provider.name} limitado, seguindo para o próximo: {e}")
+                continue
+            except asyncio.TimeoutError:
+                last_error = TimeoutError(f"{provider.name} excedeu o tempo da tentativa")
+                provider.error_count += 1
+                logger.error(f"Timeout com {provider.name}")
+                continue
             except Exception as e:
                 last_error = e
                 provider.error_count += 1
                 logger.error(f"Erro com {provider.name}: {e}")
-                
-                # Marcar como indisponível se erro de quota
-                if "quota" in str(e).lower() or "limit" in str(e).lower():
-                    provider.is_active = False
-                    logger.warning(f"{provider.name} marcado como indisponível (quota)")
-                
                 continue
         
         # Todos os provedores falharam
         logger.error("Todos os provedores falharam, usando fallback avançado")
+        AI_FALLBACKS.labels("multi_ai", fallback_reason).inc()
         return self.generate_fallback_content(prompt)
     
-    async def _call_provider(self, provider: AIProvider, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_provider(self, provider: AIProvider, prompt: str, temperatura: float, max_tokens: int,
+                             timeout: float = 30.0) -> str:
         """Chamar um provedor específico com base no nome"""
+        try:
+            return await self._dispatch_provider(provider, prompt, temperatura, max_tokens, timeout)
+        except Exception as e:
+            # Erros de limite (429) viram ProviderRateLimited, independente do SDK
+            rate_limited = rate_limit_from_exception(provider.name, e)
+            if rate_limited is not None and rate_limited is not e:
+                raise rate_limited from e
+            raise
+    
+    async def _dispatch_provider(self, provider: AIProvider, prompt: str, temperatura: float,
+                                 max_tokens: int, timeout: float) -> str:
+        """Encaminhar a chamada para a implementação do provedor"""
         if provider.name == "gemini":
-            return await self._call_gemini(prompt, temperatura, max_tokens)
+            return await self._call_gemini(prompt, temperatura, max_tokens, timeout=timeout)
         elif provider.name == "groq":
-            return await self._call_groq(prompt, temperatura, max_tokens)
+            return await self._call_groq(prompt, temperatura, max_tokens, timeout=timeout)
         elif provider.name == "huggingface":
-            return await self._call_huggingface(prompt, temperatura, max_tokens)
+            return await self._call_huggingface(prompt, temperatura, max_tokens, timeout=timeout)
         elif provider.name == "cohere":
-            return await self._call_cohere(prompt, temperatura, max_tokens)
+            return await self._call_cohere(prompt, temperatura, max_tokens, timeout=timeout)
         elif provider.name == "together":
-            return await self._call_together(prompt, temperatura, max_tokens)
+            return await self._call_together(prompt, temperatura, max_tokens, timeout=timeout)
         else:
             raise ValueError(f"Provedor desconhecido: {provider.name}")
     
-    async def _call_gemini(self, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_gemini(self, prompt: str, temperatura: float, max_tokens: int, timeout: float = 30.0) -> str:
         """Chamar API do Gemini"""
         try:
             import google.generativeai as genai
@@ -234,7 +319,8 @@ class MultiAIService:
                 generation_config=genai.types.GenerationConfig(
                     temperature=temperatura,
                     max_output_tokens=max_tokens,
-                )
+                ),
+                request_options={"timeout": timeout}
             )
             
             return response.text
@@ -242,12 +328,12 @@ class MultiAIService:
         except Exception as e:
             raise Exception(f"Gemini API error: {e}")
     
-    async def _call_groq(self, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_groq(self, prompt: str, temperatura: float, max_tokens: int, timeout: float = 30.0) -> str:
         """Chamar API do Groq"""
         try:
             from groq import AsyncGroq
             
-            client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+            client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), timeout=timeout, max_retries=0)
             
             response = await client.chat.completions.create(
                 messages=[{"role": "user", "content": prompt}],
@@ -261,7 +347,8 @@ class MultiAIService:
         except Exception as e:
             raise Exception(f"Groq API error: {e}")
     
-    async def _call_huggingface(self, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_huggingface(self, prompt: str, temperatura: float, max_tokens: int,
+                                timeout: Optional[float] = None) -> str:
         """Chamar API do HuggingFace usando múltiplas estratégias avançadas"""
         try:
             # 1. MODELOS MODERNOS - Tentar primeiro os mais novos
@@ -293,16 +380,49 @@ class MultiAIService:
                 ("Spaces API", ["microsoft/DialoGPT-medium"], self._call_hf_spaces_api)
             ]
             
-            for strategy_name, models, api_method in all_strategies:
-                for model in models:
+            candidates = [
+                (strategy_name, model, api_method)
+                for strategy_name, models, api_method in all_strategies
+                for model in models
+            ]
+            # Memória do último sucesso: tentar primeiro quem respondeu da última vez
+            if self.hf_preferred_candidate:
+                candidates.sort(key=lambda c: (c[0], c[1]) != self.hf_preferred_candidate)
+            
+            # O prazo da sondagem respeita o orçamento da requisição e deixa margem para o fallback
+            overall_timeout = self.hf_overall_timeout
+            if timeout is not None:
+                overall_timeout = max(0.5, min(overall_timeout, timeout - 0.5))
+            attempt_timeout = min(self.hf_attempt_timeout, overall_timeout)
+            
+            async with httpx.AsyncClient(timeout=httpx.Timeout(attempt_timeout, connect=5.0)) as client:
+                async def attempt(candidate):
+                    strategy_name, model, api_method = candidate
                     try:
-                        result = await api_method(model, prompt, temperatura, max_tokens)
-                        if result and len(result.strip()) > 5:  # Resposta válida
-                            logger.info(f"HuggingFace: Sucesso com {strategy_name} - {model}")
-                            return result.strip()
+                        result = await api_method(model, prompt, temperatura, max_tokens, client=client)
                     except Exception as e:
                         logger.debug(f"HuggingFace: {strategy_name} - {model} falhou: {str(e)[:50]}")
-                        continue
+                        raise
+                    return result.strip() if result else ""
+                
+                outcome = await run_first_success(
+                    candidates,
+                    attempt,
+                    max_concurrency=self.hf_max_concurrency,
+                    overall_timeout=overall_timeout,
+                    accept=lambda result: len(result) > 5  # Resposta válida
+                )
+            
+            if outcome.succeeded:
+                strategy_name, model, _ = outcome.candidate
+                self.hf_preferred_candidate = (strategy_name, model)
+                logger.info(f"HuggingFace: Sucesso com {strategy_name} - {model} "
+                            f"({outcome.attempts} tentativas, {outcome.elapsed:.1f}s)")
+                return outcome.value
+            
+            self.hf_preferred_candidate = None
+            logger.warning(f"HuggingFace: nenhuma estratégia respondeu "
+                           f"({outcome.attempts} tentativas, prazo esgotado: {outcome.timed_out})")
             
             # 4. FALLBACK INTELIGENTE - Se todas as APIs falharam
             return await self._generate_smart_fallback(prompt)
@@ -310,79 +430,78 @@ class MultiAIService:
         except Exception as e:
             raise Exception(f"HuggingFace API error: {e}")
     
-    async def _call_hf_inference_api(self, model: str, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_hf_inference_api(self, model: str, prompt: str, temperatura: float, max_tokens: int,
+                                     client: httpx.AsyncClient) -> str:
         """Chamar Inference API padrão do HuggingFace"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://api-inference.huggingface.co/models/{model}",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "inputs": prompt,
-                    "parameters": {
-                        "max_new_tokens": min(max_tokens, 200),
-                        "temperature": temperatura,
-                        "do_sample": True,
-                        "return_full_text": False,
-                        "repetition_penalty": 1.1,
-                        "top_p": 0.9
-                    },
-                    "options": {
-                        "wait_for_model": True,
-                        "use_cache": False  # Para respostas mais variadas
-                    }
+        response = await client.post(
+            f"https://api-inference.huggingface.co/models/{model}",
+            headers={
+                "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "inputs": prompt,
+                "parameters": {
+                    "max_new_tokens": min(max_tokens, 200),
+                    "temperature": temperatura,
+                    "do_sample": True,
+                    "return_full_text": False,
+                    "repetition_penalty": 1.1,
+                    "top_p": 0.9
                 },
-                timeout=90.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, list) and len(data) > 0:
-                    return data[0].get('generated_text', '')
-                elif isinstance(data, dict) and 'generated_text' in data:
-                    return data['generated_text']
-            elif response.status_code == 503:
-                raise Exception("Model loading")
-            else:
-                raise Exception(f"HTTP {response.status_code}")
-            
-            return ""
+                "options": {
+                    "wait_for_model": True,
+                    "use_cache": False  # Para respostas mais variadas
+                }
+            }
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if isinstance(data, list) and len(data) > 0:
+                return data[0].get('generated_text', '')
+            elif isinstance(data, dict) and 'generated_text' in data:
+                return data['generated_text']
+        elif response.status_code == 503:
+            raise Exception("Model loading")
+        else:
+            raise Exception(f"HTTP {response.status_code}")
+        
+        return ""
     
-    async def _call_hf_text_generation_api(self, model: str, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_hf_text_generation_api(self, model: str, prompt: str, temperatura: float, max_tokens: int,
+                                           client: httpx.AsyncClient) -> str:
         """Chamar Text Generation Inference API (nova API)"""
-        async with httpx.AsyncClient() as client:
-            # Endpoint para Text Generation API
-            response = await client.post(
-                f"https://api-inference.huggingface.co/models/{model}/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": min(max_tokens, 200),
-                    "temperature": temperatura,
-                    "top_p": 0.95,
-                    "stream": False
-                },
-                timeout=60.0
-            )
+        # Endpoint para Text Generation API
+        response = await client.post(
+            f"https://api-inference.huggingface.co/models/{model}/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": min(max_tokens, 200),
+                "temperature": temperatura,
+                "top_p": 0.95,
+                "stream": False
+            }
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            if "choices" in data and len(data["choices"]) > 0:
+                return data["choices"][0]["message"]["content"]
+        elif response.status_code == 503:
+            raise Exception("Model loading")
+        else:
+            raise Exception(f"HTTP {response.status_code}")
             
-            if response.status_code == 200:
-                data = response.json()
-                if "choices" in data and len(data["choices"]) > 0:
-                    return data["choices"][0]["message"]["content"]
-            elif response.status_code == 503:
-                raise Exception("Model loading")
-            else:
-                raise Exception(f"HTTP {response.status_code}")
-                
-            return ""
+        return ""
     
-    async def _call_hf_spaces_api(self, model: str, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_hf_spaces_api(self, model: str, prompt: str, temperatura: float, max_tokens: int,
+                                  client: httpx.AsyncClient) -> str:
         """Tentar usar HuggingFace Spaces API como alternativa"""
         # Espacos populares que podem ter o modelo
         spaces_endpoints = [
@@ -390,40 +509,38 @@ class MultiAIService:
             f"https://huggingface.co/spaces/microsoft/DialoGPT-medium/api/predict"
         ]
         
-        async with httpx.AsyncClient() as client:
-            for endpoint in spaces_endpoints:
-                try:
-                    response = await client.post(
-                        endpoint,
-                        headers={
-                            "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
-                            "Content-Type": "application/json",
-                        },
-                        json={
-                            "inputs": prompt,
-                            "parameters": {
-                                "temperature": temperatura,
-                                "max_length": min(max_tokens, 150)
-                            }
-                        },
-                        timeout=45.0
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        # Tentar extrair resposta de diferentes formatos
-                        if isinstance(data, dict):
-                            if "generated_text" in data:
-                                return data["generated_text"]
-                            elif "output" in data:
-                                return data["output"]
-                            elif "response" in data:
-                                return data["response"]
-                        elif isinstance(data, list) and len(data) > 0:
-                            return str(data[0])
-                except Exception:
-                    continue
-                    
+        for endpoint in spaces_endpoints:
+            try:
+                response = await client.post(
+                    endpoint,
+                    headers={
+                        "Authorization": f"Bearer {os.getenv('HUGGINGFACE_API_KEY')}",
+                        "Content-Type": "application/json",
+                    },
+                    json={
+                        "inputs": prompt,
+                        "parameters": {
+                            "temperature": temperatura,
+                            "max_length": min(max_tokens, 150)
+                        }
+                    }
+                )
+                
+                if response.status_code == 200:
+                    data = response.json()
+                    # Tentar extrair resposta de diferentes formatos
+                    if isinstance(data, dict):
+                        if "generated_text" in data:
+                            return data["generated_text"]
+                        elif "output" in data:
+                            return data["output"]
+                        elif "response" in data:
+                            return data["response"]
+                    elif isinstance(data, list) and len(data) > 0:
+                        return str(data[0])
+            except Exception:
+                continue
+                
         return ""
     
     async def _generate_smart_fallback(self, prompt: str) -> str:
@@ -479,7 +596,7 @@ class MultiAIService:
 *[Resposta contextual gerada por sistema avançado de fallback HuggingFace]*
 """
     
-    async def _call_cohere(self, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_cohere(self, prompt: str, temperatura: float, max_tokens: int, timeout: float = 30.0) -> str:
         """Chamar API do Cohere usando Chat API"""
         try:
             async with httpx.AsyncClient() as client:
@@ -495,9 +612,11 @@ class MultiAIService:
                         "temperature": temperatura,
                         "max_tokens": max_tokens,
                     },
-                    timeout=30.0
+                    timeout=timeout
                 )
                 
+                if response.status_code == 429:
+                    raise ProviderRateLimited("cohere", parse_retry_after(response.headers))
                 if response.status_code == 200:
                     data = response.json()
                     return data["text"]
@@ -507,7 +626,7 @@ class MultiAIService:
         except Exception as e:
             raise Exception(f"Cohere API error: {e}")
     
-    async def _call_together(self, prompt: str, temperatura: float, max_tokens: int) -> str:
+    async def _call_together(self, prompt: str, temperatura: float, max_tokens: int, timeout: float = 30.0) -> str:
         """Chamar API do Together AI"""
         try:
             async with httpx.AsyncClient() as client:
@@ -523,9 +642,11 @@ class MultiAIService:
                         "temperature": temperatura,
                         "max_tokens": max_tokens,
                     },
-                    timeout=30.0
+                    timeout=timeout
                 )
                 
+                if response.status_code == 429:
+                    raise ProviderRateLimited("together", parse_retry_after(response.headers))
                 if response.status_code == 200:
                     data = response.json()
                     return data["choices"][0]["message"]["content"]
@@ -613,7 +734,8 @@ Por favor, crie um prompt detalhado e efetivo seguindo esses parâmetros COSTAR.
                     "is_active": p.is_active,
                     "requests_used": f"{p.requests_made}/{p.daily_limit}",
                     "success_rate": f"{(p.success_count / (p.success_count + p.error_count) * 100) if (p.success_count + p.error_count) > 0 else 100:.1f}%",
-                    "priority": p.priority
+                    "priority": p.priority,
+                    "limits": self.limiters[p.name].get_status() if p.name in self.limiters else None
                 }
                 for p in self.providers
             ],
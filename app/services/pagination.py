@@ -0,0 +1,107 @@
+"""
+Paginação por cursor (keyset) para listagens de templates e prompts
+O cursor é a chave de ordenação do último item da página, codificada em base64
+"""
+import base64
+import heapq
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginação malformado ou adulterado"""
+
+def clamp_page_size(limit: Optional[int]) -> int:
+    """Limitar o tamanho da página ao intervalo permitido"""
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(sort_key: Sequence[Any]) -> str:
+    """Codificar a chave de ordenação em um cursor opaco"""
+    raw = json.dumps(list(sort_key), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, ...]]:
+    """Decodificar cursor; None significa primeira página"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {e}")
+    if not isinstance(values, list):
+        raise InvalidCursorError("Cursor inválido")
+    return tuple(values)
+
+def build_page(items: List[Any], next_key: Optional[Sequence[Any]], limit: int,
+               total: Optional[int], total_is_estimate: bool = False) -> Dict[str, Any]:
+    """Montar resposta padrão de uma página"""
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(next_key) if next_key is not None else None,
+        "has_more": next_key is not None,
+        "limit": limit,
+        "total": total,
+        "total_is_estimate": total_is_estimate
+    }
+
+def paginate(records: Iterable[Any], sort_key: Callable[[Any], Tuple[Any, ...]],
+             cursor: Optional[str] = None, limit: Optional[int] = None,
+             descending: bool = True) -> Dict[str, Any]:
+    """
+    Paginar registros em memória por keyset
+
+    A chave de ordenação deve ser única (inclua o id como último elemento) para
+    que a ordem seja estável entre páginas. Apenas os itens da página são
+    ordenados, o restante é descartado em O(n log k).
+    """
+    limit = clamp_page_size(limit)
+    after = decode_cursor(cursor)
+
+    total = 0
+    candidates = []
+    for record in records:
+        total += 1
+        key = sort_key(record)
+        if after is not None:
+            try:
+                if (key >= after) if descending else (key <= after):
+                    continue
+            except TypeError:
+                raise InvalidCursorError("Cursor incompatível com esta listagem")
+        candidates.append((key, record))
+
+    select = heapq.nlargest if descending else heapq.nsmallest
+    window = select(limit + 1, candidates, key=lambda pair: pair[0])
+
+    has_more = len(window) > limit
+    page = window[:limit]
+    next_key = page[-1][0] if has_more and page else None
+    return build_page([record for _, record in page], next_key, limit, total)
+
+def keyset_filter(time_field: str, after: Sequence[Any]) -> str:
+    """
+    Filtro PostgREST de keyset decrescente em (time_field, id) para `query.or_()`
+    Os valores do cursor são validados (data ISO e id UUID/inteiro) e vão entre aspas
+    """
+    if len(after) != 2:
+        raise InvalidCursorError("Cursor incompatível com esta listagem")
+    time_value, id_value = after
+    try:
+        moment = datetime.fromisoformat(str(time_value)).isoformat()
+    except ValueError:
+        raise InvalidCursorError("Cursor inválido: data malformada")
+    if (isinstance(id_value, int) and not isinstance(id_value, bool)) or str(id_value).isdigit():
+        row_id = str(int(id_value))
+    else:
+        try:
+            row_id = str(uuid.UUID(str(id_value)))
+        except ValueError:
+            raise InvalidCursorError("Cursor inválido: id malformado")
+    return f'{time_field}.lt."{moment}",and({time_field}.eq."{moment}",id.lt."{row_id}")'
@@ -6,10 +6,18 @@ import os
 import json
 import httpx
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
 from datetime import datetime
 import logging
 
+from app.services.deadline import Deadline, DeadlineExceeded, MIN_ATTEMPT_SECONDS
+from app.services.provider_limits import (
+    ProviderLimiter, ProviderRateLimited, estimate_tokens, parse_retry_after
+)
+from app.services.metrics import AI_FALLBACKS, PROVIDER_RATE_LIMITED, track_provider_call
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,50 +28,159 @@ class ProductionMultiAIService:
     def __init__(self):
         self.providers = self._load_providers()
         self.current_provider = "groq"  # Provider principal
+        self.limiters = {
+            name: ProviderLimiter.from_config(name, config)
+            for name, config in self.providers.items()
+        }
+        self.max_rate_limit_retries = int(os.getenv("AI_RATE_LIMIT_RETRIES", "1"))
+        # Cliente HTTP compartilhado: mantém conexões (DNS/TLS já resolvidos) entre chamadas
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
         logger.info(f"🚀 ProductionMultiAIService inicializado com {len(self.providers)} provedores")
         
     def _load_providers(self) -> Dict[str, Dict[str, Any]]:
         """Carrega provedores disponíveis"""
         providers = {}
+        # Com AI_MOCK_BASE_URL (tools/mock_llm_server.py) todos os provedores apontam para o mock
+        mock_key = "mock-key" if os.getenv("AI_MOCK_BASE_URL") else None
         
         # GROQ (Principal - Mais confiável)
-        groq_key = os.getenv("GROQ_API_KEY")
+        groq_key = os.getenv("GROQ_API_KEY") or mock_key
         if groq_key:
             providers["groq"] = {
                 "name": "Groq",
                 "api_key": groq_key,
-                "endpoint": "https://api.groq.com/openai/v1/chat/completions",
+                "endpoint": self._provider_endpoint("groq", "https://api.groq.com/openai/v1/chat/completions",
+                                                    "/openai/v1/chat/completions"),
                 "model": "llama-3.1-8b-instant",  # Modelo atual válido
-                "priority": 1
+                "priority": 1,
+                "rpm": 30,  # Limites do plano gratuito (override: GROQ_RPM, GROQ_TPM, GROQ_MAX_CONCURRENCY)
+                "tpm": 6000,
+                "max_concurrency": 4,
+                "timeout": 20.0  # Limite por tentativa; o orçamento da requisição pode reduzir
             }
             
         # GEMINI (Backup)
-        gemini_key = os.getenv("GEMINI_API_KEY")
+        gemini_key = os.getenv("GEMINI_API_KEY") or mock_key
         if gemini_key:
             providers["gemini"] = {
                 "name": "Gemini",
                 "api_key": gemini_key,
-                "endpoint": "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent",  # Endpoint atualizado
+                "endpoint": self._provider_endpoint(
+                    "gemini",
+                    "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent",  # Endpoint atualizado
+                    "/v1beta/models/gemini-1.5-flash:generateContent"
+                ),
                 "model": "gemini-1.5-flash",  # Modelo atual válido
-                "priority": 2
+                "priority": 2,
+                "rpm": 15,
+                "tpm": 1000000,
+                "max_concurrency": 4,
+                "timeout": 20.0  # Limite por tentativa; o orçamento da requisição pode reduzir
             }
             
         # TOGETHER (Backup 2)
-        together_key = os.getenv("TOGETHER_API_KEY")
+        together_key = os.getenv("TOGETHER_API_KEY") or mock_key
         if together_key:
             providers["together"] = {
                 "name": "Together",
                 "api_key": together_key,
-                "endpoint": "https://api.together.xyz/v1/chat/completions",
+                "endpoint": self._provider_endpoint("together", "https://api.together.xyz/v1/chat/completions",
+                                                    "/v1/chat/completions"),
                 "model": "meta-llama/Llama-3.2-3B-Instruct-Turbo",  # Modelo atual válido
-                "priority": 3
+                "priority": 3,
+                "rpm": 60,
+                "tpm": 0,  # Sem limite de tokens conhecido
+                "max_concurrency": 4,
+                "timeout": 20.0  # Limite por tentativa; o orçamento da requisição pode reduzir
             }
             
         logger.info(f"🤖 Provedores carregados: {list(providers.keys())}")
         return providers
     
-    async def generate_content(self, prompt: str, **kwargs) -> Dict[str, Any]:
-        """Gera conteúdo usando o melhor provedor disponível"""
+    @staticmethod
+    def _provider_endpoint(name: str, default: str, mock_path: str) -> str:
+        """Endpoint do provedor: <NAME>_ENDPOINT, depois AI_MOCK_BASE_URL + caminho, depois o oficial"""
+        override = os.getenv(f"{name.upper()}_ENDPOINT")
+        if override:
+            return override
+        mock_base = os.getenv("AI_MOCK_BASE_URL")
+        if mock_base:
+            logger.info(f"🧪 {name} apontando para servidor mock em {mock_base}")
+            return mock_base.rstrip("/") + mock_path
+        return default
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cliente com pool de conexões, recriado se o event loop mudou (ex.: scripts com asyncio.run)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(20.0, connect=5.0),
+                limits=httpx.Limits(max_connections=int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20")),
+                                    max_keepalive_connections=int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10")))
+            )
+            self._client_loop = loop
+        return self._client
+
+    @asynccontextmanager
+    async def _pooled_client(self):
+        """Entregar o cliente compartilhado sem fechá-lo ao final do bloco"""
+        yield self._get_client()
+
+    async def aclose(self):
+        """Fechar o pool de conexões (encerramento do worker)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    @staticmethod
+    def _health_url(name: str, provider: Dict[str, Any]) -> str:
+        """Endpoint barato para validar credenciais: lista de modelos / metadados do modelo"""
+        if name == "gemini":
+            return provider["endpoint"].rsplit(":generateContent", 1)[0]
+        return provider["endpoint"].rsplit("/chat/completions", 1)[0] + "/models"
+
+    async def check_provider(self, name: str, timeout: float = 5.0) -> Dict[str, Any]:
+        """Abrir conexão com o provedor e validar a chave, sem gerar conteúdo"""
+        provider = self.providers[name]
+        url = self._health_url(name, provider)
+        headers, params = {}, {}
+        if name == "gemini":
+            params["key"] = provider["api_key"]
+        else:
+            headers["Authorization"] = f"Bearer {provider['api_key']}"
+
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"provider": name, "checked_at": datetime.now().isoformat()}
+        try:
+            response = await self._get_client().get(url, headers=headers, params=params,
+                                                    timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)))
+            result["http_status"] = response.status_code
+            if response.status_code < 300:
+                result["status"] = "ok"
+            elif response.status_code in (401, 403):
+                result["status"] = "invalid_credentials"
+            elif response.status_code == 429:
+                result["status"] = "rate_limited"
+            else:
+                # Conexão aberta, mas o endpoint de verificação não confirmou a chave
+                result["status"] = "reachable"
+        except Exception as e:
+            result["status"] = "unreachable"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    async def warm_up(self, timeout: float = 5.0) -> Dict[str, Dict[str, Any]]:
+        """Verificar todos os provedores em paralelo (aquece o pool de conexões)"""
+        names = list(self.providers)
+        results = await asyncio.gather(*(self.check_provider(name, timeout) for name in names))
+        return dict(zip(names, results))
+
+    async def generate_content(self, prompt: str, deadline: Optional[Deadline] = None, **kwargs) -> Dict[str, Any]:
+        """Gera conteúdo usando o melhor provedor disponível dentro do orçamento de tempo"""
+        deadline = Deadline.ensure(deadline)
         
         logger.info(f"🎯 [PROD_AI] Iniciando geração de conteúdo")
         logger.info(f"📋 [PROD_AI] Provedores disponíveis: {len(self.providers)}")
@@ -71,22 +188,39 @@ class ProductionMultiAIService:
         
         if not self.providers:
             logger.warning("⚠️ [PROD_AI] Nenhum provedor disponível, usando fallback")
+            AI_FALLBACKS.labels("production", "no_providers").inc()
             return self._fallback_response(prompt)
             
         # Tentar provedores em ordem de prioridade
-        for provider_name in sorted(self.providers.keys(), 
-                                   key=lambda x: self.providers[x]["priority"]):
+        ordered = sorted(self.providers.keys(), key=lambda x: self.providers[x]["priority"])
+        fallback_reason = "all_failed"
+        for position, provider_name in enumerate(ordered):
+            if not deadline.can_attempt():
+                logger.warning(f"⏰ [PROD_AI] Orçamento esgotado ({deadline}), pulando {provider_name} e seguintes")
+                fallback_reason = "deadline"
+                break
             try:
                 logger.info(f"🚀 [PROD_AI] Tentando provedor: {provider_name}")
                 logger.info(f"🔑 [PROD_AI] API Key presente: {'✅' if self.providers[provider_name]['api_key'] else '❌'}")
                 
-                result = await self._try_provider(provider_name, prompt, **kwargs)
+                result = await self._attempt_provider(
+                    provider_name, prompt, deadline,
+                    attempts_after=len(ordered) - position - 1,
+                    **kwargs
+                )
                 if result:
                     logger.info(f"✅ [PROD_AI] SUCESSO com {provider_name}")
                     logger.info(f"📏 [PROD_AI] Tamanho da resposta: {len(result.get('content', ''))} chars")
                     return result
                 else:
                     logger.warning(f"⚠️ [PROD_AI] {provider_name} retornou resultado vazio")
+            except DeadlineExceeded as e:
+                logger.warning(f"⏰ [PROD_AI] {provider_name} não iniciado: {e}")
+                fallback_reason = "deadline"
+                break
+            except ProviderRateLimited as e:
+                logger.warning(f"🚦 [PROD_AI] {provider_name} limitado, seguindo para o próximo: {e}")
+                continue
             except Exception as e:
                 logger.error(f"❌ [PROD_AI] {provider_name} FALHOU: {str(e)}")
                 logger.error(f"🔧 [PROD_AI] Tipo do erro: {type(e).__name__}")
@@ -94,23 +228,64 @@ class ProductionMultiAIService:
         
         # Se todos falharam, usar fallback
         logger.warning("⚠️ [PROD_AI] TODOS os provedores falharam, usando fallback")
+        AI_FALLBACKS.labels("production", fallback_reason).inc()
         return self._fallback_response(prompt)
         return self._fallback_response(prompt)
     
-    async def _try_provider(self, provider_name: str, prompt: str, **kwargs) -> Optional[Dict[str, Any]]:
+    async def _attempt_provider(self, provider_name: str, prompt: str, deadline: Deadline,
+                                attempts_after: int = 0, **kwargs) -> Optional[Dict[str, Any]]:
+        """Chamar um provedor dentro dos seus limites (RPM/TPM/concorrência), honrando Retry-After"""
+        limiter = self.limiters[provider_name]
+        cap = self.providers[provider_name].get("timeout")
+        estimated = estimate_tokens(prompt, kwargs.get("max_tokens", 1000))
+        # Tempo mínimo que precisa sobrar para a chamada em si e para os provedores seguintes
+        reserved = MIN_ATTEMPT_SECONDS * (attempts_after + 1)
+        
+        retries = 0
+        while True:
+            # Orçamento negativo vira 0: só um bloqueio real por Retry-After faz pular o provedor
+            max_wait = max(deadline.available() - reserved, 0.0)
+            blocked_for = limiter.blocked_for()
+            if blocked_for > 0 and blocked_for > max_wait:
+                PROVIDER_RATE_LIMITED.labels("production", provider_name, "local").inc()
+                raise ProviderRateLimited(provider_name, blocked_for,
+                                          f"{provider_name}: bloqueado por Retry-After", local=True)
+            try:
+                async with limiter.acquire(estimated, max_wait=max_wait):
+                    # O timeout é calculado depois da espera pelos limites
+                    timeout = deadline.timeout_for(cap=cap, attempts_after=attempts_after)
+                    logger.info(f"⏱️ [PROD_AI] Timeout da tentativa: {timeout:.1f}s ({deadline})")
+                    with track_provider_call("production", provider_name):
+                        result = await self._try_provider(provider_name, prompt, timeout=timeout, **kwargs)
+                    if result:
+                        limiter.record_usage(estimated, result.get("tokens_used"))
+                    return result
+            except ProviderRateLimited as e:
+                if e.local:
+                    PROVIDER_RATE_LIMITED.labels("production", provider_name, "local").inc()
+                    raise
+                limiter.note_retry_after(e.retry_after)
+                can_wait = limiter.blocked_for() <= max(deadline.available() - reserved, 0.0)
+                if retries >= self.max_rate_limit_retries or not can_wait:
+                    raise
+                retries += 1
+                logger.warning(f"🚦 [PROD_AI] {provider_name} respondeu 429, nova tentativa em {limiter.blocked_for():.1f}s")
+    
+    async def _try_provider(self, provider_name: str, prompt: str, timeout: float = 60.0,
+                            **kwargs) -> Optional[Dict[str, Any]]:
         """Tenta usar um provedor específico"""
         provider = self.providers[provider_name]
         
         if provider_name == "groq":
-            return await self._call_groq(provider, prompt, **kwargs)
+            return await self._call_groq(provider, prompt, timeout=timeout, **kwargs)
         elif provider_name == "gemini":
-            return await self._call_gemini(provider, prompt, **kwargs)
+            return await self._call_gemini(provider, prompt, timeout=timeout, **kwargs)
         elif provider_name == "together":
-            return await self._call_together(provider, prompt, **kwargs)
+            return await self._call_together(provider, prompt, timeout=timeout, **kwargs)
             
         return None
     
-    async def _call_groq(self, provider: Dict, prompt: str, **kwargs) -> Dict[str, Any]:
+    async def _call_groq(self, provider: Dict, prompt: str, timeout: float = 60.0, **kwargs) -> Dict[str, Any]:
         """Chama API do Groq"""
         try:
             logger.info(f"🌐 [GROQ] Iniciando chamada para Groq API")
@@ -131,12 +306,16 @@ class ProductionMultiAIService:
             
             logger.info(f"📊 [GROQ] Payload: model={data['model']}, max_tokens={data['max_tokens']}, temp={data['temperature']}")
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with self._pooled_client() as client:
                 logger.info(f"📡 [GROQ] Enviando requisição...")
-                response = await client.post(provider["endpoint"], headers=headers, json=data)
+                response = await client.post(provider["endpoint"], headers=headers, json=data,
+                                             timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)))
                 
                 logger.info(f"📨 [GROQ] Status Code: {response.status_code}")
                 
+                if response.status_code == 429:
+                    raise ProviderRateLimited("groq", parse_retry_after(response.headers))
+                
                 if response.status_code != 200:
                     logger.error(f"❌ [GROQ] API erro {response.status_code}: {response.text}")
                     raise Exception(f"HTTP {response.status_code}")
@@ -157,7 +336,8 @@ class ProductionMultiAIService:
                     "content": content,
                     "provider": "groq",
                     "model": provider["model"],
-                    "success": True
+                    "success": True,
+                    "tokens_used": (result.get("usage") or {}).get("total_tokens")
                 }
                 
         except Exception as e:
@@ -165,7 +345,7 @@ class ProductionMultiAIService:
             logger.error(f"🔧 [GROQ] Tipo do erro: {type(e).__name__}")
             raise
     
-    async def _call_gemini(self, provider: Dict, prompt: str, **kwargs) -> Dict[str, Any]:
+    async def _call_gemini(self, provider: Dict, prompt: str, timeout: float = 60.0, **kwargs) -> Dict[str, Any]:
         """Chama API do Gemini"""
         try:
             logger.info(f"💎 [GEMINI] Iniciando chamada para Gemini API")
@@ -193,12 +373,15 @@ class ProductionMultiAIService:
             logger.info(f"📊 [GEMINI] Config: maxTokens={data['generationConfig']['maxOutputTokens']}, temp={data['generationConfig']['temperature']}")
             logger.info(f"🔗 [GEMINI] URL: {url}")
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with self._pooled_client() as client:
                 logger.info(f"📡 [GEMINI] Enviando requisição...")
-                response = await client.post(url, json=data)
+                response = await client.post(url, json=data, timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)))
                 
                 logger.info(f"📨 [GEMINI] Status Code: {response.status_code}")
                 
+                if response.status_code == 429:
+                    raise ProviderRateLimited("gemini", parse_retry_after(response.headers))
+                
                 if response.status_code != 200:
                     logger.error(f"❌ [GEMINI] API erro {response.status_code}: {response.text}")
                     raise Exception(f"HTTP {response.status_code}")
@@ -219,7 +402,8 @@ class ProductionMultiAIService:
                     "content": content,
                     "provider": "gemini",
                     "model": provider["model"],
-                    "success": True
+                    "success": True,
+                    "tokens_used": (result.get("usageMetadata") or {}).get("totalTokenCount")
                 }
                 
         except Exception as e:
@@ -227,7 +411,7 @@ class ProductionMultiAIService:
             logger.error(f"🔧 [GEMINI] Tipo do erro: {type(e).__name__}")
             raise
     
-    async def _call_together(self, provider: Dict, prompt: str, **kwargs) -> Dict[str, Any]:
+    async def _call_together(self, provider: Dict, prompt: str, timeout: float = 60.0, **kwargs) -> Dict[str, Any]:
         """Chama API do Together"""
         try:
             logger.info(f"🌐 [TOGETHER] Iniciando chamada para Together API")
@@ -248,12 +432,16 @@ class ProductionMultiAIService:
             
             logger.info(f"📊 [TOGETHER] Payload: model={data['model']}, max_tokens={data['max_tokens']}, temp={data['temperature']}")
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with self._pooled_client() as client:
                 logger.info(f"📡 [TOGETHER] Enviando requisição...")
-                response = await client.post(provider["endpoint"], headers=headers, json=data)
+                response = await client.post(provider["endpoint"], headers=headers, json=data,
+                                             timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)))
                 
                 logger.info(f"📨 [TOGETHER] Status Code: {response.status_code}")
                 
+                if response.status_code == 429:
+                    raise ProviderRateLimited("together", parse_retry_after(response.headers))
+                
                 if response.status_code != 200:
                     logger.error(f"❌ [TOGETHER] API erro {response.status_code}: {response.text}")
                     raise Exception(f"HTTP {response.status_code}")
@@ -274,7 +462,8 @@ class ProductionMultiAIService:
                     "content": content,
                     "provider": "together",
                     "model": provider["model"],
-                    "success": True
+                    "success": True,
+                    "tokens_used": (result.get("usage") or {}).get("total_tokens")
                 }
                 
         except Exception as e:
@@ -334,9 +523,12 @@ def get_multi_ai_service():
         logger.info("🚀 ProductionMultiAIService inicializado (lazy loading)")
     return _multi_ai_service
 
-# Compatibilidade com código existente - inicialização no import
-try:
-    multi_ai_service = get_multi_ai_service()
-except Exception as e:
-    logger.error(f"❌ Erro na inicialização do multi_ai_service: {e}")
-    multi_ai_service = None
\ No newline at end of file
+def __getattr__(name: str):
+    """Compatibilidade com `from ... import multi_ai_service` sem inicializar no import"""
+    if name == "multi_ai_service":
+        try:
+            return get_multi_ai_service()
+        except Exception as e:
+            logger.error(f"❌ Erro na inicialização do multi_ai_service: {e}")
+            return None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
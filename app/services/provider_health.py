@@ -0,0 +1,119 @@
+"""
+Snapshot de saúde dos provedores de IA
+No startup (lifespan) um warm-up abre as conexões do pool e valida as chaves
+uma vez; depois uma tarefa de fundo repete a verificação periodicamente.
+Os endpoints de status leem o snapshot em vez de chamar os provedores.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.services.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_HEALTH_ENABLED = os.getenv("PROVIDER_HEALTH_ENABLED", "true").lower() == "true"
+PROVIDER_HEALTH_INTERVAL = float(os.getenv("PROVIDER_HEALTH_INTERVAL", "300"))
+PROVIDER_HEALTH_TIMEOUT = float(os.getenv("PROVIDER_HEALTH_TIMEOUT", "5"))
+PROVIDER_WARMUP_TIMEOUT = float(os.getenv("PROVIDER_WARMUP_TIMEOUT", "8"))
+
+_registry = get_metrics_registry()
+PROVIDER_UP = _registry.gauge(
+    "costar_provider_up", "1 se a última verificação do provedor foi bem-sucedida", ["provider"])
+PROVIDER_PROBE_DURATION = _registry.histogram(
+    "costar_provider_probe_duration_seconds", "Duração das verificações de saúde por provedor", ["provider"])
+
+# Status em que o provedor é considerado utilizável
+HEALTHY_STATUSES = {"ok", "reachable"}
+
+class ProviderHealthMonitor:
+    """Warm-up no startup + verificações periódicas em segundo plano"""
+
+    def __init__(self, interval: float = PROVIDER_HEALTH_INTERVAL, timeout: float = PROVIDER_HEALTH_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.providers: Dict[str, Dict[str, Any]] = {}
+        self.last_refresh: Optional[str] = None
+        self.refreshes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """Verificar todos os provedores agora e atualizar o snapshot"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            from app.services.production_multi_ai import get_multi_ai_service
+            results = await get_multi_ai_service().warm_up(self.timeout)
+            for name, result in results.items():
+                healthy = result["status"] in HEALTHY_STATUSES
+                PROVIDER_UP.labels(name).set(1 if healthy else 0)
+                PROVIDER_PROBE_DURATION.labels(name).observe(result["latency_ms"] / 1000)
+                if not healthy:
+                    logger.warning(f"⚠️ [HEALTH] {name}: {result['status']} {result.get('error', '')}")
+            self.providers = results
+            self.last_refresh = datetime.now().isoformat()
+            self.refreshes += 1
+            return results
+
+    async def warm_up(self, timeout: float = PROVIDER_WARMUP_TIMEOUT):
+        """Primeira verificação no startup, limitada para não segurar o worker"""
+        try:
+            results = await asyncio.wait_for(self.refresh(), timeout)
+            healthy = sum(result["status"] in HEALTHY_STATUSES for result in results.values())
+            logger.info(f"🔥 [WARMUP] {healthy}/{len(results)} provedores prontos")
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ [WARMUP] Warm-up dos provedores excedeu {timeout:.0f}s; seguindo sem snapshot")
+        except Exception as e:
+            logger.error(f"❌ [WARMUP] Erro no warm-up dos provedores: {e}")
+
+    def start(self):
+        """Iniciar o loop de verificações (chamar de dentro do event loop)"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._probe_loop())
+        logger.info(f"🩺 Verificação de provedores a cada {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ [HEALTH] Erro ao verificar provedores: {e}")
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Último estado conhecido (sem chamadas de rede)"""
+        healthy = [name for name, result in self.providers.items() if result["status"] in HEALTHY_STATUSES]
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "last_refresh": self.last_refresh,
+            "refreshes": self.refreshes,
+            "healthy_providers": healthy,
+            "providers": self.providers
+        }
+
+_provider_health_monitor: Optional[ProviderHealthMonitor] = None
+
+def get_provider_health_monitor() -> ProviderHealthMonitor:
+    """Obter instância do monitor de provedores com lazy loading"""
+    global _provider_health_monitor
+    if _provider_health_monitor is None:
+        _provider_health_monitor = ProviderHealthMonitor()
+    return _provider_health_monitor
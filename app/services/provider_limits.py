@@ -0,0 +1,193 @@
+"""
+Limites do lado do cliente por provedor de IA
+Token buckets de requisições/min (RPM) e tokens/min (TPM), semáforo de
+concorrência e bloqueio temporário a partir do header Retry-After
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+class ProviderRateLimited(Exception):
+    """Provedor recusou por limite (HTTP 429) ou o limite local não liberou a tempo"""
+
+    def __init__(self, provider: str, retry_after: Optional[float] = None, message: str = "",
+                 local: bool = False):
+        self.provider = provider
+        self.retry_after = retry_after
+        self.local = local  # True quando a recusa veio do limitador local, sem chamar a API
+        detail = f" (retry-after {retry_after:.1f}s)" if retry_after is not None else ""
+        super().__init__(message or f"{provider}: limite de requisições atingido{detail}")
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Interpretar Retry-After em segundos ou data HTTP"""
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def rate_limit_from_exception(provider: str, error: BaseException) -> Optional[ProviderRateLimited]:
+    """Reconhecer erro de limite vindo de SDKs (status 429 / ResourceExhausted), inclusive encadeado"""
+    current: Optional[BaseException] = error
+    while current is not None:
+        if isinstance(current, ProviderRateLimited):
+            return current
+        status_code = getattr(current, "status_code", None) or getattr(current, "code", None)
+        if status_code == 429 or type(current).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+            response = getattr(current, "response", None)
+            return ProviderRateLimited(provider, parse_retry_after(getattr(response, "headers", None)))
+        current = current.__cause__ or current.__context__
+    return None
+
+def estimate_tokens(prompt: str, max_tokens: int = 0) -> int:
+    """Estimativa grosseira de tokens (≈ 4 caracteres por token) somada à saída máxima"""
+    return len(prompt) // 4 + max_tokens
+
+class TokenBucket:
+    """Token bucket com reabastecimento contínuo; capacidade = limite por minuto"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver `amount` tokens disponíveis"""
+        self._refill()
+        amount = min(amount, self.capacity)  # pedidos maiores que o bucket esperam encher
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class ProviderLimiter:
+    """Limites combinados de um provedor (0 = sem limite)"""
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_concurrency: int = 0):
+        self.name = name
+        self.rpm = TokenBucket(rpm) if rpm > 0 else None
+        self.tpm = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._lock = asyncio.Lock()
+        self.blocked_until = 0.0
+        self.in_flight = 0
+        self.throttled_count = 0
+        self.rejected_count = 0
+
+    @classmethod
+    def from_config(cls, name: str, config: Mapping[str, Any]) -> "ProviderLimiter":
+        """Criar a partir da definição do provedor, com override por env (ex.: GROQ_RPM)"""
+        prefix = name.upper()
+        return cls(
+            name,
+            rpm=int(os.getenv(f"{prefix}_RPM", config.get("rpm", 0))),
+            tpm=int(os.getenv(f"{prefix}_TPM", config.get("tpm", 0))),
+            max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", config.get("max_concurrency", 0)))
+        )
+
+    def blocked_for(self) -> float:
+        """Segundos restantes de bloqueio por Retry-After"""
+        return max(0.0, self.blocked_until - time.monotonic())
+
+    def note_retry_after(self, retry_after: Optional[float], default: float = 5.0):
+        """Bloquear o provedor após um 429"""
+        self.rejected_count += 1
+        delay = retry_after if retry_after is not None else default
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    async def _reserve(self, tokens: int, max_wait: float) -> float:
+        """Reservar 1 requisição + `tokens`, esperando no máximo `max_wait`"""
+        async with self._lock:
+            waited = 0.0
+            while True:
+                wait = self.blocked_for()
+                if self.rpm:
+                    wait = max(wait, self.rpm.wait_time(1))
+                if self.tpm:
+                    wait = max(wait, self.tpm.wait_time(tokens))
+                if wait <= 0:
+                    break
+                if waited + wait > max_wait:
+                    raise ProviderRateLimited(self.name, wait, f"{self.name}: limite local exige esperar {wait:.1f}s",
+                                              local=True)
+                self.throttled_count += 1
+                await asyncio.sleep(wait)
+                waited += wait
+            if self.rpm:
+                self.rpm.consume(1)
+            if self.tpm:
+                self.tpm.consume(tokens)
+            return waited
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0, max_wait: float = 0.0):
+        """Ocupar uma vaga do provedor respeitando RPM, TPM, concorrência e Retry-After"""
+        started = time.monotonic()
+        if self._semaphore is not None:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max(max_wait, 0.001))
+            except asyncio.TimeoutError:
+                raise ProviderRateLimited(self.name, None, f"{self.name}: limite de concorrência atingido",
+                                          local=True)
+        try:
+            await self._reserve(tokens, max(0.0, max_wait - (time.monotonic() - started)))
+            self.in_flight += 1
+            try:
+                yield self
+            finally:
+                self.in_flight -= 1
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Ajustar o bucket de TPM com o consumo real informado pelo provedor"""
+        if self.tpm is None or actual_tokens is None:
+            return
+        difference = actual_tokens - estimated_tokens
+        if difference > 0:
+            self.tpm.consume(difference)
+        elif difference < 0:
+            self.tpm.refund(-difference)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado atual dos limites (para relatórios de status)"""
+        return {
+            "rpm_available": round(self.rpm.tokens, 1) if self.rpm else None,
+            "tpm_available": round(self.tpm.tokens) if self.tpm else None,
+            "max_concurrency": self.max_concurrency or None,
+            "in_flight": self.in_flight,
+            "blocked_for": round(self.blocked_for(), 1),
+            "throttled": self.throttled_count,
+            "rejected_429": self.rejected_count
+        }
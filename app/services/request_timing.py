@@ -0,0 +1,96 @@
+"""
+Tempo por etapa de cada requisição (header Server-Timing e log de lentidão)
+As etapas são registradas num objeto guardado em ContextVar; fora de uma
+requisição instrumentada, os spans não custam nada além da checagem.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Requisições acima disso geram uma linha estruturada no log de lentidão
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+
+class RequestTimings:
+    """Duração acumulada por etapa de uma requisição"""
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # nome -> [segundos, ocorrências]
+        self.order: List[str] = []
+
+    def record(self, name: str, seconds: float):
+        stage = self.stages.get(name)
+        if stage is None:
+            self.stages[name] = [seconds, 1]
+            self.order.append(name)
+        else:
+            stage[0] += seconds
+            stage[1] += 1
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def breakdown(self) -> List[Tuple[str, float, int]]:
+        """(etapa, ms, ocorrências) na ordem em que apareceram"""
+        return [(name, self.stages[name][0] * 1000, self.stages[name][1]) for name in self.order]
+
+    def server_timing_header(self) -> str:
+        parts = [f"{name};dur={ms:.1f}" for name, ms, _ in self.breakdown()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def to_log_record(self, status_code: int) -> Dict:
+        return {
+            "event": "slow_request",
+            "method": self.method,
+            "path": self.path,
+            "status": status_code,
+            "total_ms": round(self.total_ms(), 1),
+            "stages": {name: {"ms": round(ms, 1), "count": count} for name, ms, count in self.breakdown()}
+        }
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def start_request(method: str, path: str) -> RequestTimings:
+    """Iniciar a coleta para a requisição atual"""
+    timings = RequestTimings(method, path)
+    _current.set(timings)
+    return timings
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+def record_span(name: str, seconds: float):
+    """Somar uma duração já medida à etapa `name` da requisição atual"""
+    timings = _current.get()
+    if timings is not None:
+        timings.record(name, seconds)
+
+@contextmanager
+def span(name: str):
+    """Medir um trecho (síncrono ou com awaits) como etapa da requisição atual"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.record(name, time.perf_counter() - started)
+
+def log_if_slow(timings: RequestTimings, status_code: int,
+                threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS) -> bool:
+    """Registrar a quebra por etapa quando a requisição passou do limite"""
+    if timings.total_ms() < threshold_ms:
+        return False
+    logger.warning(f"🐢 [SLOW] {json.dumps(timings.to_log_record(status_code), ensure_ascii=False)}")
+    return True
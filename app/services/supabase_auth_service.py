@@ -403,4 +403,14 @@ class SupabaseAuthService(SupabaseService):
             
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar senha: {e}")
-            return False
\ No newline at end of file
+            return False
+
+# Instância global (lazy loading): o cliente Supabase só é criado no primeiro uso
+_auth_service: Optional[SupabaseAuthService] = None
+
+def get_auth_service() -> SupabaseAuthService:
+    """Obter instância do serviço de autenticação com lazy loading"""
+    global _auth_service
+    if _auth_service is None:
+        _auth_service = SupabaseAuthService()
+    return _auth_service
@@ -5,10 +5,12 @@ Responsável por estabelecer e gerenciar a conexão com o Supabase
 
 import os
 import logging
-from typing import Optional, Dict, Any, List
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -24,8 +26,8 @@ class SupabaseService:
         self.anon_key = os.getenv("SUPABASE_ANON_KEY")
         self.service_role_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
         
-        self.client: Optional[Client] = None
-        self.admin_client: Optional[Client] = None
+        self.client: Optional["Client"] = None
+        self.admin_client: Optional["Client"] = None
         
         # Verificar configurações
         if not self.url or not self.anon_key:
@@ -38,6 +40,9 @@ class SupabaseService:
     def _initialize_clients(self):
         """Inicializar clientes Supabase"""
         try:
+            # SDK importado só aqui: o import do pacote supabase é caro no cold start
+            from supabase import create_client
+
             # Cliente público (com RLS - Row Level Security)
             self.client = create_client(self.url, self.anon_key)
             logger.info("✅ Cliente Supabase público inicializado")
@@ -55,7 +60,7 @@ class SupabaseService:
         """Verificar se Supabase está habilitado e funcionando"""
         return self.enabled and self.client is not None
     
-    def get_client(self, admin: bool = False) -> Optional[Client]:
+    def get_client(self, admin: bool = False) -> Optional["Client"]:
         """
         Obter cliente Supabase
         
@@ -4,6 +4,8 @@ import os
 from datetime import datetime
 import json
 
+from app.services.pagination import build_page, clamp_page_size, decode_cursor, keyset_filter, InvalidCursorError
+
 class SupabaseService:
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL")
@@ -121,11 +123,17 @@ class SupabaseService:
         favorito: Optional[bool] = None,
         busca: Optional[str] = None,
         page: int = 1,
-        limit: int = 20
+        limit: int = 20,
+        cursor: Optional[str] = None
     ):
-        """Buscar prompts do usuário"""
+        """
+        Buscar prompts do usuário
+        Com cursor usa keyset em (criado_em, id); sem cursor mantém paginação por página
+        """
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor)
         try:
-            query = self.client.table("prompts").select("*").eq("usuario_id", user_id)
+            query = self.client.table("prompts").select("*", count="estimated").eq("usuario_id", user_id)
             
             if categoria:
                 query = query.eq("categoria", categoria)
@@ -136,20 +144,29 @@ class SupabaseService:
             if busca:
                 query = query.or_(f"titulo.ilike.%{busca}%,contexto.ilike.%{busca}%")
             
-            # Paginação
-            start = (page - 1) * limit
-            end = start + limit - 1
-            
-            query = query.order("criado_em", desc=True).range(start, end)
+            if after is not None:
+                query = query.or_(keyset_filter("criado_em", after))
+                query = query.order("criado_em", desc=True).order("id", desc=True).limit(limit + 1)
+            else:
+                # Paginação por página (compatibilidade); busca uma linha extra para has_more
+                start = (page - 1) * limit
+                query = query.order("criado_em", desc=True).order("id", desc=True).range(start, start + limit)
             
             response = query.execute()
-            return {
-                "data": response.data,
-                "page": page,
-                "limit": limit,
-                "total": len(response.data)
-            }
+            rows = response.data or []
             
+            next_key = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_key = (rows[-1].get("criado_em"), rows[-1].get("id"))
+            
+            result = build_page(rows, next_key, limit, response.count, total_is_estimate=True)
+            result["data"] = result.pop("items")
+            result["page"] = page if after is None else None
+            return result
+            
+        except InvalidCursorError:
+            raise
         except Exception as e:
             raise Exception(f"Erro ao buscar prompts: {str(e)}")
     
@@ -231,3 +248,22 @@ class SupabaseService:
             return response.data
         except Exception as e:
             raise Exception(f"Erro ao buscar prompts para export: {str(e)}")
+
+    async def iter_user_prompts(self, user_id: str, page_size: int = 500):
+        """Prompts do usuário página a página (keyset em criado_em, id), sem carregar todos de uma vez"""
+        after = None
+        while True:
+            try:
+                query = self.client.table("prompts").select("*").eq("usuario_id", user_id)
+                if after is not None:
+                    query = query.or_(keyset_filter("criado_em", after))
+                response = query.order("criado_em", desc=True).order("id", desc=True).limit(page_size).execute()
+            except Exception as e:
+                raise Exception(f"Erro ao buscar prompts para export: {str(e)}")
+
+            rows = response.data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            after = (rows[-1].get("criado_em"), rows[-1].get("id"))
@@ -0,0 +1,130 @@
+"""
+Buffer write-behind para contadores de templates
+Acumula incrementos de uso e avaliações em memória e grava em lote,
+por intervalo ou quando o número de eventos pendentes passa do limite
+"""
+import atexit
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (uso, soma das notas, quantidade de notas) pendentes por template
+PendingDeltas = Dict[str, List[float]]
+FlushCallback = Callable[[PendingDeltas], None]
+
+class TemplateCounterBuffer:
+    """Coleta deltas de uso/avaliação e delega a gravação ao callback em lote"""
+
+    def __init__(self, flush_callback: FlushCallback, flush_interval: float = 5.0,
+                 max_pending_events: int = 200, flush_lock=None):
+        self.flush_callback = flush_callback
+        self.flush_interval = flush_interval
+        self.max_pending_events = max_pending_events
+
+        # Trava mantida da retirada do lote até o fim do callback. Quem lê o arquivo + snapshot()
+        # sob a mesma trava vê o lote ou no buffer ou já gravado, nunca nos dois ou em nenhum
+        self._flush_lock = flush_lock if flush_lock is not None else threading.RLock()
+        self._lock = threading.Lock()
+        self._pending: PendingDeltas = {}
+        self._pending_events = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Iniciar thread de flush periódico (idempotente)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="template-counter-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Parar a thread e gravar o que estiver pendente"""
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self.flush()
+
+    def _record(self, template_id: str, usage: int, rating_sum: float, rating_count: int):
+        with self._lock:
+            deltas = self._pending.setdefault(template_id, [0, 0.0, 0])
+            deltas[0] += usage
+            deltas[1] += rating_sum
+            deltas[2] += rating_count
+            self._pending_events += 1
+            should_flush = self._pending_events >= self.max_pending_events
+
+        if self._thread is None:
+            self.start()
+        if should_flush:
+            # A gravação acontece na thread de flush, fora da requisição
+            self._wakeup.set()
+
+    def add_usage(self, template_id: str, increment: int = 1):
+        """Registrar uso de um template"""
+        self._record(template_id, increment, 0.0, 0)
+
+    def add_rating(self, template_id: str, rating: float):
+        """Registrar uma avaliação de um template"""
+        self._record(template_id, 0, float(rating), 1)
+
+    def get_pending(self, template_id: str) -> Tuple[int, float, int]:
+        """Deltas ainda não gravados de um template"""
+        with self._lock:
+            deltas = self._pending.get(template_id)
+            return (deltas[0], deltas[1], deltas[2]) if deltas else (0, 0, 0)
+
+    def snapshot(self) -> PendingDeltas:
+        """Cópia de todos os deltas pendentes"""
+        with self._lock:
+            return {template_id: list(deltas) for template_id, deltas in self._pending.items()}
+
+    def pending_count(self) -> int:
+        """Número de eventos aguardando gravação"""
+        with self._lock:
+            return self._pending_events
+
+    def flush(self) -> int:
+        """Gravar os deltas pendentes; em caso de erro eles voltam para o buffer"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                events, self._pending_events = self._pending_events, 0
+
+            try:
+                self.flush_callback(batch)
+                return events
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar contadores de templates: {e}")
+                with self._lock:
+                    for template_id, deltas in batch.items():
+                        current = self._pending.setdefault(template_id, [0, 0.0, 0])
+                        for position, value in enumerate(deltas):
+                            current[position] += value
+                    self._pending_events += events
+                return 0
+
+def apply_deltas(template_data: Dict, usage: int, rating_sum: float, rating_count: int) -> Dict:
+    """Aplicar deltas a um registro de template (modifica e retorna o próprio dict)"""
+    if usage:
+        template_data['usage_count'] = (template_data.get('usage_count', 0) or 0) + usage
+    if rating_count:
+        votes = template_data.get('votes', 0) or 0
+        rating = template_data.get('rating', 0.0) or 0.0
+        new_votes = votes + rating_count
+        template_data['rating'] = round((rating * votes + rating_sum) / new_votes, 2)
+        template_data['votes'] = new_votes
+    return template_data
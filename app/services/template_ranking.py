@@ -0,0 +1,245 @@
+"""
+Ranking incremental dos templates públicos
+Mantém listas ordenadas por categoria (e global) para popularidade e "em alta",
+atualizadas com bisect a cada uso, avaliação ou criação
+"""
+import bisect
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.pagination import InvalidCursorError
+
+# Referência fixa para manter t/τ em uma faixa numérica pequena
+_EPOCH_REFERENCE = 1704067200.0  # 2024-01-01T00:00:00Z
+
+SORT_POPULAR = "popular"
+SORT_TRENDING = "trending"
+
+# Tipos de cada posição da chave; o cursor leva o modo de ordenação na frente
+_KEY_TYPES = {
+    SORT_POPULAR: (float, int, str),  # (rating, usage_count, id)
+    SORT_TRENDING: (float, str),      # (log do score, id)
+}
+
+def cursor_values(sort: str, key: Tuple) -> Tuple:
+    """Valores a codificar no cursor: o modo de ordenação seguido da chave"""
+    return (sort, *key)
+
+def key_from_cursor(sort: str, values: Optional[Sequence[Any]]) -> Optional[Tuple]:
+    """Validar um cursor decodificado contra o modo de ordenação atual e devolver a chave"""
+    if values is None:
+        return None
+    types = _KEY_TYPES[sort]
+    if len(values) != len(types) + 1 or values[0] != sort:
+        raise InvalidCursorError("Cursor incompatível com esta ordenação")
+    key = []
+    for value, expected in zip(values[1:], types):
+        if expected is str:
+            valid = isinstance(value, str)
+        else:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+            if expected is int:
+                valid = valid and float(value).is_integer()
+        if not valid:
+            raise InvalidCursorError("Cursor inválido")
+        key.append(expected(value))
+    return tuple(key)
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """Converter data ISO (ou epoch) em segundos"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+class _SortedKeys:
+    """Lista de chaves em ordem crescente; o topo do ranking fica no final"""
+
+    def __init__(self):
+        self.keys: List[Tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Tuple):
+        bisect.insort(self.keys, key)
+
+    def discard(self, key: Tuple):
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+
+    def top(self, limit: int, before: Optional[Tuple] = None) -> List[Tuple]:
+        """Até `limit` chaves em ordem decrescente, estritamente abaixo de `before`"""
+        end = len(self.keys) if before is None else bisect.bisect_left(self.keys, before)
+        start = max(0, end - limit)
+        return self.keys[start:end][::-1]
+
+class TemplateRanking:
+    """
+    Ranking dos templates públicos por popularidade e tendência
+
+    Popularidade: (rating, usage_count, id). Tendência: soma de eventos com
+    decaimento exponencial, guardada em espaço log como log(S) + t/τ. Como
+    todos os scores decaem no mesmo ritmo, a ordem relativa não muda com o
+    passar do tempo e nenhuma reordenação periódica é necessária.
+    """
+
+    def __init__(self, trending_half_life_hours: float = 24.0):
+        self.tau = trending_half_life_hours * 3600.0 / math.log(2)
+        self._reset()
+
+    def _reset(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._popular_keys: Dict[str, Tuple] = {}
+        self._trending_keys: Dict[str, Tuple] = {}
+        self._trending_log: Dict[str, float] = {}
+        # Categoria None representa o ranking global
+        self._popular: Dict[Optional[str], _SortedKeys] = {None: _SortedKeys()}
+        self._trending: Dict[Optional[str], _SortedKeys] = {None: _SortedKeys()}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._records
+
+    def build(self, templates: List[Dict[str, Any]]):
+        """Reconstruir o ranking a partir da lista completa de templates"""
+        self._reset()
+        for template_data in templates:
+            self.add_template(template_data)
+
+    @staticmethod
+    def popularity_key(template_data: Dict[str, Any]) -> Tuple:
+        """Chave de popularidade, desempatada pelo id"""
+        return (float(template_data.get("rating") or 0.0),
+                int(template_data.get("usage_count") or 0),
+                str(template_data.get("id", "")))
+
+    def _containers(self, rankings: Dict[Optional[str], _SortedKeys],
+                    category: Optional[str]) -> List[_SortedKeys]:
+        if category not in rankings:
+            rankings[category] = _SortedKeys()
+        if category is None:
+            return [rankings[None]]
+        return [rankings[None], rankings[category]]
+
+    def _set_key(self, rankings: Dict[Optional[str], _SortedKeys], keys: Dict[str, Tuple],
+                 template_id: str, category: Optional[str], new_key: Tuple):
+        old_key = keys.get(template_id)
+        if old_key == new_key:
+            return
+        for container in self._containers(rankings, category):
+            if old_key is not None:
+                container.discard(old_key)
+            container.add(new_key)
+        keys[template_id] = new_key
+
+    def _add_trending_event(self, template_id: str, weight: float, timestamp: Optional[float] = None):
+        """Somar um evento de peso `weight` ao score em alta (em espaço log)"""
+        if weight <= 0:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        event_log = math.log(weight) + (timestamp - _EPOCH_REFERENCE) / self.tau
+        current = self._trending_log.get(template_id)
+        if current is None:
+            updated = event_log
+        else:
+            # log(e^a + e^b) sem overflow
+            high, low = max(current, event_log), min(current, event_log)
+            updated = high + math.log1p(math.exp(low - high))
+        self._trending_log[template_id] = updated
+
+        category = self._records[template_id].get("category")
+        self._set_key(self._trending, self._trending_keys, template_id, category,
+                      (round(updated, 9), template_id))
+
+    def add_template(self, template_data: Dict[str, Any]):
+        """Inserir ou reposicionar um template (apenas públicos são ranqueados)"""
+        template_id = template_data.get("id")
+        if not template_id:
+            return
+        if not template_data.get("is_public", False):
+            self.remove_template(template_id)
+            return
+
+        previous = self._records.get(template_id)
+        if previous is not None and previous.get("category") != template_data.get("category"):
+            self.remove_template(template_id)
+            previous = None
+
+        self._records[template_id] = template_data
+        self._set_key(self._popular, self._popular_keys, template_id,
+                      template_data.get("category"), self.popularity_key(template_data))
+
+        if previous is None:
+            # Sem histórico de eventos: semear com o uso acumulado na data da última atualização
+            timestamp = (_parse_timestamp(template_data.get("updated_at"))
+                         or _parse_timestamp(template_data.get("created_at")))
+            self._add_trending_event(template_id, 1.0 + math.log1p(template_data.get("usage_count", 0) or 0),
+                                     timestamp)
+
+    def remove_template(self, template_id: str):
+        """Remover um template do ranking"""
+        template_data = self._records.pop(template_id, None)
+        if template_data is None:
+            return
+        category = template_data.get("category")
+        for rankings, keys in ((self._popular, self._popular_keys), (self._trending, self._trending_keys)):
+            key = keys.pop(template_id, None)
+            if key is None:
+                continue
+            for container in self._containers(rankings, category):
+                container.discard(key)
+        self._trending_log.pop(template_id, None)
+
+    def record_use(self, template_id: str, usage_count: Optional[int] = None, increment: int = 1):
+        """Registrar uso: reposiciona na popularidade e soma ao score em alta"""
+        template_data = self._records.get(template_id)
+        if template_data is None:
+            return
+        if usage_count is None:
+            usage_count = (template_data.get("usage_count", 0) or 0) + increment
+        template_data["usage_count"] = usage_count
+        self._set_key(self._popular, self._popular_keys, template_id,
+                      template_data.get("category"), self.popularity_key(template_data))
+        self._add_trending_event(template_id, float(increment))
+
+    def record_rating(self, template_id: str, new_rating: float, votes: Optional[int] = None,
+                      given_rating: Optional[float] = None):
+        """Registrar avaliação: atualiza a média e pesa a nota no score em alta"""
+        template_data = self._records.get(template_id)
+        if template_data is None:
+            return
+        template_data["rating"] = new_rating
+        if votes is not None:
+            template_data["votes"] = votes
+        self._set_key(self._popular, self._popular_keys, template_id,
+                      template_data.get("category"), self.popularity_key(template_data))
+        if given_rating is not None:
+            self._add_trending_event(template_id, given_rating / 5.0)
+
+    def count(self, category: Optional[str] = None) -> int:
+        """Número de templates ranqueados (na categoria ou no total)"""
+        container = self._popular.get(category)
+        return len(container) if container else 0
+
+    def top(self, category: Optional[str] = None, limit: int = 10, sort: str = SORT_POPULAR,
+            before: Optional[Tuple] = None) -> List[Tuple[Tuple, Dict[str, Any]]]:
+        """
+        Ler os `limit` primeiros pares (chave, template) em O(log n + K)
+        `before` é a chave do último item da página anterior
+        """
+        rankings = self._trending if sort == SORT_TRENDING else self._popular
+        container = rankings.get(category)
+        if not container:
+            return []
+        return [(key, self._records[key[-1]]) for key in container.top(limit, before)]
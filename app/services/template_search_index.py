@@ -0,0 +1,287 @@
+"""
+Índice de busca full-text para templates públicos
+Índice invertido com tokenização em português (sem acentos), busca por prefixo
+e ranking BM25 combinado com avaliação e número de usos
+"""
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from typing import Dict, List, Optional, Any, Tuple
+
+# Palavras muito comuns em português que não ajudam a ranquear resultados
+STOPWORDS_PT = frozenset({
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "em", "no", "na", "nos", "nas", "por", "para", "pra", "com", "sem", "e", "ou",
+    "que", "se", "ao", "aos", "seu", "sua", "seus", "suas", "the", "and",
+    "of", "for", "to", "in"
+})
+
+# Peso de cada campo no cálculo da frequência do termo
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "category": 1.5,
+    "description": 1.0,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def normalize_text(text: Any) -> str:
+    """Remover acentos e converter para minúsculas"""
+    if not text:
+        return ""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    # NFKD separa letra e acento; o encode descarta as marcas combinantes
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+def tokenize(text: Any) -> List[str]:
+    """Quebrar texto em termos normalizados, ignorando stopwords"""
+    return [
+        token for token in _TOKEN_RE.findall(normalize_text(text))
+        if token not in STOPWORDS_PT
+    ]
+
+class TemplateSearchIndex:
+    """Índice invertido incremental sobre título, descrição, tags e categoria"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, prefix_min_length: int = 2,
+                 max_prefix_expansions: int = 32, rating_weight: float = 0.5,
+                 usage_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.prefix_min_length = prefix_min_length
+        self.max_prefix_expansions = max_prefix_expansions
+        self.rating_weight = rating_weight
+        self.usage_weight = usage_weight
+        self._reset()
+
+    def _reset(self):
+        """Limpar todas as estruturas do índice"""
+        self._postings: Dict[str, Dict[str, float]] = {}  # termo -> {template_id: tf ponderado}
+        self._vocabulary: List[str] = []  # termos ordenados para busca por prefixo
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_length: Dict[str, float] = {}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._total_length = 0.0
+        self._max_usage = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._documents
+
+    def build(self, templates: List[Dict[str, Any]]):
+        """Reconstruir o índice a partir da lista completa de templates"""
+        self._reset()
+        for template_data in templates:
+            self.add_template(template_data, _bulk=True)
+        # No modo em lote o vocabulário é ordenado uma única vez no final
+        self._vocabulary = sorted(self._postings)
+
+    def get_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Obter os dados brutos de um template indexado"""
+        return self._documents.get(template_id)
+
+    def add_template(self, template_data: Dict[str, Any], _bulk: bool = False):
+        """Indexar (ou reindexar) um template"""
+        template_id = template_data.get("id")
+        if not template_id:
+            return
+        if template_id in self._documents:
+            self.remove_template(template_id)
+
+        fields = {
+            "title": template_data.get("title", template_data.get("name", "")),
+            "description": template_data.get("description", ""),
+            "category": template_data.get("category", ""),
+            "tags": " ".join(template_data.get("tags") or []),
+        }
+
+        term_weights: Dict[str, float] = {}
+        length = 0.0
+        for field_name, text in fields.items():
+            weight = FIELD_WEIGHTS[field_name]
+            for token in tokenize(text):
+                term_weights[token] = term_weights.get(token, 0.0) + weight
+                length += weight
+
+        for term, weight in term_weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if not _bulk:
+                    bisect.insort(self._vocabulary, term)
+            postings[template_id] = weight
+
+        self._doc_terms[template_id] = term_weights
+        self._doc_length[template_id] = length
+        self._documents[template_id] = template_data
+        self._total_length += length
+        self._max_usage = max(self._max_usage, template_data.get("usage_count", 0) or 0)
+
+    def remove_template(self, template_id: str):
+        """Remover um template do índice"""
+        term_weights = self._doc_terms.pop(template_id, None)
+        if term_weights is None:
+            return
+
+        for term in term_weights:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(template_id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._vocabulary, term)
+                if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                    del self._vocabulary[position]
+
+        self._total_length -= self._doc_length.pop(template_id, 0.0)
+        self._documents.pop(template_id, None)
+
+    def update_stats(self, template_id: str, rating: Optional[float] = None,
+                     usage_count: Optional[int] = None, votes: Optional[int] = None):
+        """Atualizar avaliação/uso sem reindexar o texto"""
+        template_data = self._documents.get(template_id)
+        if template_data is None:
+            return
+        if rating is not None:
+            template_data["rating"] = rating
+        if votes is not None:
+            template_data["votes"] = votes
+        if usage_count is not None:
+            template_data["usage_count"] = usage_count
+            self._max_usage = max(self._max_usage, usage_count)
+
+    def _expand_term(self, token: str, allow_prefix: bool = True) -> List[Tuple[str, float]]:
+        """Termos do vocabulário que casam com o token (exato ou prefixo)"""
+        matches = []
+        if token in self._postings:
+            matches.append((token, 1.0))
+        if not allow_prefix or len(token) < self.prefix_min_length:
+            return matches
+
+        position = bisect.bisect_left(self._vocabulary, token)
+        expansions = 0
+        while position < len(self._vocabulary) and expansions < self.max_prefix_expansions:
+            term = self._vocabulary[position]
+            if not term.startswith(token):
+                break
+            if term != token:
+                # Casamentos por prefixo valem um pouco menos que o termo exato
+                matches.append((term, 0.8))
+                expansions += 1
+            position += 1
+        return matches
+
+    def _popularity_boost(self, template_data: Dict[str, Any]) -> float:
+        """Fator multiplicativo baseado em avaliação e número de usos"""
+        rating = template_data.get("rating", 0.0) or 0.0
+        usage = template_data.get("usage_count", 0) or 0
+        usage_norm = math.log1p(usage) / math.log1p(self._max_usage) if self._max_usage > 0 else 0.0
+        return 1.0 + self.rating_weight * (rating / 5.0) + self.usage_weight * usage_norm
+
+    def _bm25_scores(self, tokens: List[str]) -> Dict[str, float]:
+        """Score BM25 dos templates que casam com todos os tokens"""
+        total_docs = len(self._documents)
+        avg_length = (self._total_length / total_docs) or 1.0
+        doc_length = self._doc_length
+        # Termos constantes da normalização BM25: k1 * (1 - b + b * len / avg)
+        norm_base = self.k1 * (1.0 - self.b)
+        norm_scale = self.k1 * self.b / avg_length
+        scores: Optional[Dict[str, float]] = None
+
+        # Prefixo apenas no último token (busca enquanto o usuário digita);
+        # tokens mais raros primeiro para a interseção encolher rápido
+        expanded_tokens = []
+        for position, token in enumerate(tokens):
+            terms = self._expand_term(token, allow_prefix=position == len(tokens) - 1)
+            if not terms:
+                return {}
+            expanded_tokens.append((sum(len(self._postings[term]) for term, _ in terms), terms))
+        expanded_tokens.sort(key=lambda item: item[0])
+
+        # Todos os tokens da consulta precisam casar (semântica AND)
+        for _, terms in expanded_tokens:
+            token_scores: Dict[str, float] = {}
+            for term, factor in terms:
+                postings = self._postings[term]
+                doc_freq = len(postings)
+                idf = math.log(1.0 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                term_weight = factor * idf * (self.k1 + 1.0)
+
+                # Após o primeiro token, percorrer o menor dos dois conjuntos
+                if scores is not None and len(scores) < doc_freq:
+                    candidates = ((template_id, postings.get(template_id)) for template_id in scores)
+                else:
+                    candidates = postings.items()
+
+                for template_id, tf in candidates:
+                    if tf is None or (scores is not None and template_id not in scores):
+                        continue
+                    partial = term_weight * tf / (tf + norm_base + norm_scale * doc_length[template_id])
+                    if partial > token_scores.get(template_id, 0.0):
+                        token_scores[template_id] = partial
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    template_id: score + token_scores[template_id]
+                    for template_id, score in scores.items()
+                    if template_id in token_scores
+                }
+            if not scores:
+                return {}
+        return scores
+
+    def _substring_scores(self, needle: str) -> Dict[str, float]:
+        """Templates cujo título, descrição ou tags contêm o texto (score neutro)"""
+        scores = {}
+        for template_id, template_data in self._documents.items():
+            fields = [template_data.get("title", template_data.get("name", "")),
+                      template_data.get("description", ""), *(template_data.get("tags") or [])]
+            if any(needle in normalize_text(field) for field in fields):
+                scores[template_id] = 1.0
+        return scores
+
+    def search(self, query: str, category: Optional[str] = None, public_only: bool = True,
+               limit: Optional[int] = None, with_scores: bool = False) -> List[Any]:
+        """
+        Buscar templates ordenados por relevância (BM25 + popularidade)
+        Com with_scores=True retorna pares (score, template) para paginação
+        """
+        if not self._documents:
+            return []
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if tokens:
+            scores = self._bm25_scores(tokens)
+        elif _TOKEN_RE.search(normalize_text(query)):
+            # Só stopwords ("de", "para"): não estão no índice, então vale o filtro por substring
+            scores = self._substring_scores(normalize_text(query).strip())
+        else:
+            return []
+        if not scores:
+            return []
+
+        ranked = []
+        for template_id, score in scores.items():
+            template_data = self._documents[template_id]
+            if public_only and not template_data.get("is_public", False):
+                continue
+            if category and template_data.get("category") != category:
+                continue
+            ranked.append((score * self._popularity_boost(template_data), template_id))
+
+        if limit is not None:
+            ranked = heapq.nlargest(limit, ranked)
+        else:
+            ranked.sort(reverse=True)
+        if with_scores:
+            return [(score, self._documents[template_id]) for score, template_id in ranked]
+        return [self._documents[template_id] for _, template_id in ranked]
@@ -6,6 +6,67 @@
 const API_BASE = "/api";
 let currentUser = null;
 let currentProfile = null;
+// Listagens paginadas por cursor: primeira página ao abrir, próximas em "Carregar mais"
+const PAGE_LIMIT = 20;
+// Estado por listagem: configuração, itens já exibidos e cursor da próxima página
+const pagedLists = {};
+
+// Carregar a primeira página de uma listagem (ou a próxima, com append) e renderizar
+async function loadPagedList(name, config, append = false) {
+  const state = append
+    ? pagedLists[name]
+    : (pagedLists[name] = { config, items: [], cursor: null });
+  const query = new URLSearchParams(config.params || {});
+  query.set("limit", PAGE_LIMIT);
+  if (append) query.set("cursor", state.cursor);
+
+  const response = await fetch(`${API_BASE}${config.path}?${query}`, config.options);
+  if (!response.ok) {
+    return { ok: false, response };
+  }
+  const page = await response.json();
+  // Filtros mudaram enquanto a página carregava: descartar a resposta antiga
+  if (pagedLists[name] !== state) {
+    return { ok: true, page };
+  }
+  state.items = state.items.concat(page[config.itemsKey] || []);
+  state.cursor = page.has_more ? page.next_cursor : null;
+  config.render(state.items);
+  renderLoadMoreButton(name);
+  return { ok: true, page };
+}
+
+// Botão "Carregar mais" no fim do container, enquanto houver próxima página
+function renderLoadMoreButton(name) {
+  const state = pagedLists[name];
+  const container = document.getElementById(state.config.containerId);
+  if (!container || !state.cursor || state.items.length === 0) return;
+  container.insertAdjacentHTML(
+    "beforeend",
+    `<div class="col-12 text-center my-3">
+        <button class="btn btn-outline-primary" onclick="loadMore('${name}', this)">
+            <i class="bi bi-arrow-down-circle me-1"></i>Carregar mais
+        </button>
+    </div>`
+  );
+}
+
+// Buscar só a próxima página de uma listagem já aberta
+async function loadMore(name, button) {
+  const state = pagedLists[name];
+  if (!state || !state.cursor) return;
+  if (button) button.disabled = true;
+  try {
+    const result = await loadPagedList(name, state.config, true);
+    if (!result.ok) {
+      console.error(`Erro ao carregar mais (${name}):`, result.response.status);
+      if (button) button.disabled = false;
+    }
+  } catch (error) {
+    console.error(`Erro ao carregar mais (${name}):`, error);
+    if (button) button.disabled = false;
+  }
+}
 
 // Inicialização
 document.addEventListener("DOMContentLoaded", function () {
@@ -220,14 +281,13 @@ function updateQuotaDisplay(quotas) {
 async function loadUserTemplates() {
   try {
     const token = localStorage.getItem("authToken");
-    const response = await fetch(`${API_BASE}/members/templates`, {
-      headers: { Authorization: `Bearer ${token}` },
+    await loadPagedList("userTemplates", {
+      path: "/members/templates",
+      itemsKey: "templates",
+      containerId: "userTemplates",
+      options: { headers: { Authorization: `Bearer ${token}` } },
+      render: displayUserTemplates,
     });
-
-    if (response.ok) {
-      const data = await response.json();
-      displayUserTemplates(data.templates);
-    }
   } catch (error) {
     console.error("Erro ao carregar templates:", error);
   }
@@ -301,24 +361,24 @@ async function loadPublicTemplates(category = "", search = "") {
   try {
     console.log("📡 loadPublicTemplates chamado com:", { category, search });
     const token = localStorage.getItem("authToken");
-    const params = new URLSearchParams();
-    if (category) params.append("category", category);
-    if (search) params.append("search", search);
-
-    const url = `${API_BASE}/members/templates/public?${params}`;
-    console.log("📡 URL da requisição:", url);
-
-    const response = await fetch(url, {
-      headers: { Authorization: `Bearer ${token}` },
+    const params = {};
+    if (category) params.category = category;
+    if (search) params.search = search;
+    console.log("📡 Parâmetros da requisição:", params);
+
+    const result = await loadPagedList("publicTemplates", {
+      path: "/members/templates/public",
+      itemsKey: "templates",
+      params,
+      containerId: "publicTemplates",
+      options: { headers: { Authorization: `Bearer ${token}` } },
+      render: displayPublicTemplates,
     });
 
-    if (response.ok) {
-      const data = await response.json();
-      console.log("📦 Dados recebidos:", data);
-      // O endpoint retorna diretamente a lista de templates
-      displayPublicTemplates(Array.isArray(data) ? data : data.templates || []);
+    if (result.ok) {
+      console.log("📦 Dados recebidos:", result.page);
     } else {
-      console.error("Erro ao carregar templates:", response.status);
+      console.error("Erro ao carregar templates:", result.response.status);
       displayPublicTemplates([]);
     }
   } catch (error) {
@@ -1196,24 +1256,26 @@ async function loadSavedPrompts() {
     }
 
     console.log("📡 [MEMBER] Fazendo requisição para /members/saved-prompts");
-    const response = await fetch(`${API_BASE}/members/saved-prompts`, {
-      headers: {
-        Authorization: `Bearer ${token}`,
-        "Content-Type": "application/json",
+    const result = await loadPagedList("savedPrompts", {
+      path: "/members/saved-prompts",
+      itemsKey: "prompts",
+      containerId: "savedPromptsContainer",
+      options: {
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
+        },
       },
+      render: displaySavedPrompts,
     });
 
-    console.log(`📊 [MEMBER] Status da resposta: ${response.status}`);
-
-    if (response.ok) {
-      const data = await response.json();
+    if (result.ok) {
+      const data = result.page;
       console.log("✅ [MEMBER] Dados recebidos:", data);
       console.log(
-        `📋 [MEMBER] Total prompts: ${data.total}, Array length: ${data.prompts?.length}`
+        `📋 [MEMBER] Total prompts: ${data.total}, Página: ${data.prompts?.length}`
       );
 
-      displaySavedPrompts(data.prompts);
-
       // Atualizar contador no dashboard
       const savedPromptsCount = document.getElementById("savedTemplates");
       if (savedPromptsCount) {
@@ -1223,9 +1285,9 @@ async function loadSavedPrompts() {
         console.warn("⚠️ [MEMBER] Elemento savedTemplates não encontrado");
       }
     } else {
-      const errorText = await response.text();
+      const errorText = await result.response.text();
       console.error(
-        `❌ [MEMBER] Erro na requisição: ${response.status}`,
+        `❌ [MEMBER] Erro na requisição: ${result.response.status}`,
         errorText
       );
     }
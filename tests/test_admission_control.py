@@ -0,0 +1,75 @@
+"""Testes do controle de admissão por plano"""
+import asyncio
+import unittest
+
+from app.services.admission_control import AdmissionController, AdmissionRejected
+
+class AdmissionControlTest(unittest.IsolatedAsyncioTestCase):
+    def make_controller(self, **kwargs):
+        kwargs.setdefault("max_queue_wait", {"enterprise": 0.05, "premium": 0.05})
+        return AdmissionController(max_concurrency=1, **kwargs)
+
+    async def test_admite_direto_com_vaga(self):
+        controller = self.make_controller()
+        async with controller.admit("premium") as plan:
+            self.assertEqual(plan, "premium")
+            self.assertEqual(controller.get_status()["running"], 1)
+        self.assertEqual(controller.get_status()["running"], 0)
+
+    async def test_timeout_remove_da_fila(self):
+        controller = self.make_controller(queue_limits={"enterprise": 1})
+        async with controller.admit("enterprise"):
+            for _ in range(3):
+                # Com a fila limitada a 1, um item preso na fila viraria "fila cheia"
+                with self.assertRaisesRegex(AdmissionRejected, "tempo de espera"):
+                    async with controller.admit("enterprise"):
+                        pass
+                self.assertEqual(controller.queue_depth(), 0)
+        status = controller.get_status()["plans"]["enterprise"]
+        self.assertEqual(status["timed_out"], 3)
+        self.assertEqual(status["shed"], 0)
+
+    async def test_cancelamento_remove_da_fila(self):
+        controller = self.make_controller(max_queue_wait={"premium": 5.0})
+        async with controller.admit("enterprise"):
+            waiting = asyncio.create_task(controller.admit("premium").__aenter__())
+            await asyncio.sleep(0.01)
+            self.assertEqual(controller.queue_depth(), 1)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            self.assertEqual(controller.queue_depth(), 0)
+            # Sem o item cancelado, um plano inferior não fica bloqueado por prioridade
+            self.assertFalse(controller._waiting_at_or_above("free"))
+        self.assertEqual(controller.get_status()["running"], 0)
+
+    async def test_vaga_liberada_vai_para_quem_espera(self):
+        controller = self.make_controller(max_queue_wait={"premium": 5.0})
+        order = []
+
+        async def waiter():
+            async with controller.admit("premium"):
+                order.append("premium")
+
+        async with controller.admit("enterprise"):
+            task = asyncio.create_task(waiter())
+            await asyncio.sleep(0.01)
+            order.append("enterprise")
+        await task
+        self.assertEqual(order, ["enterprise", "premium"])
+        self.assertEqual(controller.queue_depth(), 0)
+
+    async def test_saturacao_descarta_plano_gratuito(self):
+        controller = self.make_controller(saturation_depth=1, max_queue_wait={"premium": 5.0})
+        async with controller.admit("enterprise"):
+            task = asyncio.create_task(controller.admit("premium").__aenter__())
+            await asyncio.sleep(0.01)
+            with self.assertRaisesRegex(AdmissionRejected, "saturado"):
+                async with controller.admit("free"):
+                    pass
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Testes dos histogramas de latência e da carga do histórico gravado"""
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.services.latency_histograms import (
+    DIMENSION_PROVIDER, LatencyHistogram, LatencyHistogramStore, bucket_bounds, bucket_index
+)
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_buckets_contem_o_valor(self):
+        for value_us in (0, 1, 63, 64, 1000, 123_456, 9_999_999):
+            lower, upper = bucket_bounds(bucket_index(value_us))
+            self.assertLessEqual(lower, value_us)
+            self.assertLess(value_us, upper)
+
+    def test_percentis_com_erro_relativo_pequeno(self):
+        histogram = LatencyHistogram()
+        for millis in range(1, 1001):
+            histogram.record(millis / 1000)
+        result = histogram.percentiles((50, 99))
+        self.assertAlmostEqual(result["p50"], 500, delta=500 * 0.04)
+        self.assertAlmostEqual(result["p99"], 990, delta=990 * 0.04)
+        self.assertEqual(histogram.summary()["count"], 1000)
+
+    def test_merge_e_serializacao(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.1)
+        second.record(0.3)
+        merged = LatencyHistogram.from_dict(json.loads(json.dumps(first.merge(second).to_dict())))
+        self.assertEqual(merged.count, 2)
+        self.assertEqual(merged.min_us, 100_000)
+        self.assertEqual(merged.max_us, 300_000)
+
+    def test_histograma_vazio(self):
+        self.assertEqual(LatencyHistogram().percentiles((50,)), {"p50": 0.0})
+
+class LatencyHistogramStoreTest(unittest.TestCase):
+    def test_janela_soma_as_horas(self):
+        store = LatencyHistogramStore(retention_hours=48)
+        now = time.time()
+        store.record(DIMENSION_PROVIDER, "groq", 0.2, now - 3 * 3600)
+        store.record(DIMENSION_PROVIDER, "groq", 0.4, now)
+        self.assertEqual(store.summary(DIMENSION_PROVIDER, hours=1)["groq"]["count"], 1)
+        self.assertEqual(store.summary(DIMENSION_PROVIDER, hours=24)["groq"]["count"], 2)
+
+    def test_amostras_fora_da_retencao_sao_ignoradas(self):
+        store = LatencyHistogramStore(retention_hours=2)
+        store.record(DIMENSION_PROVIDER, "groq", 0.2, time.time() - 5 * 3600)
+        self.assertTrue(store.is_empty())
+
+    def test_primeira_amostra_ao_vivo(self):
+        store = LatencyHistogramStore()
+        store.record(DIMENSION_PROVIDER, "groq", 0.2, time.time() - 60)
+        self.assertIsNone(store.first_live_sample(DIMENSION_PROVIDER, "groq"))
+        before = time.time()
+        store.record(DIMENSION_PROVIDER, "groq", 0.2)
+        store.record(DIMENSION_PROVIDER, "groq", 0.3)
+        self.assertGreaterEqual(store.first_live_sample(DIMENSION_PROVIDER, "groq"), before)
+        self.assertLessEqual(store.first_live_sample(DIMENSION_PROVIDER, "groq"), time.time())
+
+class LatencyBootstrapTest(unittest.TestCase):
+    def setUp(self):
+        self.previous_cwd = os.getcwd()
+        self.workdir = tempfile.TemporaryDirectory()
+        os.chdir(self.workdir.name)
+        self.store = LatencyHistogramStore()
+        patcher = mock.patch("app.services.admin_analytics_service.get_latency_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        from app.services.admin_analytics_service import AdminAnalyticsService
+        self.service = AdminAnalyticsService()
+
+    def tearDown(self):
+        os.chdir(self.previous_cwd)
+        self.workdir.cleanup()
+
+    def write_logs(self, logs):
+        with open(self.service.api_logs_file, "w") as f:
+            json.dump(logs, f)
+
+    def log(self, provider, moment, response_time):
+        return {"provider": provider, "request_time": moment.isoformat(), "response_time": response_time}
+
+    def test_carrega_historico_mesmo_com_amostras_ao_vivo(self):
+        now = datetime.now()
+        self.store.record(DIMENSION_PROVIDER, "groq", 1.0)
+        self.write_logs([
+            self.log("groq", now - timedelta(minutes=30), 0.5),
+            self.log("gemini", now - timedelta(minutes=10), 0.7),
+            # Gravado depois da primeira amostra ao vivo: já está no histograma
+            self.log("groq", now + timedelta(seconds=5), 1.0),
+        ])
+        self.assertEqual(self.service.bootstrap_latency(), 2)
+        counts = {key: value["count"] for key, value in self.store.summary(DIMENSION_PROVIDER).items()}
+        self.assertEqual(counts, {"gemini": 1, "groq": 2})
+
+    def test_carrega_uma_vez(self):
+        self.write_logs([self.log("groq", datetime.now() - timedelta(minutes=5), 0.5)])
+        self.assertEqual(self.service.bootstrap_latency(), 1)
+        self.assertEqual(self.service.bootstrap_latency(), 0)
+        summary = self.service.get_latency_percentiles(DIMENSION_PROVIDER)
+        self.assertEqual(summary["groq"]["count"], 1)
+
+    def test_ignora_logs_malformados(self):
+        self.write_logs([{"provider": "groq"}, {"provider": "groq", "request_time": "ontem", "response_time": 1}])
+        self.assertEqual(self.service.bootstrap_latency(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
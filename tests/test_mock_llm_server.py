@@ -0,0 +1,40 @@
+"""Testes da configuração de perfis do servidor mock de provedores"""
+import unittest
+
+try:
+    from tools.mock_llm_server import DEFAULT_PROFILE, PROVIDERS, MockState
+except ImportError:  # fastapi ausente
+    MockState = None
+
+@unittest.skipIf(MockState is None, "fastapi não instalado")
+class MockStateConfigureTest(unittest.TestCase):
+    def test_perfil_inicial(self):
+        state = MockState({"default": {"latency": "fixed:0.3"}, "groq": {"error_rate": 0.5}}, seed=1)
+        self.assertEqual(state.profiles["groq"]["latency"], "fixed:0.3")
+        self.assertEqual(state.profiles["groq"]["error_rate"], 0.5)
+        self.assertEqual(state.profiles["gemini"]["error_rate"], DEFAULT_PROFILE["error_rate"])
+
+    def test_novo_default_vale_para_todos(self):
+        state = MockState({"default": {"latency": "fixed:0.3"}}, seed=1)
+        state.configure({"default": {"latency": "fixed:0.1"}})
+        for provider in PROVIDERS:
+            self.assertEqual(state.profiles[provider]["latency"], "fixed:0.1")
+            self.assertEqual(state.latencies[provider].params, [0.1])
+
+    def test_override_do_provedor_prevalece_sobre_novo_default(self):
+        state = MockState({"groq": {"latency": "fixed:2", "rate_limit_rate": 0.2}}, seed=1)
+        state.configure({"default": {"latency": "fixed:0.5", "rate_limit_rate": 0.0}})
+        self.assertEqual(state.profiles["groq"]["latency"], "fixed:2")
+        self.assertEqual(state.profiles["groq"]["rate_limit_rate"], 0.2)
+        self.assertEqual(state.profiles["together"]["latency"], "fixed:0.5")
+
+    def test_configuracoes_sao_incrementais(self):
+        state = MockState({}, seed=1)
+        state.configure({"groq": {"error_rate": 0.1}})
+        state.configure({"groq": {"retry_after": 7}})
+        self.assertEqual(state.profiles["groq"]["error_rate"], 0.1)
+        self.assertEqual(state.profiles["groq"]["retry_after"], 7)
+        self.assertEqual(state.profiles["gemini"], DEFAULT_PROFILE)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Testes do ranking incremental de templates e do cursor da galeria"""
+import unittest
+
+from app.services.pagination import InvalidCursorError, decode_cursor, encode_cursor
+from app.services.template_ranking import (
+    SORT_POPULAR, SORT_TRENDING, TemplateRanking, cursor_values, key_from_cursor
+)
+
+def make_template(template_id, category=None, rating=0.0, usage_count=0):
+    return {"id": template_id, "is_public": True, "category": category,
+            "rating": rating, "usage_count": usage_count}
+
+class TemplateRankingTest(unittest.TestCase):
+    def setUp(self):
+        self.ranking = TemplateRanking()
+        self.ranking.build([
+            make_template("a", None, rating=5.0, usage_count=1),
+            make_template("b", "marketing", rating=4.0, usage_count=3),
+            make_template("c", None, rating=4.0, usage_count=7),
+            make_template("d", "marketing", rating=1.0),
+        ])
+
+    def test_template_sem_categoria_entra_uma_vez_no_global(self):
+        self.assertEqual(self.ranking.count(), 4)
+        ids = [template["id"] for _, template in self.ranking.top(limit=10)]
+        self.assertEqual(ids, ["a", "c", "b", "d"])
+
+    def test_remocao_de_template_sem_categoria(self):
+        self.ranking.remove_template("a")
+        self.assertEqual(self.ranking.count(), 3)
+        self.assertNotIn("a", [template["id"] for _, template in self.ranking.top(limit=10)])
+
+    def test_reposiciona_apos_uso(self):
+        self.ranking.record_rating("d", 5.0)
+        self.ranking.record_use("d", usage_count=2)
+        ids = [template["id"] for _, template in self.ranking.top(limit=10)]
+        self.assertEqual(ids.count("d"), 1)
+        self.assertEqual(ids[:2], ["d", "a"])
+
+    def test_paginacao_pelo_cursor(self):
+        first = self.ranking.top(limit=2)
+        cursor = encode_cursor(cursor_values(SORT_POPULAR, first[-1][0]))
+        after = key_from_cursor(SORT_POPULAR, decode_cursor(cursor))
+        second = self.ranking.top(limit=2, before=after)
+        self.assertEqual([template["id"] for _, template in second], ["b", "d"])
+
+    def test_categoria(self):
+        ids = [template["id"] for _, template in self.ranking.top("marketing", limit=10)]
+        self.assertEqual(ids, ["b", "d"])
+        self.assertEqual(self.ranking.count("marketing"), 2)
+
+class RankingCursorTest(unittest.TestCase):
+    def test_cursor_de_outra_ordenacao_e_rejeitado(self):
+        popular = encode_cursor(cursor_values(SORT_POPULAR, (4.0, 3, "b")))
+        with self.assertRaises(InvalidCursorError):
+            key_from_cursor(SORT_TRENDING, decode_cursor(popular))
+
+    def test_cursor_sem_modo_ou_com_aridade_errada(self):
+        for values in [(4.0, 3, "b"), (SORT_POPULAR, 4.0, "b"), (SORT_POPULAR, 4.0, 3, "b", "x")]:
+            with self.assertRaises(InvalidCursorError):
+                key_from_cursor(SORT_POPULAR, values)
+
+    def test_cursor_com_tipos_errados(self):
+        for values in [(SORT_POPULAR, "4", 3, "b"), (SORT_POPULAR, 4.0, 3.5, "b"), (SORT_TRENDING, True, "b")]:
+            with self.assertRaises(InvalidCursorError):
+                key_from_cursor(values[0], values)
+
+    def test_primeira_pagina(self):
+        self.assertIsNone(key_from_cursor(SORT_POPULAR, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Testes do índice de busca full-text de templates"""
+import unittest
+
+from app.services.template_search_index import TemplateSearchIndex, tokenize
+
+def make_template(template_id, title, description="", tags=None, category="geral", is_public=True):
+    return {"id": template_id, "title": title, "description": description, "tags": tags or [],
+            "category": category, "is_public": is_public, "rating": 0.0, "usage_count": 0}
+
+class TemplateSearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = TemplateSearchIndex()
+        self.index.build([
+            make_template("t1", "Plano de marketing", "Campanha para redes sociais", ["marketing"]),
+            make_template("t2", "Relatório técnico", "Documentação com exemplos", ["docs"], category="tech"),
+            make_template("t3", "E-mail de vendas", "Texto curto", ["vendas"], is_public=False),
+        ])
+
+    def ids(self, *args, **kwargs):
+        return [template["id"] for template in self.index.search(*args, **kwargs)]
+
+    def test_tokenizacao_sem_acentos_e_stopwords(self):
+        self.assertEqual(tokenize("Relatório de Vendas"), ["relatorio", "vendas"])
+
+    def test_busca_por_termo_e_prefixo(self):
+        self.assertEqual(self.ids("relatorio"), ["t2"])
+        self.assertEqual(self.ids("market"), ["t1"])
+
+    def test_todos_os_termos_precisam_casar(self):
+        self.assertEqual(self.ids("plano campanha"), ["t1"])
+        self.assertEqual(self.ids("plano tecnico"), [])
+
+    def test_filtros_de_categoria_e_publico(self):
+        self.assertEqual(self.ids("relatorio", category="marketing"), [])
+        self.assertEqual(self.ids("vendas"), [])
+        self.assertEqual(self.ids("vendas", public_only=False), ["t3"])
+
+    def test_consulta_so_com_stopwords_usa_substring(self):
+        self.assertEqual(sorted(self.ids("de")), ["t1"])
+        self.assertEqual(sorted(self.ids("para")), ["t1"])
+        self.assertEqual(sorted(self.ids("com")), ["t2"])
+        self.assertEqual(sorted(self.ids("de", public_only=False)), ["t1", "t3"])
+
+    def test_consulta_vazia(self):
+        self.assertEqual(self.ids("  "), [])
+        self.assertEqual(self.ids("!!"), [])
+
+    def test_remocao(self):
+        self.index.remove_template("t1")
+        self.assertEqual(self.ids("marketing"), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Benchmarks dos caminhos quentes em Python puro (estilo asv)
+
+Cada classe declara `params` (tamanhos do conjunto de dados), recebe o
+parâmetro em `setup` e em cada método `time_*`. Os dados são gerados por
+synthetic_data.py dentro de um diretório de trabalho temporário (o runner
+faz chdir antes de importar a aplicação), nunca em data/ do projeto.
+"""
+from types import SimpleNamespace
+
+import synthetic_data
+
+def _fake_request(index: int = 0):
+    """Objeto mínimo com o que AnonymousQuotaManager lê de Request"""
+    return SimpleNamespace(
+        client=SimpleNamespace(host=f"10.1.{index // 256 % 256}.{index % 256}"),
+        headers={"user-agent": f"bench-agent-{index}"}
+    )
+
+class CostarGeneration:
+    """generate_costar_prompt_basic, generate_basic_analysis e analyze_section_quality"""
+    params = [None]
+
+    def setup(self, _):
+        import main_demo
+        self.module = main_demo
+        self.payloads = [main_demo.PromptData(**data) for data in synthetic_data.prompt_payloads(200)]
+
+    def time_generate_costar_prompt_basic(self, _):
+        for payload in self.payloads:
+            self.module.generate_costar_prompt_basic(payload)
+
+    def time_generate_basic_analysis(self, _):
+        for payload in self.payloads:
+            self.module.generate_basic_analysis(payload)
+
+    def time_analyze_section_quality(self, _):
+        for payload in self.payloads:
+            self.module.analyze_section_quality("contexto", payload.contexto)
+
+class AnonymousQuota:
+    """AnonymousQuotaManager.check_quota / increment_usage com N chaves já registradas"""
+    params = [100, 1_000, 10_000]
+
+    def setup(self, size):
+        import main_demo
+        self.manager = main_demo.AnonymousQuotaManager()
+        synthetic_data.write_json(self.manager.usage_file, synthetic_data.anonymous_usage(size))
+        self.request = _fake_request(size + 1)
+
+    def time_check_quota(self, size):
+        self.manager.check_quota(self.request)
+
+    def time_increment_usage(self, size):
+        self.manager.increment_usage(self.request)
+
+class MemberArea:
+    """MemberAreaService.get_member_profile / check_monthly_quota com N perfis"""
+    params = [100, 1_000, 10_000]
+
+    def setup(self, size):
+        from app.services.member_area_service import MemberAreaService
+        self.service = MemberAreaService()
+        synthetic_data.write_json(self.service.users_file, synthetic_data.member_profiles(size))
+        # Pior caso da busca linear: o último perfil do arquivo
+        self.user_id = f"user-{size - 1}"
+
+    def time_get_member_profile(self, size):
+        self.service.get_member_profile(self.user_id)
+
+    def time_check_monthly_quota(self, size):
+        self.service.check_monthly_quota(self.user_id)
+
+class AdminDashboard:
+    """AdminAnalyticsService.get_dashboard_metrics com N logs de API"""
+    params = [1_000, 10_000, 100_000, 1_000_000]
+
+    def setup(self, size):
+        from app.services.admin_analytics_service import AdminAnalyticsService
+        self.service = AdminAnalyticsService()
+        synthetic_data.write_json(self.service.api_logs_file, synthetic_data.api_usage_logs(size))
+        synthetic_data.write_json(self.service.user_activity_file,
+                                  synthetic_data.user_activities(max(size // 10, 100)))
+
+    def time_get_dashboard_metrics(self, size):
+        self.service.get_dashboard_metrics()
+
+class LogParsing:
+    """parse_log_line sobre um lote de linhas nos formatos conhecidos"""
+    params = [1_000]
+
+    def setup(self, size):
+        from app.routes.member_admin_routes import parse_log_line
+        self.parse = parse_log_line
+        self.lines = synthetic_data.log_lines(size)
+
+    def time_parse_log_line(self, size):
+        for line in self.lines:
+            self.parse(line, "logs/server.log")
+
+BENCHMARK_CLASSES = [CostarGeneration, AnonymousQuota, MemberArea, AdminDashboard, LogParsing]
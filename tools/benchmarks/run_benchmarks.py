@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Runner da suíte de microbenchmarks (tools/benchmarks/bench_suite.py)
+
+Calibra o número de execuções por amostra (timeit.autorange), coleta várias
+amostras e grava cada resultado em histórico JSONL (commit, Python, máquina),
+comparando com a execução anterior do mesmo benchmark.
+
+Uso:
+    python tools/benchmarks/run_benchmarks.py                      # até 100k registros
+    python tools/benchmarks/run_benchmarks.py --max-size 1000000   # inclui 1M logs
+    python tools/benchmarks/run_benchmarks.py -k Dashboard --repeat 7
+    python tools/benchmarks/run_benchmarks.py --history-only       # mostrar histórico
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent.parent
+DEFAULT_HISTORY = BENCH_DIR / "results" / "history.jsonl"
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+def load_history(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_result(history: List[Dict[str, Any]], name: str, param: str) -> Optional[Dict[str, Any]]:
+    for entry in reversed(history):
+        if entry["benchmark"] == name and entry["param"] == param:
+            return entry
+    return None
+
+def measure(func, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Tempo por chamada: mínimo/mediana/média/desvio de `repeat` amostras calibradas"""
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    samples = [value / number for value in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0
+    }
+
+def prepare_workspace() -> str:
+    """Diretório temporário como cwd (serviços gravam em data/ relativo) e imports da aplicação"""
+    workspace = tempfile.mkdtemp(prefix="costar-bench-")
+    for path in (str(BENCH_DIR), str(PROJECT_ROOT / "tools")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # Raiz do projeto sempre na frente: tools/app.py esconderia o pacote app
+    if str(PROJECT_ROOT) in sys.path:
+        sys.path.remove(str(PROJECT_ROOT))
+    sys.path.insert(0, str(PROJECT_ROOT))
+    os.chdir(workspace)
+    return workspace
+
+def run(args: argparse.Namespace) -> int:
+    history_path = Path(args.history)
+    history = load_history(history_path)
+    if args.history_only:
+        for entry in history:
+            print(f"{entry['timestamp'][:19]} {entry['commit']:>9} {entry['benchmark']}[{entry['param']}] "
+                  f"{_format_seconds(entry['median'])}")
+        return 0
+
+    workspace = prepare_workspace()
+    import bench_suite
+
+    commit = _git_commit()
+    environment = {"python": platform.python_version(), "machine": platform.machine(),
+                   "platform": platform.platform(terse=True)}
+    print(f"🧪 Benchmarks em {workspace} (commit {commit}, Python {environment['python']})")
+    pattern = re.compile(args.filter) if args.filter else None
+    regressions = 0
+    skipped = 0
+    new_entries = []
+
+    for cls in bench_suite.BENCHMARK_CLASSES:
+        methods = [name for name in dir(cls) if name.startswith("time_")]
+        for param in cls.params:
+            if param is not None and param > args.max_size:
+                continue
+            selected = [m for m in methods if not pattern or pattern.search(f"{cls.__name__}.{m}")]
+            if not selected:
+                continue
+            instance = cls()
+            try:
+                instance.setup(param)
+            except ImportError as e:
+                # Dependência opcional ausente (ex.: fastapi): pular a classe, não a suíte inteira
+                print(f"  ⏭️ {cls.__name__}[{param}]: pulado ({e})")
+                skipped += 1
+                continue
+            for method_name in selected:
+                name = f"{cls.__name__}.{method_name}"
+                method = getattr(instance, method_name)
+                gc.collect()
+                result = measure(lambda: method(param), args.repeat, args.min_time)
+                param_label = str(param) if param is not None else "-"
+                entry = {"timestamp": datetime.now().isoformat(), "commit": commit, "benchmark": name,
+                         "param": param_label, **environment, **result}
+                new_entries.append(entry)
+
+                line = f"  {name}[{param_label}]: {_format_seconds(result['median'])} " \
+                       f"(min {_format_seconds(result['min'])}, ±{_format_seconds(result['stdev'])}, n={result['number']})"
+                previous = previous_result(history, name, param_label)
+                if previous:
+                    ratio = result["median"] / previous["median"] if previous["median"] else 1.0
+                    marker = "🔴" if ratio > 1 + args.threshold else "🟢" if ratio < 1 - args.threshold else "⚪"
+                    line += f" {marker} {ratio:.2f}x vs {previous['commit']}"
+                    regressions += ratio > 1 + args.threshold
+                print(line)
+
+    if not args.no_save and new_entries:
+        history_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(history_path, "a", encoding="utf-8") as f:
+            for entry in new_entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"📝 {len(new_entries)} resultados adicionados a {history_path}")
+    if skipped:
+        print(f"⏭️ {skipped} benchmark(s) pulados por dependências ausentes")
+    if regressions:
+        print(f"⚠️ {regressions} benchmark(s) mais lentos que o limite de {args.threshold:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos caminhos quentes")
+    parser.add_argument("-k", "--filter", help="regex sobre 'Classe.time_metodo'")
+    parser.add_argument("--max-size", type=int, default=100_000, help="maior tamanho de dataset a executar")
+    parser.add_argument("--repeat", type=int, default=5, help="amostras por benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="duração mínima de cada amostra (s)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="variação considerada significativa")
+    parser.add_argument("--history", default=str(DEFAULT_HISTORY), help="arquivo JSONL de histórico")
+    parser.add_argument("--no-save", action="store_true", help="não gravar no histórico")
+    parser.add_argument("--history-only", action="store_true", help="apenas listar o histórico")
+    parser.add_argument("--fail-on-regression", action="store_true", help="sair com código 1 se houver regressão")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,135 @@
+"""
+Geradores de dados sintéticos para os benchmarks
+Cada gerador é determinístico (semente fixa) e escala pelo número de registros,
+no mesmo formato dos arquivos JSON em data/.
+"""
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+PROVIDERS = ["groq", "gemini", "together", "huggingface", "sistema"]
+PROMPT_TYPES = ["costar", "analysis", "general"]
+ACTIONS = ["login", "logout", "generate_prompt", "save_prompt", "delete_prompt"]
+PLANS = ["free", "premium", "enterprise"]
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def api_usage_logs(count: int, days: int = 30, users: int = 500, seed: int = 1) -> List[Dict[str, Any]]:
+    """Logs de uso da API (formato de APIUsageLog) espalhados pelos últimos `days` dias"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    span_seconds = days * 86400
+    logs = []
+    for _ in range(count):
+        success = rng.random() > 0.05
+        logs.append({
+            "id": _uuid(rng),
+            "provider": rng.choice(PROVIDERS),
+            "user_id": f"user-{rng.randrange(users)}" if rng.random() > 0.3 else None,
+            "prompt_type": rng.choice(PROMPT_TYPES),
+            "request_time": (now - timedelta(seconds=rng.randrange(span_seconds))).isoformat(),
+            "response_time": round(rng.lognormvariate(0, 0.6), 3),
+            "success": success,
+            "error_message": None if success else "HTTP 503",
+            "tokens_used": rng.randrange(100, 3000),
+            "ip_address": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+            "user_agent": "Mozilla/5.0"
+        })
+    return logs
+
+def user_activities(count: int, days: int = 30, users: int = 500, seed: int = 2) -> List[Dict[str, Any]]:
+    """Atividades de usuários (formato de UserActivity)"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    span_seconds = days * 86400
+    return [
+        {
+            "id": _uuid(rng),
+            "user_id": f"user-{rng.randrange(users)}",
+            "action": rng.choice(ACTIONS),
+            "timestamp": (now - timedelta(seconds=rng.randrange(span_seconds))).isoformat(),
+            "details": {},
+            "ip_address": "",
+            "user_agent": ""
+        }
+        for _ in range(count)
+    ]
+
+def member_profiles(count: int, seed: int = 3) -> List[Dict[str, Any]]:
+    """Perfis de membros (formato de UserProfile serializado)"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    profiles = []
+    for index in range(count):
+        created = now - timedelta(days=rng.randrange(365))
+        profiles.append({
+            "user_id": f"user-{index}",
+            "username": f"membro{index}",
+            "email": f"membro{index}@exemplo.com",
+            "subscription_plan": rng.choice(PLANS),
+            "created_at": created.isoformat(),
+            "last_login": (created + timedelta(days=rng.randrange(30))).isoformat(),
+            "preferences": {"default_style": "professional", "default_tone": "neutral", "theme": "light"},
+            "usage_stats": {"total_prompts": rng.randrange(500), "templates_created": rng.randrange(10),
+                            "templates_shared": rng.randrange(5)},
+            "custom_templates": [],
+            "usage_current_month": {"prompts_generated": rng.randrange(60), "api_calls": rng.randrange(100),
+                                    "tokens_used": rng.randrange(50000)}
+        })
+    return profiles
+
+def anonymous_usage(count: int, seed: int = 4) -> Dict[str, Dict[str, Any]]:
+    """Registros de quota anônima (data/anonymous_usage.json) com uso recente"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    this_month = now.strftime('%Y-%m')
+    return {
+        f"{rng.getrandbits(64):016x}": {
+            "daily_usage": {today: rng.randrange(5)},
+            "monthly_usage": {this_month: rng.randrange(20)},
+            "total_usage": rng.randrange(100),
+            "first_used": (now - timedelta(days=rng.randrange(20))).isoformat(),
+            "last_used": (now - timedelta(hours=rng.randrange(48))).isoformat()
+        }
+        for _ in range(count)
+    }
+
+def log_lines(count: int, seed: int = 5) -> List[str]:
+    """Linhas de log nos formatos aceitos por parse_log_line"""
+    rng = random.Random(seed)
+    templates = [
+        "INFO:app.services.production_multi_ai:🚀 [PROD_AI] Tentando provedor: groq",
+        "ERROR:app.services.multi_ai_service:Erro com gemini: HTTP 503",
+        "[2025-01-15 10:23:45] WARNING: Quota quase esgotada para user-42",
+        "INFO:     127.0.0.1:53422 - \"POST /api/prompts/preview HTTP/1.1\" 200 OK",
+        "Traceback (most recent call last): exception in worker",
+    ]
+    return [rng.choice(templates) for _ in range(count)]
+
+def prompt_payloads(count: int, seed: int = 6) -> List[Dict[str, str]]:
+    """Entradas COSTAR variadas (curtas, médias e longas)"""
+    rng = random.Random(seed)
+    words = ("produto", "cliente", "vendas", "suporte", "marketing", "técnico", "curso", "relatório",
+             "estratégia", "conteúdo", "análise", "equipe", "público", "resultado", "campanha")
+
+    def text(low: int, high: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(low, high)))
+
+    return [
+        {
+            "contexto": text(3, 60), "objetivo": text(3, 40), "estilo": text(1, 6),
+            "tom": text(1, 4), "audiencia": text(2, 12), "resposta": text(2, 15)
+        }
+        for _ in range(count)
+    ]
+
+def write_json(path: str, data: Any):
+    """Gravar no mesmo formato compacto-indentado usado pelos serviços"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Relatório de tempo de import (cold start)
+
+Executa `python -X importtime -c "import <módulo>"` em um processo novo e
+resume a saída: tempo total, módulos mais caros (cumulativo e próprio) e
+custo agrupado por pacote de topo. Útil para acompanhar o cold start dos
+entry points serverless (app/api/index.py, railway_main.py).
+
+Uso:
+    python tools/import_time_report.py                       # tools.main_demo
+    python tools/import_time_report.py -m app.api.index --top 30
+    python tools/import_time_report.py -m railway_main --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Converter as linhas 'import time: self | cumulative | nome' em registros"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append({
+            "module": name.strip(),
+            "depth": max(depth, 0),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+    return entries
+
+def summarize(entries: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    by_package: Dict[str, float] = defaultdict(float)
+    for entry in entries:
+        by_package[entry["module"].split(".")[0]] += entry["self_ms"]
+    # Imports de nível 0 somam o custo total (os demais estão contidos neles)
+    total_ms = sum(entry["cumulative_ms"] for entry in entries if entry["depth"] == 0)
+    return {
+        "modules": len(entries),
+        "total_import_ms": round(total_ms, 1),
+        "top_cumulative": sorted(entries, key=lambda e: e["cumulative_ms"], reverse=True)[:top],
+        "top_self": sorted(entries, key=lambda e: e["self_ms"], reverse=True)[:top],
+        "by_package": dict(sorted(((name, round(ms, 1)) for name, ms in by_package.items()),
+                                  key=lambda item: item[1], reverse=True)[:top])
+    }
+
+def run_importtime(module: str, python: str = sys.executable) -> Dict[str, Any]:
+    """Importar `module` em um interpretador limpo e coletar a saída de -X importtime"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    started = time.perf_counter()
+    completed = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    return {"returncode": completed.returncode, "wall_ms": round(wall_ms, 1), "stderr": completed.stderr}
+
+def print_report(module: str, result: Dict[str, Any], summary: Dict[str, Any]):
+    print(f"⏱️ Import de {module}: {summary['total_import_ms']:.1f}ms em {summary['modules']} módulos "
+          f"(processo: {result['wall_ms']:.1f}ms)")
+    print("\n📦 Por pacote (tempo próprio):")
+    for name, ms in summary["by_package"].items():
+        print(f"  {ms:9.1f}ms  {name}")
+    print("\n🐢 Maior tempo cumulativo:")
+    for entry in summary["top_cumulative"]:
+        print(f"  {entry['cumulative_ms']:9.1f}ms  {'  ' * entry['depth']}{entry['module']}")
+    print("\n🔥 Maior tempo próprio:")
+    for entry in summary["top_self"]:
+        print(f"  {entry['self_ms']:9.1f}ms  {entry['module']}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Resumo de python -X importtime")
+    parser.add_argument("-m", "--module", default="tools.main_demo", help="módulo a importar")
+    parser.add_argument("--top", type=int, default=20, help="linhas por seção")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    result = run_importtime(args.module)
+    entries = parse_importtime(result["stderr"])
+    summary = summarize(entries, args.top)
+    if args.json:
+        print(json.dumps({"module": args.module, "wall_ms": result["wall_ms"],
+                          "returncode": result["returncode"], **summary}, ensure_ascii=False, indent=2))
+    else:
+        print_report(args.module, result, summary)
+    if result["returncode"] != 0:
+        error = result["stderr"].strip().splitlines()[-1:] or ["erro desconhecido"]
+        print(f"\n❌ Import falhou: {error[0]}", file=sys.stderr)
+    return result["returncode"]
+
+if __name__ == "__main__":
+    sys.exit(main())
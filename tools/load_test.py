@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga ponta a ponta para a API (tools/main_demo.app)
+
+Executa um cenário JSON (mix ponderado de requisições) contra um servidor
+em execução ou dentro do processo via ASGI, e gera relatório em JSON e HTML
+com throughput, latências p50/p95/p99, taxa de erro e tempos por etapa
+(header Server-Timing). Pode comparar com um baseline e sinalizar regressões.
+
+Uso:
+    # Em processo, com provedores apontando para o mock local
+    python tools/mock_llm_server.py --port 8900 &
+    python tools/load_test.py tools/load_scenarios/mixed.json --in-process \
+        --mock-base-url http://127.0.0.1:8900 --report reports/mixed
+
+    # Contra um servidor em execução, comparando com um baseline salvo
+    python tools/load_test.py tools/load_scenarios/preview.json --base-url http://localhost:8000 \
+        --baseline reports/baseline.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import contextlib
+import html
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+_ENV_PATTERN = re.compile(r"\$\{([A-Z0-9_]+)(?::([^}]*))?\}")
+
+# ==================== CENÁRIO ====================
+
+def _expand(value: Any, counter: int = 0) -> Any:
+    """Expandir ${VAR} / ${VAR:padrão} e {n} (contador da requisição) em strings do cenário"""
+    if isinstance(value, str):
+        value = _ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), m.group(2) or ""), value)
+        return value.replace("{n}", str(counter))
+    if isinstance(value, dict):
+        return {key: _expand(item, counter) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item, counter) for item in value]
+    return value
+
+def load_scenario(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        scenario = json.load(f)
+    scenario.setdefault("name", Path(path).stem)
+    scenario.setdefault("duration", 30)
+    scenario.setdefault("concurrency", 10)
+    scenario.setdefault("warmup", 0)
+    scenario.setdefault("rate", None)
+    scenario.setdefault("auth", {})
+    if not scenario.get("requests"):
+        raise ValueError("Cenário sem requisições ('requests')")
+    for request in scenario["requests"]:
+        request.setdefault("method", "GET")
+        request.setdefault("weight", 1)
+        request.setdefault("expect", [200])
+        request.setdefault("name", f"{request['method']} {request['path']}")
+    return scenario
+
+# ==================== ESTATÍSTICAS ====================
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rank mais próximo (valores já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """'quota;dur=1.2, ai_groq;dur=830.5' -> {'quota': 1.2, 'ai_groq': 830.5}"""
+    stages = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        match = re.search(r"dur=([0-9.]+)", params)
+        if name and match:
+            stages[name] = float(match.group(1))
+    return stages
+
+class Results:
+    """Amostras coletadas durante a execução"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: Dict[str, List[str]] = defaultdict(list)
+        self.stages: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    def record(self, name: str, latency: float, status: Optional[int], ok: bool,
+               stages: Optional[Dict[str, float]] = None, error: Optional[str] = None):
+        self.latencies[name].append(latency)
+        self.statuses[name][str(status) if status is not None else "exception"] += 1
+        if not ok:
+            self.errors[name] += 1
+            if error and len(self.error_samples[name]) < 5:
+                self.error_samples[name].append(error)
+        for stage, duration_ms in (stages or {}).items():
+            self.stages[name][stage].append(duration_ms)
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "min_ms": round(ordered[0] * 1000, 2) if ordered else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+def summarize(results: Results, scenario: Dict[str, Any], target: str) -> Dict[str, Any]:
+    """Relatório agregado (por requisição e geral)"""
+    elapsed = max(results.finished_at - results.started_at, 1e-9)
+    all_latencies = [value for values in results.latencies.values() for value in values]
+    total = len(all_latencies)
+    total_errors = sum(results.errors.values())
+    per_request = {}
+    for name, values in sorted(results.latencies.items()):
+        stage_summary = {}
+        for stage, durations in results.stages[name].items():
+            ordered = sorted(durations)
+            stage_summary[stage] = {
+                "mean_ms": round(sum(ordered) / len(ordered), 2),
+                "p95_ms": round(percentile(ordered, 95), 2),
+                "samples": len(ordered)
+            }
+        per_request[name] = {
+            "count": len(values),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "error_rate": round(results.errors[name] / len(values), 4),
+            "statuses": dict(results.statuses[name]),
+            "latency": _latency_summary(values),
+            "stages": stage_summary,
+            "error_samples": results.error_samples.get(name, [])
+        }
+    return {
+        "scenario": scenario["name"],
+        "target": target,
+        "started_at": datetime.now().isoformat(),
+        "duration_s": round(elapsed, 2),
+        "concurrency": scenario["concurrency"],
+        "overall": {
+            "count": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "error_rate": round(total_errors / total, 4) if total else 0.0,
+            "latency": _latency_summary(all_latencies)
+        },
+        "requests": per_request
+    }
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any],
+                        max_regression: float = 0.10, max_error_increase: float = 0.01) -> List[Dict[str, Any]]:
+    """Regressões de p95/p99, throughput e taxa de erro em relação ao baseline"""
+    regressions = []
+
+    def check(scope: str, current: Dict[str, Any], previous: Dict[str, Any]):
+        for metric in ("p95_ms", "p99_ms"):
+            before, after = previous["latency"].get(metric, 0), current["latency"].get(metric, 0)
+            if before > 0 and after > before * (1 + max_regression):
+                regressions.append({"scope": scope, "metric": metric, "baseline": before, "current": after,
+                                    "change_pct": round((after / before - 1) * 100, 1)})
+        before, after = previous.get("throughput_rps", 0), current.get("throughput_rps", 0)
+        if before > 0 and after < before * (1 - max_regression):
+            regressions.append({"scope": scope, "metric": "throughput_rps", "baseline": before, "current": after,
+                                "change_pct": round((after / before - 1) * 100, 1)})
+        before, after = previous.get("error_rate", 0), current.get("error_rate", 0)
+        if after > before + max_error_increase:
+            regressions.append({"scope": scope, "metric": "error_rate", "baseline": before, "current": after,
+                                "change_pct": round((after - before) * 100, 2)})
+
+    check("overall", report["overall"], baseline["overall"])
+    for name, current in report["requests"].items():
+        if name in baseline.get("requests", {}):
+            check(name, current, baseline["requests"][name])
+    return regressions
+
+# ==================== RELATÓRIO HTML ====================
+
+def render_html(report: Dict[str, Any], regressions: Optional[List[Dict[str, Any]]] = None) -> str:
+    esc = html.escape
+    rows = []
+    for name, data in report["requests"].items():
+        latency = data["latency"]
+        stages = ", ".join(f"{esc(stage)}: {info['mean_ms']}ms" for stage, info in data["stages"].items()) or "-"
+        rows.append(
+            f"<tr><td>{esc(name)}</td><td>{data['count']}</td><td>{data['throughput_rps']}</td>"
+            f"<td>{latency['p50_ms']}</td><td>{latency['p95_ms']}</td><td>{latency['p99_ms']}</td>"
+            f"<td>{data['error_rate'] * 100:.2f}%</td><td>{esc(json.dumps(data['statuses']))}</td>"
+            f"<td>{stages}</td></tr>"
+        )
+    regression_html = ""
+    if regressions is not None:
+        if regressions:
+            items = "".join(
+                f"<li><b>{esc(r['scope'])}</b> {esc(r['metric'])}: {r['baseline']} → {r['current']} "
+                f"({r['change_pct']:+}%)</li>" for r in regressions
+            )
+            regression_html = f"<h2 class='bad'>⚠️ Regressões em relação ao baseline</h2><ul>{items}</ul>"
+        else:
+            regression_html = "<h2 class='good'>✅ Sem regressões em relação ao baseline</h2>"
+    overall = report["overall"]
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Load test - {esc(report['scenario'])}</title>
+<style>
+body {{ font-family: system-ui, sans-serif; margin: 2rem; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ border: 1px solid #ddd; padding: .4rem .6rem; text-align: left; font-size: .9rem; }}
+th {{ background: #f3f3f3; }} .bad {{ color: #b00020; }} .good {{ color: #1b5e20; }}
+</style></head><body>
+<h1>Cenário: {esc(report['scenario'])}</h1>
+<p>Alvo: {esc(report['target'])} · Duração: {report['duration_s']}s · Concorrência: {report['concurrency']}</p>
+<p><b>{overall['count']}</b> requisições · <b>{overall['throughput_rps']}</b> req/s ·
+p50 {overall['latency']['p50_ms']}ms · p95 {overall['latency']['p95_ms']}ms · p99 {overall['latency']['p99_ms']}ms ·
+erros {overall['error_rate'] * 100:.2f}%</p>
+{regression_html}
+<table><tr><th>Requisição</th><th>Total</th><th>req/s</th><th>p50 (ms)</th><th>p95 (ms)</th><th>p99 (ms)</th>
+<th>Erros</th><th>Status</th><th>Etapas (média)</th></tr>
+{''.join(rows)}
+</table></body></html>
+"""
+
+# ==================== EXECUÇÃO ====================
+
+def build_client(args: argparse.Namespace):
+    """
+    Cliente HTTP para servidor remoto ou app ASGI no mesmo processo
+    Retorna (cliente, alvo, lifespan); o ASGITransport não dispara o lifespan,
+    então no modo em processo ele é executado à parte em volta da rodada
+    """
+    import httpx
+
+    if args.in_process:
+        if args.mock_base_url:
+            os.environ["AI_MOCK_BASE_URL"] = args.mock_base_url
+        # main_demo importa app.* a partir da raiz e rotas importam main_demo diretamente;
+        # a raiz vem antes de tools/ para tools/app.py não esconder o pacote app
+        for position, path in enumerate((str(PROJECT_ROOT), str(PROJECT_ROOT / "tools"))):
+            if path in sys.path:
+                sys.path.remove(path)
+            sys.path.insert(position, path)
+        os.chdir(PROJECT_ROOT)
+        import main_demo
+        transport = httpx.ASGITransport(app=main_demo.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+        return client, "in-process", main_demo.app.router.lifespan_context(main_demo.app)
+    return httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout), args.base_url, contextlib.nullcontext()
+
+async def login_roles(client, scenario: Dict[str, Any]) -> Dict[str, str]:
+    """Obter um token por papel declarado em scenario['auth']"""
+    tokens = {}
+    for role, credentials in scenario["auth"].items():
+        credentials = _expand(credentials)
+        path = credentials.pop("login_path", "/api/members/auth/login")
+        response = await client.post(path, json=credentials)
+        if response.status_code != 200:
+            raise RuntimeError(f"Login de '{role}' falhou: HTTP {response.status_code} {response.text[:200]}")
+        tokens[role] = response.json()["access_token"]
+        print(f"🔑 Token obtido para '{role}'")
+    return tokens
+
+async def run_scenario(client, scenario: Dict[str, Any], tokens: Dict[str, str], seed: int) -> Results:
+    results = Results()
+    rng = random.Random(seed)
+    requests = scenario["requests"]
+    weights = [request["weight"] for request in requests]
+    counter = 0
+    rate = scenario.get("rate")
+    next_slot = time.perf_counter()
+    warmup_until = time.perf_counter() + scenario["warmup"]
+    stop_at = warmup_until + scenario["duration"]
+
+    async def pace():
+        # Modelo aberto: com 'rate' as requisições saem em intervalos fixos, independente da latência
+        nonlocal next_slot
+        if not rate:
+            return
+        now = time.perf_counter()
+        slot = max(next_slot, now)
+        next_slot = slot + 1 / rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def worker():
+        nonlocal counter
+        while time.perf_counter() < stop_at:
+            await pace()
+            spec = rng.choices(requests, weights=weights)[0]
+            counter += 1
+            prepared = _expand(spec, counter)
+            headers = dict(prepared.get("headers", {}))
+            if spec.get("auth"):
+                headers["Authorization"] = f"Bearer {tokens[spec['auth']]}"
+            started = time.perf_counter()
+            status, error, stages = None, None, None
+            try:
+                response = await client.request(prepared["method"], prepared["path"], headers=headers,
+                                                params=prepared.get("params"), json=prepared.get("json"))
+                await response.aread()
+                status = response.status_code
+                stages = parse_server_timing(response.headers.get("server-timing", ""))
+                if status not in spec["expect"]:
+                    error = f"HTTP {status}: {response.text[:120]}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            latency = time.perf_counter() - started
+            if started >= warmup_until:
+                results.record(spec["name"], latency, status, error is None, stages, error)
+            think = spec.get("think_time", scenario.get("think_time", 0))
+            if think:
+                await asyncio.sleep(think)
+
+    print(f"🚀 {scenario['name']}: {scenario['concurrency']} workers por {scenario['duration']}s "
+          f"(aquecimento {scenario['warmup']}s{f', {rate} req/s' if rate else ''})")
+    results.started_at = warmup_until
+    await asyncio.gather(*(worker() for _ in range(scenario["concurrency"])))
+    results.finished_at = time.perf_counter()
+    return results
+
+def print_summary(report: Dict[str, Any], regressions: Optional[List[Dict[str, Any]]]):
+    overall = report["overall"]
+    print(f"\n📊 {overall['count']} requisições em {report['duration_s']}s → {overall['throughput_rps']} req/s, "
+          f"erros {overall['error_rate'] * 100:.2f}%")
+    print(f"{'requisição':<32}{'total':>8}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'erros':>9}")
+    for name, data in report["requests"].items():
+        latency = data["latency"]
+        print(f"{name[:31]:<32}{data['count']:>8}{data['throughput_rps']:>9}{latency['p50_ms']:>10}"
+              f"{latency['p95_ms']:>10}{latency['p99_ms']:>10}{data['error_rate'] * 100:>8.2f}%")
+    if regressions:
+        print("\n⚠️ Regressões:")
+        for r in regressions:
+            print(f"   {r['scope']} {r['metric']}: {r['baseline']} → {r['current']} ({r['change_pct']:+}%)")
+    elif regressions is not None:
+        print("\n✅ Sem regressões em relação ao baseline")
+
+async def main_async(args: argparse.Namespace) -> int:
+    scenario = load_scenario(args.scenario)
+    for key in ("duration", "concurrency", "rate", "warmup"):
+        if getattr(args, key) is not None:
+            scenario[key] = getattr(args, key)
+
+    client, target, app_lifespan = build_client(args)
+    # Lifespan do app (barramento de analytics, monitores, warm-up) ativo durante toda a rodada
+    async with app_lifespan, client:
+        tokens = await login_roles(client, scenario)
+        results = await run_scenario(client, scenario, tokens, args.seed)
+
+    report = summarize(results, scenario, target)
+    regressions = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.max_regression, args.max_error_increase)
+        report["regressions"] = regressions
+
+    print_summary(report, regressions)
+    if args.report:
+        base = Path(args.report)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        base.with_suffix(".json").write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        base.with_suffix(".html").write_text(render_html(report, regressions), encoding="utf-8")
+        print(f"📝 Relatórios: {base.with_suffix('.json')} e {base.with_suffix('.html')}")
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"📌 Baseline salvo em {args.save_baseline}")
+    return 1 if regressions else 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Teste de carga da API COSTAR a partir de cenários JSON")
+    parser.add_argument("scenario", help="arquivo de cenário (ex.: tools/load_scenarios/mixed.json)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--base-url", default="http://localhost:8000", help="servidor em execução")
+    target.add_argument("--in-process", action="store_true", help="executar o app ASGI no mesmo processo")
+    parser.add_argument("--mock-base-url", help="AI_MOCK_BASE_URL para o modo em processo (tools/mock_llm_server.py)")
+    parser.add_argument("--duration", type=float, help="sobrescrever duração do cenário (s)")
+    parser.add_argument("--concurrency", type=int, help="sobrescrever número de workers")
+    parser.add_argument("--rate", type=float, help="taxa fixa de chegada (req/s) em vez de laço fechado")
+    parser.add_argument("--warmup", type=float, help="segundos iniciais descartados")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por requisição (s)")
+    parser.add_argument("--seed", type=int, default=1, help="semente do sorteio do mix")
+    parser.add_argument("--report", help="prefixo dos relatórios .json/.html")
+    parser.add_argument("--baseline", help="relatório JSON anterior para comparação")
+    parser.add_argument("--save-baseline", help="salvar este relatório como baseline")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="piora tolerada em p95/p99/throughput")
+    parser.add_argument("--max-error-increase", type=float, default=0.01, help="aumento tolerado na taxa de erro")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
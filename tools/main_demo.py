@@ -1,16 +1,26 @@
 from fastapi import FastAPI, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
 import json
+import asyncio
 from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 import time
 import hashlib
+import sys
+from pathlib import Path
+
+# Executado como script (python tools/main_demo.py), sys.path[0] é tools/ e tools/app.py
+# esconderia o pacote app: a raiz do projeto vai na frente antes dos imports de app.*
+PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
+if PROJECT_ROOT in sys.path:
+    sys.path.remove(PROJECT_ROOT)
+sys.path.insert(0, PROJECT_ROOT)
 
 # Caregar variáveis de ambiente
 load_dotenv()
@@ -19,6 +29,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from app.services.deadline import Deadline
+from app.services.admission_control import ANONYMOUS, AdmissionRejected, get_admission_controller, resolve_plan_from_token
+from app.services.metrics import (
+    AI_FALLBACKS, CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT,
+    QUOTA_CHECK_DURATION, get_metrics_registry, timed
+)
+from app.services.request_timing import log_if_slow, span, start_request
+from app.services.loop_monitor import LOOP_MONITOR_ENABLED, get_loop_monitor
+from app.services.provider_health import PROVIDER_HEALTH_ENABLED, get_provider_health_monitor
+from app.services.analytics_events import ANALYTICS_ASYNC_ENABLED, get_analytics_event_bus, track_api_usage
+from app.services.latency_histograms import DIMENSION_ROUTE, get_latency_store
+from app.services.analytics_compaction import ANALYTICS_COMPACTION_ENABLED, get_compaction_job
+from contextlib import asynccontextmanager
+
+# Orçamento total do preview com IA (inclui a reserva do fallback básico)
+PREVIEW_DEADLINE_SECONDS = float(os.getenv("PREVIEW_DEADLINE_SECONDS", "30"))
+
 # Sistema de controle de quota para usuários anônimos
 class AnonymousQuotaManager:
     def __init__(self):
@@ -72,6 +99,7 @@ class AnonymousQuotaManager:
         
         return cleaned_data
     
+    @timed(QUOTA_CHECK_DURATION.labels("check"), span_name="quota")
     def check_quota(self, request: Request) -> Dict[str, Any]:
         """Verificar se usuário anônimo pode fazer uma requisição"""
         user_key = self._get_user_key(request)
@@ -128,6 +156,7 @@ class AnonymousQuotaManager:
             'monthly_used': monthly_count
         }
     
+    @timed(QUOTA_CHECK_DURATION.labels("increment"), span_name="quota_write")
     def increment_usage(self, request: Request) -> bool:
         """Incrementar uso do usuário anônimo"""
         user_key = self._get_user_key(request)
@@ -176,11 +205,67 @@ class AnonymousQuotaManager:
 # Instanciar gerenciador de quota anônima
 anonymous_quota = AnonymousQuotaManager()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicialização e encerramento de tarefas de fundo do worker"""
+    if LOOP_MONITOR_ENABLED:
+        get_loop_monitor().start()
+    if ANALYTICS_ASYNC_ENABLED:
+        get_analytics_event_bus().start()
+    if ANALYTICS_COMPACTION_ENABLED:
+        get_compaction_job().start()
+    await warm_up_services()
+    yield
+    await get_provider_health_monitor().stop()
+    await get_compaction_job().stop()
+    await get_analytics_event_bus().stop()
+    await get_loop_monitor().stop()
+    await close_services()
+
+async def warm_up_services():
+    """Warm-up: serviço de dados (teste do Supabase fora do loop) e pool/credenciais dos provedores"""
+    loop = asyncio.get_running_loop()
+    try:
+        from app.services.integrated_data_service import get_data_service
+        await loop.run_in_executor(None, get_data_service)
+    except Exception as e:
+        logger.warning(f"⚠️ [WARMUP] Serviço de dados indisponível: {e}")
+    try:
+        # Histogramas de latência por provedor a partir dos logs gravados (sobrevive a restart)
+        from app.services.admin_analytics_service import get_admin_analytics_service
+        loaded = await loop.run_in_executor(None, get_admin_analytics_service().bootstrap_latency)
+        logger.info(f"📊 [WARMUP] {loaded} latências do histórico carregadas")
+    except Exception as e:
+        logger.warning(f"⚠️ [WARMUP] Histórico de latência indisponível: {e}")
+
+    if not PROVIDER_HEALTH_ENABLED:
+        return
+    try:
+        from app.services.production_multi_ai import get_multi_ai_service
+        if not get_multi_ai_service().providers:
+            return
+    except Exception as e:
+        logger.warning(f"⚠️ [WARMUP] Multi-IA indisponível: {e}")
+        return
+    monitor = get_provider_health_monitor()
+    await monitor.warm_up()
+    monitor.start()
+
+async def close_services():
+    """Fechar o pool de conexões dos provedores, se foi criado"""
+    try:
+        from app.services import production_multi_ai
+        if production_multi_ai._multi_ai_service is not None:
+            await production_multi_ai._multi_ai_service.aclose()
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao fechar conexões dos provedores: {e}")
+
 # Inicializar FastAPI
 app = FastAPI(
     title="COSTAR Prompt Generator API - Demo Mode",
     description="API para geração e gerenciamento de prompts estruturados COSTAR (Modo Demonstração)",
-    version="1.0.0-demo"
+    version="1.0.0-demo",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -192,6 +277,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """Latência por rota (template, não a URL) e requisições em andamento"""
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_DURATION.labels(
+            request.method, getattr(route, "path", "unmatched"), status_code
+        ).observe(elapsed)
+        if route is not None:
+            # Histograma por rota e hora para percentis em janelas arbitrárias
+            get_latency_store().record(DIMENSION_ROUTE, f"{request.method} {route.path}", elapsed)
+
+# Endpoints com quebra por etapa no header Server-Timing
+SERVER_TIMING_PATHS = {"/api/prompts/preview", "/api/prompts/analyze", "/api/members/generate-prompt"}
+
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    """Header Server-Timing e log de requisições lentas nos endpoints de geração"""
+    if request.url.path not in SERVER_TIMING_PATHS:
+        return await call_next(request)
+    timings = start_request(request.method, request.url.path)
+    response = await call_next(request)
+    response.headers["Server-Timing"] = timings.server_timing_header()
+    log_if_slow(timings, response.status_code)
+    return response
+
 # Endpoint raiz
 @app.get("/")
 async def root():
@@ -354,18 +474,6 @@ except ImportError as e:
 except Exception as e:
     logger.error(f"❌ Erro ao carregar rotas de membros/admin: {e}")
 
-# Importar serviço de analytics para logging
-try:
-    from app.services.admin_analytics_service import AdminAnalyticsService
-    analytics_service = AdminAnalyticsService()
-    logger.info("✅ Serviço de analytics carregado com sucesso")
-except ImportError as e:
-    logger.warning(f"⚠️ Não foi possível carregar serviço de analytics: {e}")
-    analytics_service = None
-except Exception as e:
-    logger.error(f"❌ Erro ao carregar serviço de analytics: {e}")
-    analytics_service = None
-
 # Tentar importar e incluir as rotas de status
 try:
     from app.routes.status_routes import router as status_router
@@ -455,8 +563,12 @@ async def health_check():
     }
 
 @app.post("/api/prompts/preview")
-async def preview_prompt(prompt_data: PromptData, request: Request):
-    """Gerar preview do prompt COSTAR (modo demo com quota)"""
+async def preview_prompt(prompt_data: PromptData, request: Request, progressive: bool = False):
+    """Gerar preview do prompt COSTAR (modo demo com quota)
+
+    Com `?progressive=true` (ou Accept: application/x-ndjson) a resposta é um
+    stream NDJSON: primeiro o prompt básico, depois a versão aprimorada pela IA.
+    """
     try:
         logger.info(f"🎯 [PREVIEW] Recebendo requisição de preview")
         logger.info(f"📋 [PREVIEW] Dados: contexto={prompt_data.contexto[:30]}..., objetivo={prompt_data.objetivo[:30]}...")
@@ -488,9 +600,82 @@ async def preview_prompt(prompt_data: PromptData, request: Request):
             
             logger.info(f"✅ [PREVIEW] Quota OK para anônimo - Diário: {quota_check['daily_remaining']}, Mensal: {quota_check['monthly_remaining']}")
         
-        # Gerar prompt COSTAR com múltiplas IAs
-        if ai_enabled:
-            logger.info("🤖 [PREVIEW] AI habilitada, iniciando processo de IA")
+        # Prompt básico gerado em paralelo: fica pronto como fallback instantâneo
+        basic_future = start_basic_generation(prompt_data)
+        deadline = Deadline(PREVIEW_DEADLINE_SECONDS)
+        
+        # Incrementar uso se não autenticado
+        if not is_authenticated:
+            anonymous_quota.increment_usage(request)
+            logger.info("📊 [PREVIEW] Uso incrementado para usuário anônimo")
+        
+        progressive = progressive or "application/x-ndjson" in request.headers.get("accept", "")
+        if progressive and ai_enabled:
+            logger.info("📡 [PREVIEW] Modo progressivo: básico primeiro, IA quando pronta")
+            return StreamingResponse(
+                _stream_progressive_preview(prompt_data, request, auth_header, is_authenticated,
+                                            deadline, basic_future),
+                media_type="application/x-ndjson"
+            )
+        
+        prompt_aprimorado, shed_reason = await _generate_preview_prompt(
+            prompt_data, auth_header, is_authenticated, deadline, basic_future
+        )
+        modo = _detect_preview_mode(prompt_aprimorado, shed_reason)
+        return _build_preview_response(prompt_data, prompt_aprimorado, modo, request, is_authenticated)
+        
+    except Exception as e:
+        logger.error(f"Erro ao gerar preview do prompt: {e}")
+        # Fallback para versão básica
+        prompt_basico = generate_costar_prompt_basic(prompt_data)
+        return {
+            "message": "Preview gerado com sucesso (modo básico)",
+            "prompt_original": prompt_data.dict(),
+            "prompt_aprimorado": prompt_basico,
+            "timestamp": datetime.now().isoformat(),
+            "modo": "Básico (fallback)"
+        }
+
+def start_basic_generation(prompt_data: PromptData) -> "asyncio.Future[str]":
+    """Gerar o prompt básico numa thread, em paralelo à chamada de IA"""
+    return asyncio.get_running_loop().run_in_executor(None, generate_costar_prompt_basic, prompt_data)
+
+async def resolve_basic_prompt(prompt_data: PromptData, basic_future: Optional["asyncio.Future[str]"]) -> str:
+    """Prompt básico já calculado (ou calculado agora, se a geração especulativa falhou)"""
+    with span("fallback"):
+        if basic_future is not None and not basic_future.cancelled():
+            try:
+                # shield: um timeout de quem aguarda não deve cancelar o cálculo compartilhado
+                return await asyncio.shield(basic_future)
+            except Exception as e:
+                logger.warning(f"⚠️ [PREVIEW] Geração básica especulativa falhou: {e}")
+        return generate_costar_prompt_basic(prompt_data)
+
+def resolve_request_plan(token: Optional[str]) -> str:
+    """Plano do JWT, validado com o mesmo segredo e algoritmo do serviço que emite os tokens"""
+    if not token:
+        return ANONYMOUS
+    try:
+        from app.services.supabase_auth_service import get_auth_service
+        auth_service = get_auth_service()
+    except Exception as e:
+        logger.warning(f"⚠️ [ADMISSION] Serviço de autenticação indisponível, tratando como anônimo: {e}")
+        return ANONYMOUS
+    return resolve_plan_from_token(token, auth_service.jwt_secret, auth_service.jwt_algorithm)
+
+async def _generate_preview_prompt(prompt_data: PromptData, auth_header: Optional[str], is_authenticated: bool,
+                                   deadline: Deadline, basic_future: "asyncio.Future[str]"):
+    """Gerar o prompt do preview com IA; retorna (prompt, motivo do descarte ou None)"""
+    if not ai_enabled:
+        logger.info("🔧 [PREVIEW] AI DESABILITADA, usando geração básica")
+        # Usar geração básica sem IA
+        return await resolve_basic_prompt(prompt_data, basic_future), None
+    
+    logger.info("🤖 [PREVIEW] AI habilitada, iniciando processo de IA")
+    # Admissão por prioridade de plano: sob saturação, planos menores vão direto ao modo básico
+    plan = resolve_request_plan(auth_header[7:] if is_authenticated else None)
+    try:
+        async with get_admission_controller().admit(plan, timeout=deadline.available()):
             # Usar sistema de múltiplas IAs (versão produção)
             try:
                 logger.info("📦 [PREVIEW] Importando get_multi_ai_service...")
@@ -502,20 +687,23 @@ async def preview_prompt(prompt_data: PromptData, request: Request):
                 logger.info(f"✅ [PREVIEW] Serviço obtido. Provedores: {len(service.providers)}")
                 logger.info(f"📋 [PREVIEW] Provedores disponíveis: {list(service.providers.keys())}")
                 
-                # Usar timeout para evitar travamento
-                import asyncio
-                logger.info("⏰ [PREVIEW] Iniciando geração com timeout de 30s...")
+                # Orçamento único da requisição; com o básico já pronto, o fallback é imediato
+                logger.info(f"⏰ [PREVIEW] Iniciando geração com orçamento de {deadline.budget:.0f}s...")
                 
-                prompt_aprimorado = await asyncio.wait_for(
-                    generate_costar_prompt_with_multi_ai(prompt_data, service),
-                    timeout=30.0  # 30 segundos de timeout
-                )
+                with span("ai"):
+                    prompt_aprimorado = await asyncio.wait_for(
+                        generate_costar_prompt_with_multi_ai(prompt_data, service, deadline=deadline,
+                                                             basic_future=basic_future),
+                        timeout=max(deadline.available(), 0.1)
+                    )
                 logger.info(f"✅ [PREVIEW] Prompt gerado com IA: {len(prompt_aprimorado)} caracteres")
                 logger.info(f"🎨 [PREVIEW] Preview do resultado: {prompt_aprimorado[:100]}...")
+                return prompt_aprimorado, None
                 
             except asyncio.TimeoutError:
-                logger.warning("⏰ [PREVIEW] TIMEOUT na geração com AI (30s), usando fallback")
-                prompt_aprimorado = generate_costar_prompt_basic(prompt_data)
+                logger.warning(f"⏰ [PREVIEW] TIMEOUT na geração com AI ({deadline}), usando fallback")
+                AI_FALLBACKS.labels("preview", "timeout").inc()
+                return await resolve_basic_prompt(prompt_data, basic_future), None
             except ImportError as e:
                 logger.warning(f"⚠️ [PREVIEW] ERRO importando ProductionMultiAI: {e}")
                 # Fallback para versão original
@@ -523,100 +711,124 @@ async def preview_prompt(prompt_data: PromptData, request: Request):
                     logger.info("🔄 [PREVIEW] Tentando MultiAIService original...")
                     from app.services.multi_ai_service import MultiAIService
                     multi_ai_service = MultiAIService()
-                    prompt_aprimorado = await generate_costar_prompt_with_multi_ai(prompt_data, multi_ai_service)
+                    prompt_aprimorado = await asyncio.wait_for(
+                        generate_costar_prompt_with_multi_ai(prompt_data, multi_ai_service, deadline=deadline,
+                                                             basic_future=basic_future),
+                        timeout=max(deadline.available(), 0.1)
+                    )
+                    return prompt_aprimorado, None
                 except Exception as fallback_error:
                     logger.error(f"❌ [PREVIEW] Fallback MultiAIService falhou: {fallback_error}")
-                    prompt_aprimorado = generate_costar_prompt_basic(prompt_data)
+                    AI_FALLBACKS.labels("preview", "error").inc()
+                    return await resolve_basic_prompt(prompt_data, basic_future), None
             except Exception as e:
                 logger.error(f"❌ [PREVIEW] ERRO na geração com AI: {str(e)}")
                 logger.error(f"🔧 [PREVIEW] Tipo do erro: {type(e).__name__}")
                 # Fallback para modo básico
-                prompt_aprimorado = generate_costar_prompt_basic(prompt_data)
                 logger.info("🔄 [PREVIEW] Usando modo básico como fallback")
-        else:
-            logger.info("🔧 [PREVIEW] AI DESABILITADA, usando geração básica")
-            # Usar geração básica sem IA
-            prompt_aprimorado = generate_costar_prompt_basic(prompt_data)
-        
-        # Incrementar uso se não autenticado
-        if not is_authenticated:
-            anonymous_quota.increment_usage(request)
-            logger.info("📊 [PREVIEW] Uso incrementado para usuário anônimo")
-        
-        # Determinar modo baseado no conteúdo do prompt
-        modo = "Básico (sem IA)"
-        if ai_enabled:
-            # Verificar se tem estrutura COSTAR completa (formato específico)
-            costar_patterns = [
-                "**Context (Contexto)**", "**Objective (Objetivo)**", "**Style (Estilo)**",
-                "**Tone (Tom)**", "**Audience (Audiência)**", "**Response (Formato de Resposta)**"
-            ]
-            
-            # Contar quantas seções COSTAR estão presentes
-            costar_sections_found = sum(1 for pattern in costar_patterns if pattern in prompt_aprimorado)
-            
-            # Verificar variações alternativas
-            alternative_patterns = [
-                "**CONTEXTO**", "**OBJETIVO**", "**ESTILO**",
-                "**TOM**", "**AUDIÊNCIA**", "**RESPOSTA**"
-            ]
-            alt_sections_found = sum(1 for pattern in alternative_patterns if pattern in prompt_aprimorado)
-            
-            total_sections = max(costar_sections_found, alt_sections_found)
-            
-            if total_sections >= 4 and len(prompt_aprimorado) > 800:
-                modo = "Multi-AI aprimorado"
-            elif total_sections >= 3 and len(prompt_aprimorado) > 600:
-                modo = "Multi-AI processado"
-            elif "fallback inteligente" in prompt_aprimorado.lower():
-                modo = "Multi-AI (HuggingFace)"
-            elif len(prompt_aprimorado) > 400:
-                modo = "AI processado"
-            elif "fallback" in prompt_aprimorado.lower():
-                modo = "Fallback básico"
-        
-        # Incluir informações de quota na resposta se não autenticado
-        response_data = {
-            "message": "Preview gerado com sucesso (modo demo)",
-            "prompt_original": {
-                "contexto": prompt_data.contexto,
-                "objetivo": prompt_data.objetivo,
-                "estilo": prompt_data.estilo,
-                "tom": prompt_data.tom,
-                "audiencia": prompt_data.audiencia,
-                "resposta": prompt_data.resposta
-            },
-            "prompt_aprimorado": prompt_aprimorado,
-            "timestamp": datetime.now().isoformat(),
-            "modo": modo
+                AI_FALLBACKS.labels("preview", "error").inc()
+                return await resolve_basic_prompt(prompt_data, basic_future), None
+    except AdmissionRejected as e:
+        logger.warning(f"🚦 [PREVIEW] Requisição descartada ({e.plan}): {e.reason}, usando modo básico")
+        AI_FALLBACKS.labels("preview", "shed").inc()
+        return await resolve_basic_prompt(prompt_data, basic_future), e.reason
+
+def _detect_preview_mode(prompt_aprimorado: str, shed_reason: Optional[str] = None) -> str:
+    """Determinar modo baseado no conteúdo do prompt"""
+    if shed_reason:
+        return "Básico (alta demanda)"
+    
+    modo = "Básico (sem IA)"
+    if ai_enabled:
+        # Verificar se tem estrutura COSTAR completa (formato específico)
+        costar_patterns = [
+            "**Context (Contexto)**", "**Objective (Objetivo)**", "**Style (Estilo)**",
+            "**Tone (Tom)**", "**Audience (Audiência)**", "**Response (Formato de Resposta)**"
+        ]
+        
+        # Contar quantas seções COSTAR estão presentes
+        costar_sections_found = sum(1 for pattern in costar_patterns if pattern in prompt_aprimorado)
+        
+        # Verificar variações alternativas
+        alternative_patterns = [
+            "**CONTEXTO**", "**OBJETIVO**", "**ESTILO**",
+            "**TOM**", "**AUDIÊNCIA**", "**RESPOSTA**"
+        ]
+        alt_sections_found = sum(1 for pattern in alternative_patterns if pattern in prompt_aprimorado)
+        
+        total_sections = max(costar_sections_found, alt_sections_found)
+        
+        if total_sections >= 4 and len(prompt_aprimorado) > 800:
+            modo = "Multi-AI aprimorado"
+        elif total_sections >= 3 and len(prompt_aprimorado) > 600:
+            modo = "Multi-AI processado"
+        elif "fallback inteligente" in prompt_aprimorado.lower():
+            modo = "Multi-AI (HuggingFace)"
+        elif len(prompt_aprimorado) > 400:
+            modo = "AI processado"
+        elif "fallback" in prompt_aprimorado.lower():
+            modo = "Fallback básico"
+    return modo
+
+def _build_preview_response(prompt_data: PromptData, prompt_aprimorado: str, modo: str,
+                            request: Request, is_authenticated: bool) -> Dict[str, Any]:
+    """Montar o corpo de resposta do preview"""
+    # Incluir informações de quota na resposta se não autenticado
+    response_data = {
+        "message": "Preview gerado com sucesso (modo demo)",
+        "prompt_original": {
+            "contexto": prompt_data.contexto,
+            "objetivo": prompt_data.objetivo,
+            "estilo": prompt_data.estilo,
+            "tom": prompt_data.tom,
+            "audiencia": prompt_data.audiencia,
+            "resposta": prompt_data.resposta
+        },
+        "prompt_aprimorado": prompt_aprimorado,
+        "timestamp": datetime.now().isoformat(),
+        "modo": modo
+    }
+    
+    # Adicionar informações de quota para usuários não autenticados
+    if not is_authenticated:
+        quota_info = anonymous_quota.check_quota(request)
+        response_data["quota_info"] = {
+            "daily_remaining": quota_info.get('daily_remaining', 0),
+            "monthly_remaining": quota_info.get('monthly_remaining', 0),
+            "daily_used": quota_info.get('daily_used', 0),
+            "monthly_used": quota_info.get('monthly_used', 0),
+            "daily_limit": anonymous_quota.daily_limit,
+            "monthly_limit": anonymous_quota.monthly_limit,
+            "suggestion": "Crie uma conta gratuita para aumentar seus limites!"
         }
-        
-        # Adicionar informações de quota para usuários não autenticados
-        if not is_authenticated:
-            quota_info = anonymous_quota.check_quota(request)
-            response_data["quota_info"] = {
-                "daily_remaining": quota_info.get('daily_remaining', 0),
-                "monthly_remaining": quota_info.get('monthly_remaining', 0),
-                "daily_used": quota_info.get('daily_used', 0),
-                "monthly_used": quota_info.get('monthly_used', 0),
-                "daily_limit": anonymous_quota.daily_limit,
-                "monthly_limit": anonymous_quota.monthly_limit,
-                "suggestion": "Crie uma conta gratuita para aumentar seus limites!"
-            }
-        
-        return response_data
-        
+    
+    return response_data
+
+async def _stream_progressive_preview(prompt_data: PromptData, request: Request, auth_header: Optional[str],
+                                      is_authenticated: bool, deadline: Deadline,
+                                      basic_future: "asyncio.Future[str]"):
+    """Stream NDJSON: evento 'basic' imediato e evento 'final' com o resultado da IA"""
+    prompt_basico = await resolve_basic_prompt(prompt_data, basic_future)
+    yield json.dumps({
+        "event": "basic",
+        "final": False,
+        "prompt_aprimorado": prompt_basico,
+        "modo": "Básico (sem IA)",
+        "timestamp": datetime.now().isoformat()
+    }, ensure_ascii=False) + "\n"
+    
+    try:
+        prompt_aprimorado, shed_reason = await _generate_preview_prompt(
+            prompt_data, auth_header, is_authenticated, deadline, basic_future
+        )
+        modo = _detect_preview_mode(prompt_aprimorado, shed_reason)
     except Exception as e:
-        logger.error(f"Erro ao gerar preview do prompt: {e}")
-        # Fallback para versão básica
-        prompt_basico = generate_costar_prompt_basic(prompt_data)
-        return {
-            "message": "Preview gerado com sucesso (modo básico)",
-            "prompt_original": prompt_data.dict(),
-            "prompt_aprimorado": prompt_basico,
-            "timestamp": datetime.now().isoformat(),
-            "modo": "Básico (fallback)"
-        }
+        logger.error(f"❌ [PREVIEW] Erro no modo progressivo: {e}")
+        prompt_aprimorado, modo = prompt_basico, "Básico (fallback)"
+    
+    final = _build_preview_response(prompt_data, prompt_aprimorado, modo, request, is_authenticated)
+    final.update({"event": "final", "final": True, "ai_enhanced": prompt_aprimorado != prompt_basico})
+    yield json.dumps(final, ensure_ascii=False) + "\n"
 
 @app.get("/api/quota/anonymous")
 async def check_anonymous_quota(request: Request):
@@ -655,7 +867,8 @@ async def analyze_prompt_quality(prompt_data: PromptData):
             await multi_ai_service.initialize()
         
         # Gerar prompt primeiro usando Multi-AI
-        prompt_aprimorado = await generate_costar_prompt_with_multi_ai(prompt_data, multi_ai_service)
+        with span("generate"):
+            prompt_aprimorado = await generate_costar_prompt_with_multi_ai(prompt_data, multi_ai_service)
         
         # Criar prompt para análise de qualidade
         analysis_prompt = f"""
@@ -680,7 +893,8 @@ Forneça sua análise no seguinte formato JSON:
 """
         
         # Gerar análise usando Multi-AI
-        analysis_response = await multi_ai_service.generate_content(analysis_prompt)
+        with span("analysis"):
+            analysis_response = await multi_ai_service.generate_content(analysis_prompt)
         
         # Tentar parsear JSON da resposta
         try:
@@ -843,6 +1057,11 @@ configure a variável GEMINI_API_KEY no arquivo .env.
         logger.error(f"Erro ao gerar conteúdo: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato de texto do Prometheus"""
+    return Response(get_metrics_registry().render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/ai/status")
 async def get_ai_status():
     """Obter status de todos os provedores de IA"""
@@ -862,7 +1081,9 @@ async def get_ai_status():
         return {
             "ai_enabled": True,
             "message": "Sistema Multi-AI ativo",
-            **status_report
+            **status_report,
+            "health": get_provider_health_monitor().get_snapshot(),
+            "admission": get_admission_controller().get_status()
         }
         
     except Exception as e:
@@ -873,8 +1094,8 @@ async def get_ai_status():
         }
 
 @app.get("/api/ai/test")
-async def test_ai_connection():
-    """Testar conexão com sistema Multi-AI"""
+async def test_ai_connection(refresh: bool = False):
+    """Status de conexão com o sistema Multi-AI (snapshot das verificações; refresh=true verifica agora)"""
     try:
         if not ai_enabled:
             return {
@@ -885,23 +1106,21 @@ async def test_ai_connection():
                 }
             }
         
-        from app.services.multi_ai_service import MultiAIService
-        multi_ai_service = MultiAIService()
-        
-        test_result = await multi_ai_service.generate_content(
-            prompt="Responda apenas: OK",
-            temperatura=0.1,
-            max_tokens=10
-        )
+        monitor = get_provider_health_monitor()
+        if refresh or monitor.last_refresh is None:
+            await monitor.refresh()
+        snapshot = monitor.get_snapshot()
+        working = bool(snapshot["healthy_providers"])
         
         return {
             "ai_enabled": True,
             "connection_test": {
-                "status": "success",
-                "response": test_result.strip(),
-                "working": True
+                "status": "success" if working else "error",
+                "working": working,
+                "checked_at": snapshot["last_refresh"],
+                "providers": snapshot["providers"]
             },
-            "provider_used": "auto_selected",
+            "provider_used": snapshot["healthy_providers"][0] if working else None,
             "message": "Teste de conexão com Multi-AI"
         }
         
@@ -1144,7 +1363,9 @@ CHECKLIST FINAL:
     
     return enhanced_format
 
-async def generate_costar_prompt_with_multi_ai(prompt_data: PromptData, multi_ai_service) -> str:
+async def generate_costar_prompt_with_multi_ai(prompt_data: PromptData, multi_ai_service,
+                                              deadline: Optional[Deadline] = None,
+                                              basic_future: Optional["asyncio.Future[str]"] = None) -> str:
     """Gerar prompt COSTAR aprimorado com sistema de múltiplas IAs"""
     
     start_time = time.time()
@@ -1214,12 +1435,31 @@ Gere o prompt aprimorado seguindo EXATAMENTE esta estrutura:"""
         result = await multi_ai_service.generate_content(
             prompt=enhancement_prompt,
             temperatura=0.7,
-            max_tokens=2048
+            max_tokens=2048,
+            deadline=deadline
         )
         
         logger.info(f"📨 [MULTI_AI] Resultado recebido: tipo={type(result)}")
         logger.info(f"🔍 [MULTI_AI] Estrutura do resultado: {result if isinstance(result, dict) else 'não é dict'}")
         
+        # Todos os provedores falharam: o serviço devolve o próprio prompt de enhancement
+        # (provider "fallback"), que não serve ao usuário; usar o básico especulativo
+        if isinstance(result, dict) and (result.get('provider') == 'fallback' or result.get('success') is False):
+            response_time = time.time() - start_time
+            logger.warning("⚠️ [MULTI_AI] Nenhum provedor respondeu; usando o prompt básico")
+            try:
+                track_api_usage(
+                    provider="fallback",
+                    user_id=None,
+                    prompt_type="costar",
+                    response_time=response_time,
+                    success=False,
+                    error_message="Todos os provedores falharam"
+                )
+            except Exception as analytics_error:
+                logger.warning(f"⚠️ [ANALYTICS] Erro ao registrar erro: {analytics_error}")
+            return await resolve_basic_prompt(prompt_data, basic_future)
+
         # Extrair conteúdo do resultado e provider usado
         if isinstance(result, dict):
             enhanced_prompt = result.get('content', str(result))
@@ -1233,20 +1473,19 @@ Gere o prompt aprimorado seguindo EXATAMENTE esta estrutura:"""
         success = True
         response_time = time.time() - start_time
         
-        # Registrar métricas de analytics
-        if analytics_service:
-            try:
-                analytics_service.log_api_usage(
-                    provider=provider_used,
-                    user_id=None,  # Preview não requer login
-                    prompt_type="costar",
-                    response_time=response_time,
-                    success=True,
-                    tokens_used=len(enhanced_prompt)
-                )
-                logger.info(f"📊 [ANALYTICS] Registrado: {provider_used}, {response_time:.2f}s, {len(enhanced_prompt)} chars")
-            except Exception as analytics_error:
-                logger.warning(f"⚠️ [ANALYTICS] Erro ao registrar métricas: {analytics_error}")
+        # Registrar métricas de analytics (enfileirado; gravado em lote fora da requisição)
+        try:
+            track_api_usage(
+                provider=provider_used,
+                user_id=None,  # Preview não requer login
+                prompt_type="costar",
+                response_time=response_time,
+                success=True,
+                tokens_used=len(enhanced_prompt)
+            )
+            logger.info(f"📊 [ANALYTICS] Registrado: {provider_used}, {response_time:.2f}s, {len(enhanced_prompt)} chars")
+        except Exception as analytics_error:
+            logger.warning(f"⚠️ [ANALYTICS] Erro ao registrar métricas: {analytics_error}")
             
         logger.info(f"🎨 [MULTI_AI] Preview do resultado: {enhanced_prompt[:150]}...")
         return enhanced_prompt
@@ -1260,22 +1499,22 @@ Gere o prompt aprimorado seguindo EXATAMENTE esta estrutura:"""
         logger.error(f"📍 [MULTI_AI] Detalhes do erro: {repr(e)}")
         
         # Registrar erro nas métricas
-        if analytics_service:
-            try:
-                analytics_service.log_api_usage(
-                    provider=provider_used,
-                    user_id=None,
-                    prompt_type="costar",
-                    response_time=response_time,
-                    success=False,
-                    error_message=error_message
-                )
-                logger.info(f"📊 [ANALYTICS] Erro registrado: {provider_used}, {response_time:.2f}s, erro: {error_message[:50]}")
-            except Exception as analytics_error:
-                logger.warning(f"⚠️ [ANALYTICS] Erro ao registrar erro: {analytics_error}")
+        try:
+            track_api_usage(
+                provider=provider_used,
+                user_id=None,
+                prompt_type="costar",
+                response_time=response_time,
+                success=False,
+                error_message=error_message
+            )
+            logger.info(f"📊 [ANALYTICS] Erro registrado: {provider_used}, {response_time:.2f}s, erro: {error_message[:50]}")
+        except Exception as analytics_error:
+            logger.warning(f"⚠️ [ANALYTICS] Erro ao registrar erro: {analytics_error}")
         
         logger.info("🔄 [MULTI_AI] Fallback para geração básica")
-        return generate_costar_prompt_basic(prompt_data)
+        AI_FALLBACKS.labels("preview", "error").inc()
+        return await resolve_basic_prompt(prompt_data, basic_future)
 
 async def generate_costar_prompt_with_ai(prompt_data: PromptData, gemini_service) -> str:
     """Gerar prompt COSTAR aprimorado com IA (compatibilidade legada)"""
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Servidor mock de provedores de IA para testes de carga e latência offline
+
+Fala a API de chat compatível com OpenAI (Groq e Together) e a API
+generateContent/streamGenerateContent do Gemini, com latência sorteada de
+uma distribuição configurável, taxas de erro e de 429, streaming token a
+token e respostas determinísticas (mesmo prompt -> mesmo texto).
+
+Uso:
+    python tools/mock_llm_server.py --port 8900 --latency lognormal:0.8,0.5 \
+        --error-rate 0.02 --rate-limit-rate 0.05 --seed 42
+
+    # Em outro terminal, apontar a aplicação para o mock:
+    AI_MOCK_BASE_URL=http://localhost:8900 python tools/main_demo.py
+
+Configuração por provedor via arquivo JSON (--config), ex.:
+    {"default": {"latency": "fixed:0.3"},
+     "groq": {"latency": "lognormal:1.2,0.6", "rate_limit_rate": 0.2}}
+
+A configuração pode ser trocada em tempo de execução com POST /_mock/config.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("groq", "together", "gemini")
+
+DEFAULT_PROFILE = {
+    "latency": "lognormal:0.8,0.5",  # tempo até o primeiro byte, em segundos
+    "token_delay": 0.01,             # intervalo entre tokens no streaming
+    "error_rate": 0.0,               # fração de respostas 500/503
+    "rate_limit_rate": 0.0,          # fração de respostas 429
+    "retry_after": 2,                # valor do header Retry-After nos 429
+    "max_tokens": 400                # tamanho máximo da resposta (em palavras)
+}
+
+class LatencyDistribution:
+    """Distribuição de latência a partir de 'tipo:parâmetros'"""
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Distribuição desconhecida '{kind}'. Use: {', '.join(self.KINDS)}")
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",") if value.strip()]
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            # Parâmetros: mediana e sigma (cauda longa, como APIs reais)
+            value = rng.lognormvariate(math.log(p[0]), p[1])
+        else:
+            value = rng.expovariate(1 / p[0])
+        return max(0.0, value)
+
+class MockState:
+    """Perfis por provedor, RNG semeado e contadores"""
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], seed: int):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        # Default e overrides por provedor guardados à parte, para um novo default valer em todos
+        self.default: Dict[str, Any] = {}
+        self.overrides: Dict[str, Dict[str, Any]] = {provider: {} for provider in PROVIDERS}
+        self.latencies: Dict[str, LatencyDistribution] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.configure(profiles)
+
+    def configure(self, profiles: Dict[str, Dict[str, Any]]):
+        self.default.update(profiles.get("default", {}))
+        for provider in PROVIDERS:
+            self.overrides[provider].update(profiles.get(provider, {}))
+            profile = {**DEFAULT_PROFILE, **self.default, **self.overrides[provider]}
+            self.latencies[provider] = LatencyDistribution(profile["latency"])
+            self.profiles[provider] = profile
+            self.stats.setdefault(provider, {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "streams": 0})
+
+    def decide(self, provider: str) -> Dict[str, Any]:
+        """Sortear latência e resultado desta requisição"""
+        profile = self.profiles[provider]
+        with self.lock:
+            latency = self.latencies[provider].sample(self.rng)
+            roll = self.rng.random()
+            if roll < profile["rate_limit_rate"]:
+                outcome, counter = "rate_limited", "rate_limited"
+            elif roll < profile["rate_limit_rate"] + profile["error_rate"]:
+                outcome, counter = "error", "errors"
+            else:
+                outcome, counter = "ok", "ok"
+            self.stats[provider]["requests"] += 1
+            self.stats[provider][counter] += 1
+        return {"latency": latency, "outcome": outcome, "profile": profile}
+
+SECTIONS = [
+    ("Context (Contexto)", "cenário"),
+    ("Objective (Objetivo)", "meta"),
+    ("Style (Estilo)", "estilo"),
+    ("Tone (Tom)", "tom"),
+    ("Audience (Audiência)", "público"),
+    ("Response (Formato de Resposta)", "formato"),
+]
+
+VOCABULARY = ("claro", "detalhado", "específico", "objetivo", "estruturado", "prático", "relevante",
+              "consistente", "mensurável", "acionável", "técnico", "acessível", "conciso", "completo")
+
+def deterministic_text(prompt: str, model: str, max_words: int) -> str:
+    """Texto no formato COSTAR derivado do hash do prompt: mesma entrada, mesma saída"""
+    digest = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+    rng = random.Random(int(digest[:16], 16))
+    budget = max(max_words, len(SECTIONS) * 8)
+    per_section = budget // len(SECTIONS)
+    parts = []
+    for title, noun in SECTIONS:
+        words = [f"O {noun} deve ser"]
+        words.extend(rng.choice(VOCABULARY) for _ in range(per_section - 4))
+        parts.append(f"**{title}**\n{' '.join(words)}.")
+    return "\n\n".join(parts) + f"\n\n[mock:{digest[:8]}]"
+
+def tokenize(text: str) -> List[str]:
+    """Dividir em 'tokens' (palavras com o espaço seguinte) para o streaming"""
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char in (" ", "\n"):
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def error_response(provider: str, decision: Dict[str, Any]) -> JSONResponse:
+    if decision["outcome"] == "rate_limited":
+        retry_after = decision["profile"]["retry_after"]
+        if provider == "gemini":
+            body = {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}}
+        else:
+            body = {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}
+        return JSONResponse(body, status_code=429, headers={"Retry-After": str(retry_after)})
+    if provider == "gemini":
+        body = {"error": {"code": 503, "message": "The model is overloaded", "status": "UNAVAILABLE"}}
+        return JSONResponse(body, status_code=503)
+    return JSONResponse({"error": {"message": "Internal server error", "type": "server_error"}}, status_code=500)
+
+def create_app(state: MockState) -> FastAPI:
+    app = FastAPI(title="Mock LLM Providers")
+
+    async def openai_chat(provider: str, request: Request):
+        body = await request.json()
+        decision = state.decide(provider)
+        await asyncio.sleep(decision["latency"])
+        if decision["outcome"] != "ok":
+            return error_response(provider, decision)
+
+        model = body.get("model", "mock-model")
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        max_words = min(int(body.get("max_tokens") or decision["profile"]["max_tokens"]), decision["profile"]["max_tokens"])
+        text = deterministic_text(prompt, model, max_words)
+        completion_id = f"chatcmpl-{hashlib.md5(text.encode()).hexdigest()[:12]}"
+        usage = {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        state.stats[provider]["streams"] += 1
+
+        async def stream():
+            for token in tokenize(text):
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(decision["profile"]["token_delay"])
+            final = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/openai/v1/chat/completions")
+    async def groq_chat(request: Request):
+        return await openai_chat("groq", request)
+
+    @app.post("/v1/chat/completions")
+    async def together_chat(request: Request):
+        return await openai_chat("together", request)
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini_generate(model_action: str, request: Request):
+        model, _, action = model_action.partition(":")
+        if action not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"Método {action} não suportado"}}, status_code=404)
+        body = await request.json()
+        decision = state.decide("gemini")
+        await asyncio.sleep(decision["latency"])
+        if decision["outcome"] != "ok":
+            return error_response("gemini", decision)
+
+        prompt = "\n".join(
+            str(part.get("text", "")) for content in body.get("contents", []) for part in content.get("parts", [])
+        )
+        config = body.get("generationConfig", {})
+        max_words = min(int(config.get("maxOutputTokens") or decision["profile"]["max_tokens"]), decision["profile"]["max_tokens"])
+        text = deterministic_text(prompt, model, max_words)
+        usage = {"promptTokenCount": count_tokens(prompt), "candidatesTokenCount": count_tokens(text)}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+
+        def candidate(chunk: str, finished: bool) -> Dict[str, Any]:
+            data = {"content": {"role": "model", "parts": [{"text": chunk}]}, "index": 0}
+            if finished:
+                data["finishReason"] = "STOP"
+            return data
+
+        if action == "generateContent":
+            return {"candidates": [candidate(text, True)], "usageMetadata": usage, "modelVersion": model}
+
+        state.stats["gemini"]["streams"] += 1
+        tokens = tokenize(text)
+        sse = request.query_params.get("alt") == "sse"
+
+        async def stream():
+            # Sem alt=sse a API do Gemini devolve um array JSON entregue aos poucos
+            if not sse:
+                yield "["
+            for index, token in enumerate(tokens):
+                last = index == len(tokens) - 1
+                chunk = {"candidates": [candidate(token, last)], "modelVersion": model}
+                if last:
+                    chunk["usageMetadata"] = usage
+                payload = json.dumps(chunk, ensure_ascii=False)
+                if sse:
+                    yield f"data: {payload}\r\n\r\n"
+                else:
+                    yield ("," if index else "") + payload
+                await asyncio.sleep(decision["profile"]["token_delay"])
+            if not sse:
+                yield "]"
+
+        return StreamingResponse(stream(), media_type="text/event-stream" if sse else "application/json")
+
+    # Endpoints usados pelo warm-up / health probe para validar a chave
+    @app.get("/openai/v1/models")
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/v1beta/models/{model}")
+    async def gemini_model(model: str):
+        return {"name": f"models/{model}", "displayName": model, "supportedGenerationMethods": ["generateContent"]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "providers": list(PROVIDERS)}
+
+    @app.get("/_mock/stats")
+    async def stats():
+        return {"seed": state.seed, "stats": state.stats}
+
+    @app.get("/_mock/config")
+    async def get_config():
+        return state.profiles
+
+    @app.post("/_mock/config")
+    async def update_config(request: Request):
+        """Trocar perfis em tempo de execução (mesmo formato do --config)"""
+        try:
+            state.configure(await request.json())
+        except (ValueError, KeyError, IndexError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return state.profiles
+
+    return app
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor mock de provedores de IA (Groq/Together/Gemini)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int, default=42, help="semente do sorteio de latência/erros")
+    parser.add_argument("--latency", help="distribuição padrão, ex.: fixed:0.5, uniform:0.2,1.5, lognormal:0.8,0.5")
+    parser.add_argument("--token-delay", type=float, help="segundos entre tokens no streaming")
+    parser.add_argument("--error-rate", type=float, help="fração de respostas 5xx")
+    parser.add_argument("--rate-limit-rate", type=float, help="fração de respostas 429")
+    parser.add_argument("--retry-after", type=float, help="Retry-After (s) enviado nos 429")
+    parser.add_argument("--config", help="arquivo JSON com perfis por provedor")
+    return parser.parse_args(argv)
+
+def build_profiles(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    profiles: Dict[str, Dict[str, Any]] = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            profiles = json.load(f)
+    default = profiles.setdefault("default", {})
+    for key in ("latency", "token_delay", "error_rate", "rate_limit_rate", "retry_after"):
+        value = getattr(args, key)
+        if value is not None:
+            default[key] = value
+    return profiles
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    state = MockState(build_profiles(args), args.seed)
+    print(f"🧪 Mock LLM em http://{args.host}:{args.port} (seed={args.seed})")
+    for provider, profile in state.profiles.items():
+        print(f"   {provider}: latency={profile['latency']} erros={profile['error_rate']} 429={profile['rate_limit_rate']}")
+    print(f"👉 Use AI_MOCK_BASE_URL=http://{args.host}:{args.port} na aplicação")
+
+    import uvicorn
+    uvicorn.run(create_app(state), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    sys.exit(main())